@@ -0,0 +1,190 @@
+"""Асинхронные варианты самых нагруженных GET-эндпоинтов.
+
+Под ASGI медленное чтение из базы не занимает воркер целиком: запросы
+идут через async ORM, а сериализаторы получают рецепты с уже
+подгруженными авторами, ингредиентами и флагами пользователя и сами к
+базе не обращаются. Ответы совпадают с ответами ``RecipeViewSet`` и
+``IngredientViewSet``. Остальные методы тех же URL передаются
+синхронным представлениям.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.paginator import InvalidPage
+from django.http import JsonResponse
+from django.shortcuts import redirect
+from django.urls import path
+from django.utils.translation import gettext
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authentication import get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from formulas import catalog
+from formulas.models import Ingredient
+from .pagination import EstimatedCountPagination, EstimatedCountPaginator
+from .queries import filter_recipes, recipes_for_read
+from .serializers import IngredientSerializer, RecipeReadSerializer
+from .views import IngredientViewSet, RecipeViewSet
+
+
+class AuthenticationFailed(Exception):
+    pass
+
+
+def _json(data, status=200):
+    return JsonResponse(
+        data,
+        status=status,
+        safe=False,
+        encoder=JSONEncoder,
+        json_dumps_params={"ensure_ascii": False, "separators": (",", ":")},
+    )
+
+
+async def _authenticate(request):
+    """Аутентификация по токену, как у ``TokenAuthentication``."""
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != b"token":
+        return AnonymousUser()
+    if len(auth) != 2:
+        raise AuthenticationFailed(
+            gettext("Invalid token header. No credentials provided.")
+        )
+    try:
+        token = await Token.objects.select_related("user").aget(
+            key=auth[1].decode()
+        )
+    except (Token.DoesNotExist, UnicodeError):
+        raise AuthenticationFailed(gettext("Invalid token."))
+    if not token.user.is_active:
+        raise AuthenticationFailed(gettext("User inactive or deleted."))
+    return token.user
+
+
+def _with_sync_fallback(view, sync_view):
+    """GET и HEAD обслуживает ``view``, остальное — ``sync_view``."""
+    sync_view = sync_to_async(sync_view)
+
+    @csrf_exempt
+    @wraps(view)
+    async def dispatch(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return await sync_view(request, *args, **kwargs)
+        try:
+            request.user = await _authenticate(request)
+        except AuthenticationFailed as error:
+            response = _json({"detail": str(error)}, status=401)
+            response["WWW-Authenticate"] = "Token"
+            return response
+        return await view(request, *args, **kwargs)
+
+    return dispatch
+
+
+def _page_size(request):
+    pagination = EstimatedCountPagination
+    try:
+        size = int(request.GET[pagination.page_size_query_param])
+    except (KeyError, ValueError):
+        return pagination.page_size
+    return size if size > 0 else pagination.page_size
+
+
+def _page_link(request, number):
+    url = request.build_absolute_uri()
+    if number == 1:
+        return remove_query_param(url, "page")
+    return replace_query_param(url, "page", number)
+
+
+async def recipe_list(request):
+    try:
+        queryset = filter_recipes(
+            recipes_for_read(request.user), request.GET, request.user
+        )
+    except ValidationError as error:
+        return _json(error.detail, status=400)
+    paginator = EstimatedCountPaginator(queryset, _page_size(request))
+    try:
+        # Число строк берётся из оценки или кеша, точный COUNT(*) —
+        # только для небольших выборок.
+        page = await sync_to_async(paginator.page)(request.GET.get("page", 1))
+    except InvalidPage:
+        return _json({"detail": gettext("Invalid page.")}, status=404)
+    recipes = [recipe async for recipe in page.object_list]
+    return _json({
+        "count": paginator.count,
+        "next": (
+            _page_link(request, page.number + 1) if page.has_next() else None
+        ),
+        "previous": (
+            _page_link(request, page.number - 1)
+            if page.has_previous() else None
+        ),
+        "results": RecipeReadSerializer(
+            recipes, many=True, context={"request": request}
+        ).data,
+        "count_estimated": paginator.count_estimated,
+    })
+
+
+async def recipe_detail(request, pk):
+    recipe = await recipes_for_read(request.user).filter(pk=pk).afirst()
+    if recipe is None:
+        return _json(
+            {"detail": "No Dish matches the given query."}, status=404
+        )
+    return _json(
+        RecipeReadSerializer(recipe, context={"request": request}).data
+    )
+
+
+async def ingredient_list(request):
+    prefix = request.GET.get("name")
+    if prefix is None and (url := catalog.current_url()):
+        return redirect(url)
+    queryset = Ingredient.objects.all()
+    if prefix:
+        queryset = queryset.filter(name__istartswith=prefix.lower())
+    return _json(IngredientSerializer(
+        [ingredient async for ingredient in queryset], many=True
+    ).data)
+
+
+def async_read_urls():
+    """Маршруты асинхронных чтений поверх маршрутов роутера API."""
+    return [
+        path(
+            "recipes/",
+            _with_sync_fallback(
+                recipe_list,
+                RecipeViewSet.as_view({"get": "list", "post": "create"}),
+            ),
+            name="recipes-list",
+        ),
+        path(
+            "recipes/<int:pk>/",
+            _with_sync_fallback(
+                recipe_detail,
+                RecipeViewSet.as_view({
+                    "get": "retrieve",
+                    "put": "update",
+                    "patch": "partial_update",
+                    "delete": "destroy",
+                }),
+            ),
+            name="recipes-detail",
+        ),
+        path(
+            "ingredients/",
+            _with_sync_fallback(
+                ingredient_list, IngredientViewSet.as_view({"get": "list"})
+            ),
+            name="ingredients-list",
+        ),
+    ]
@@ -0,0 +1,146 @@
+"""Декларативные фильтры списка рецептов.
+
+Каждый фильтр читает свои GET-параметры и превращается в условие
+``WHERE`` по индексу: диапазоны и авторы — по столбцам рецепта, связи с
+ингредиентами, избранным и корзиной — полусоединениями ``EXISTS`` по
+уникальным индексам связующих таблиц. Без ``JOIN`` строки рецептов не
+размножаются, поэтому не нужен ``DISTINCT`` и фильтры комбинируются
+простым ``AND``. Набор фильтров — ``RECIPE_FILTERS``.
+"""
+
+from django.db.models import Exists, OuterRef, Q
+from rest_framework.exceptions import ValidationError
+
+from formulas.models import FavoriteRecipe, IngredientAmount, ShoppingCart
+
+# Больше значений в одном параметре не принимается: каждое обязательное
+# ингредиентное условие — отдельный подзапрос.
+MAX_VALUES = 20
+
+
+def _ids(params, name):
+    """Id из повторяющегося параметра или списка через запятую."""
+    values = {
+        part.strip()
+        for value in params.getlist(name)
+        for part in value.split(",")
+        if part.strip()
+    }
+    if len(values) > MAX_VALUES:
+        raise ValidationError({name: f"Не больше {MAX_VALUES} значений"})
+    try:
+        return sorted(int(value) for value in values)
+    except ValueError:
+        raise ValidationError({name: "Ожидается список целых чисел"})
+
+
+def _number(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: "Ожидается целое число"})
+
+
+class RecipeFilter:
+    """Фильтр по одному или нескольким GET-параметрам."""
+
+    def condition(self, params, user):
+        """Условие для ``QuerySet.filter`` или ``None``, если не задан."""
+        raise NotImplementedError
+
+
+class AuthorFilter(RecipeFilter):
+    """``?author=1&author=2`` или ``?author=1,2`` — рецепты этих авторов."""
+
+    def __init__(self, param):
+        self.param = param
+
+    def condition(self, params, user):
+        ids = _ids(params, self.param)
+        return Q(creator_id__in=ids) if ids else None
+
+
+class RangeFilter(RecipeFilter):
+    """Границы значения поля включительно, например ``cook_time``."""
+
+    def __init__(self, field, min_param, max_param):
+        self.field = field
+        self.min_param = min_param
+        self.max_param = max_param
+
+    def condition(self, params, user):
+        low = _number(params, self.min_param)
+        high = _number(params, self.max_param)
+        if low is not None and high is not None and low > high:
+            raise ValidationError({
+                self.min_param: f"Больше, чем {self.max_param}"
+            })
+        condition = Q()
+        if low is not None:
+            condition &= Q(**{f"{self.field}__gte": low})
+        if high is not None:
+            condition &= Q(**{f"{self.field}__lte": high})
+        return condition or None
+
+
+class IngredientFilter(RecipeFilter):
+    """Рецепты со всеми ингредиентами из параметра или без любого из них.
+
+    Каждый обязательный ингредиент — свой ``EXISTS``: так условие
+    проверяется по уникальному индексу (рецепт, ингредиент) и не требует
+    группировки с подсчётом совпадений.
+    """
+
+    def __init__(self, param, exclude=False):
+        self.param = param
+        self.exclude = exclude
+
+    def condition(self, params, user):
+        ids = _ids(params, self.param)
+        if not ids:
+            return None
+        amounts = IngredientAmount.objects.filter(dish=OuterRef("pk"))
+        if self.exclude:
+            return ~Exists(amounts.filter(ingredient_id__in=ids))
+        return Q(*(
+            Exists(amounts.filter(ingredient_id=ingredient_id))
+            for ingredient_id in ids
+        ))
+
+
+class RelationFilter(RecipeFilter):
+    """``?is_favorited=1`` — рецепты из списка текущего пользователя."""
+
+    def __init__(self, param, model):
+        self.param = param
+        self.model = model
+
+    def condition(self, params, user):
+        if params.get(self.param) != "1" or not user.is_authenticated:
+            return None
+        return Exists(
+            self.model._base_manager.filter(user=user, dish=OuterRef("pk"))
+        )
+
+
+RECIPE_FILTERS = (
+    AuthorFilter("author"),
+    RangeFilter("cook_time", "cook_time_min", "cook_time_max"),
+    IngredientFilter("ingredients"),
+    IngredientFilter("exclude_ingredients", exclude=True),
+    RelationFilter("is_favorited", FavoriteRecipe),
+    RelationFilter("is_in_shopping_cart", ShoppingCart),
+)
+
+
+def apply_filters(queryset, params, user, filters=RECIPE_FILTERS):
+    """Применяет к рецептам все заданные в ``params`` фильтры."""
+    conditions = [
+        condition
+        for recipe_filter in filters
+        if (condition := recipe_filter.condition(params, user)) is not None
+    ]
+    return queryset.filter(*conditions) if conditions else queryset
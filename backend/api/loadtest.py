@@ -0,0 +1,318 @@
+"""Генератор конкурентной нагрузки на API.
+
+Сценарий описывает персоны (виртуальных пользователей) и их действия.
+Каждое действие — последовательность запросов с весом выбора; в путях
+можно использовать подстановку ``{recipe_id}``. Запросы отправляются
+либо на запущенный сервер по HTTP, либо прямо в WSGI-приложение
+внутри процесса. Запросы с авторизацией идут от выделенных
+пользователей ``loadtest-N``, а их токены удаляются после прогона.
+"""
+
+import http.client
+import json
+import random
+import string
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from formulas.models import UserAccount
+
+LOAD_USER_PREFIX = "loadtest-"
+METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE"}
+PLACEHOLDERS = {"recipe_id"}
+
+DEFAULT_SCENARIO = {
+    "personas": {
+        "reader": {
+            "weight": 6,
+            "auth": False,
+            "actions": [
+                {"name": "recipes_list", "weight": 6, "steps": [
+                    {"method": "GET", "path": "/api/recipes/"},
+                ]},
+                {"name": "recipe_detail", "weight": 3, "steps": [
+                    {"method": "GET", "path": "/api/recipes/{recipe_id}/"},
+                ]},
+                {"name": "ingredients_search", "weight": 1, "steps": [
+                    {"method": "GET", "path": "/api/ingredients/?name=с"},
+                ]},
+            ],
+        },
+        "shopper": {
+            "weight": 3,
+            "auth": True,
+            "actions": [
+                {"name": "favorite_toggle", "weight": 4, "steps": [
+                    {"method": "POST", "path": "/api/recipes/{recipe_id}/favorite/"},
+                    {"method": "DELETE", "path": "/api/recipes/{recipe_id}/favorite/"},
+                ]},
+                {"name": "cart_toggle", "weight": 3, "steps": [
+                    {"method": "POST",
+                     "path": "/api/recipes/{recipe_id}/shopping_cart/"},
+                    {"method": "DELETE",
+                     "path": "/api/recipes/{recipe_id}/shopping_cart/"},
+                ]},
+                {"name": "cart_download", "weight": 2, "steps": [
+                    {"method": "GET", "path": "/api/recipes/download_shopping_cart/"},
+                ]},
+                {"name": "recipes_list", "weight": 3, "steps": [
+                    {"method": "GET", "path": "/api/recipes/?is_favorited=1"},
+                ]},
+            ],
+        },
+    },
+}
+
+
+def _pick(rng, items):
+    return rng.choices(items, weights=[item.get("weight", 1) for item in items])[0]
+
+
+class InProcessTarget:
+    """Запросы прямо в WSGI-приложение через тестовый клиент Django."""
+
+    def __init__(self):
+        self.host = next(
+            (host for host in settings.ALLOWED_HOSTS if host not in ("*", "")),
+            "localhost",
+        )
+        self._local = threading.local()
+
+    def request(self, method, path, token=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = Client(
+                HTTP_HOST=self.host, raise_request_exception=False
+            )
+        headers = {"HTTP_AUTHORIZATION": f"Token {token}"} if token else {}
+        response = client.generic(method, path, **headers)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response.status_code
+
+    def close(self):
+        connection.close()
+
+
+class HttpTarget:
+    """Запросы на запущенный сервер, по одному keep-alive соединению на поток."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.connection_class = (
+            http.client.HTTPSConnection
+            if parts.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip("/")
+        self._local = threading.local()
+
+    def request(self, method, path, token=None):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self.connection_class(self.netloc, timeout=30)
+        headers = {"Authorization": f"Token {token}"} if token else {}
+        try:
+            conn.request(
+                method, quote(self.prefix + path, safe="/?=&%"), headers=headers
+            )
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+        return response.status
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+
+
+def _virtual_user(target, persona_name, persona, token, recipe_ids,
+                  deadline, seed, samples, lock):
+    rng = random.Random(seed)
+    local = []
+    try:
+        while time.monotonic() < deadline:
+            action = _pick(rng, persona["actions"])
+            recipe_id = rng.choice(recipe_ids) if recipe_ids else 0
+            for step in action["steps"]:
+                path = step["path"].format(recipe_id=recipe_id)
+                started = time.monotonic()
+                try:
+                    status = target.request(
+                        step["method"], path,
+                        token if persona.get("auth") else None,
+                    )
+                except Exception:
+                    status = None
+                local.append((
+                    started,
+                    time.monotonic() - started,
+                    persona_name,
+                    f"{action['name']}:{step['method']}",
+                    status,
+                ))
+    finally:
+        target.close()
+        with lock:
+            samples.extend(local)
+
+
+def run(scenario, target, concurrency, duration, tokens, recipe_ids, seed=0):
+    """Запускает сценарий и возвращает замеры всех запросов.
+
+    Замер — кортеж (время начала, длительность, персона, запрос, статус);
+    статус ``None`` означает сетевую ошибку или исключение.
+    """
+    rng = random.Random(seed)
+    personas = [
+        {"name": name, **persona}
+        for name, persona in scenario["personas"].items()
+    ]
+    samples, lock = [], threading.Lock()
+    started = time.monotonic()
+    deadline = started + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = []
+        for number in range(concurrency):
+            persona = _pick(rng, personas)
+            futures.append(pool.submit(
+                _virtual_user, target, persona["name"], persona,
+                tokens[number % len(tokens)] if tokens else None,
+                recipe_ids, deadline, rng.random(), samples, lock,
+            ))
+    # Исключение вне запроса (например, в сценарии) не должно превращаться
+    # в «0 запросов».
+    for future in futures:
+        future.result()
+    return started, samples
+
+
+def _percentiles(latencies):
+    if not latencies:
+        return {"p50": None, "p90": None, "p95": None, "p99": None}
+    ordered = sorted(latencies)
+    return {
+        f"p{q}": round(ordered[min(len(ordered) - 1, len(ordered) * q // 100)]
+                       * 1000, 2)
+        for q in (50, 90, 95, 99)
+    }
+
+
+def _stats(samples, seconds):
+    statuses = Counter(
+        "error" if status is None or status >= 500
+        else "4xx" if status >= 400 else "ok"
+        for _, _, _, _, status in samples
+    )
+    total = len(samples)
+    return {
+        "requests": total,
+        "rps": round(total / seconds, 2) if seconds else None,
+        "error_rate": round(statuses["error"] / total, 4) if total else 0,
+        "client_errors": statuses["4xx"],
+        "latency_ms": _percentiles([latency for _, latency, *_ in samples]),
+    }
+
+
+def summarize(started, samples, duration, interval):
+    """Сводка: общая, по запросам и по интервалам времени."""
+    by_request = defaultdict(list)
+    by_interval = defaultdict(list)
+    for sample in samples:
+        by_request[sample[3]].append(sample)
+        by_interval[int((sample[0] - started) // interval)].append(sample)
+    return {
+        "total": _stats(samples, duration),
+        "requests": {
+            name: _stats(items, duration)
+            for name, items in sorted(by_request.items())
+        },
+        "timeline": [
+            {"second": index * interval, **_stats(by_interval[index], interval)}
+            for index in sorted(by_interval)
+        ],
+    }
+
+
+def validate_scenario(scenario):
+    """Проверяет сценарий; ``ValueError`` с описанием первой ошибки."""
+    personas = scenario.get("personas") if isinstance(scenario, dict) else None
+    if not personas or not isinstance(personas, dict):
+        raise ValueError("В сценарии нет персон (personas)")
+    for persona_name, persona in personas.items():
+        actions = persona.get("actions") if isinstance(persona, dict) else None
+        if not actions:
+            raise ValueError(f"{persona_name}: нет действий (actions)")
+        for action in actions:
+            name = f"{persona_name}.{action.get('name', '?')}"
+            if "name" not in action or not action.get("steps"):
+                raise ValueError(f"{name}: нужны name и steps")
+            for step in action["steps"]:
+                if step.get("method") not in METHODS:
+                    raise ValueError(f"{name}: неизвестный метод {step}")
+                if not isinstance(step.get("path"), str):
+                    raise ValueError(f"{name}: нет пути {step}")
+                fields = {
+                    field
+                    for _, field, _, _ in string.Formatter().parse(
+                        step["path"]
+                    )
+                    if field is not None
+                }
+                if fields - PLACEHOLDERS:
+                    raise ValueError(
+                        f"{name}: неизвестные подстановки "
+                        f"{sorted(fields - PLACEHOLDERS)}"
+                    )
+    return scenario
+
+
+def load_scenario(path=None):
+    if path is None:
+        return DEFAULT_SCENARIO
+    with open(path, encoding="utf-8") as file:
+        return validate_scenario(json.load(file))
+
+
+@contextmanager
+def load_test_tokens(count):
+    """Токены ``count`` выделенных пользователей нагрузочного теста.
+
+    Пользователи ``loadtest-N`` заводятся без пароля при первом прогоне,
+    чтобы сценарии не трогали избранное и корзины настоящих
+    пользователей. Токены удаляются по выходу, и без прогона войти под
+    этими пользователями нельзя.
+    """
+    users = []
+    for number in range(1, count + 1):
+        username = f"{LOAD_USER_PREFIX}{number}"
+        user, created = UserAccount.objects.get_or_create(
+            username=username,
+            defaults={
+                "email": f"{username}@loadtest.invalid",
+                "first_name": "Load",
+                "last_name": "Test",
+            },
+        )
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=["password"])
+        users.append(user)
+    try:
+        yield [Token.objects.get_or_create(user=user)[0].key for user in users]
+    finally:
+        Token.objects.filter(user__in=users).delete()
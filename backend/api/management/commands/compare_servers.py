@@ -0,0 +1,209 @@
+"""Команда Django для сравнения WSGI- и ASGI-запуска при равной памяти."""
+
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import loadtest
+from formulas.models import Dish
+
+SERVERS = {
+    'wsgi': {
+        'args': ['foodgram.wsgi'],
+        'env': {'ASYNC_READ_VIEWS': 'False'},
+    },
+    'asgi': {
+        'args': [
+            'foodgram.asgi:application',
+            '-k', 'uvicorn.workers.UvicornWorker',
+        ],
+        'env': {'ASYNC_READ_VIEWS': 'True'},
+    },
+}
+
+READ_SCENARIO = {
+    'personas': {'reader': loadtest.DEFAULT_SCENARIO['personas']['reader']},
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _rss_mb(pid):
+    try:
+        status = Path(f'/proc/{pid}/status').read_text()
+    except OSError:
+        return 0
+    for line in status.splitlines():
+        if line.startswith('VmRSS:'):
+            return int(line.split()[1]) / 1024
+    return 0
+
+
+def _children(pid):
+    children = []
+    for stat in Path('/proc').glob('[0-9]*/stat'):
+        try:
+            fields = stat.read_text().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(stat.parent.name))
+    return children
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает проект под gunicorn с синхронными и с ASGI-воркерами, '
+        'подбирает число воркеров под одинаковый бюджет памяти и сравнивает '
+        'пропускную способность и задержки на сценарии чтения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--memory-mb', type=int, default=512,
+            help='Бюджет памяти воркеров каждого варианта, МБ',
+        )
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument(
+            '--duration', type=float, default=20, help='Длительность, с'
+        )
+        parser.add_argument(
+            '--warmup', type=float, default=3, help='Прогрев перед замером, с'
+        )
+        parser.add_argument('--scenario', help='JSON-файл со сценарием')
+        parser.add_argument(
+            '--servers', nargs='+', choices=SERVERS, default=list(SERVERS)
+        )
+
+    def handle(self, *args, **options):
+        if sys.platform != 'linux':
+            raise CommandError('Замер памяти воркеров работает только в Linux')
+        self.recipe_ids = list(Dish.objects.values_list('id', flat=True)[:1000])
+        if not self.recipe_ids:
+            raise CommandError('В базе нет рецептов для сценария')
+        try:
+            self.scenario = (
+                loadtest.load_scenario(options['scenario'])
+                if options['scenario'] else READ_SCENARIO
+            )
+        except ValueError as error:
+            raise CommandError(f'Некорректный сценарий: {error}')
+
+        with loadtest.load_test_tokens(8) as tokens:
+            self.tokens = tokens
+            results = self._compare(options)
+        self._report(results)
+
+    def _compare(self, options):
+        results = {}
+        for name in options['servers']:
+            with _Server(name, 1) as server:
+                self._load(server, options['concurrency'], options['warmup'])
+                worker_mb = max(
+                    _rss_mb(pid) for pid in _children(server.process.pid)
+                )
+            workers = max(1, int(options['memory_mb'] // worker_mb))
+            self.stdout.write(
+                f'{name}: воркер ~{worker_mb:.0f} МБ, воркеров: {workers}'
+            )
+            with _Server(name, workers) as server:
+                self._load(server, options['concurrency'], options['warmup'])
+                summary = self._load(
+                    server, options['concurrency'], options['duration']
+                )
+                summary['workers'] = workers
+                summary['rss_mb'] = sum(
+                    _rss_mb(pid) for pid in _children(server.process.pid)
+                )
+            results[name] = summary
+        return results
+
+    def _load(self, server, concurrency, duration):
+        started, samples = loadtest.run(
+            self.scenario,
+            loadtest.HttpTarget(server.url),
+            concurrency=concurrency,
+            duration=duration,
+            tokens=self.tokens,
+            recipe_ids=self.recipe_ids,
+        )
+        return loadtest.summarize(started, samples, duration, duration)['total']
+
+    def _report(self, results):
+        self.stdout.write(
+            f"{'':6}{'воркеры':>9}{'RSS, МБ':>9}{'rps':>9}"
+            f"{'p50':>9}{'p95':>9}{'p99':>9}{'ошибки':>9}"
+        )
+        for name, total in results.items():
+            latency = total['latency_ms']
+            self.stdout.write(
+                f"{name:6}{total['workers']:>9}{total['rss_mb']:>9.0f}"
+                f"{total['rps']:>9}{latency['p50']:>9}{latency['p95']:>9}"
+                f"{latency['p99']:>9}{total['error_rate']:>9.2%}"
+            )
+
+
+class _Server:
+    """gunicorn в дочернем процессе на свободном порту."""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.port = _free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+
+    def __enter__(self):
+        config = SERVERS[self.name]
+        # gunicorn.conf.py очищает каталог метрик при старте: у замера
+        # свой каталог, чтобы не стереть метрики рабочего сервера.
+        self.metrics_dir = tempfile.mkdtemp(prefix='foodgram-compare-')
+        self.process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', *config['args'],
+                '--workers', str(self.workers),
+                '--bind', f'127.0.0.1:{self.port}',
+            ],
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                **config['env'],
+                'PROMETHEUS_MULTIPROC_DIR': self.metrics_dir,
+            },
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                urllib.request.urlopen(f'{self.url}/api/recipes/', timeout=1)
+                if len(_children(self.process.pid)) >= self.workers:
+                    return self
+            except OSError:
+                pass
+            if self.process.poll() is not None:
+                break
+            time.sleep(0.2)
+        self.__exit__()
+        raise CommandError(f'Сервер {self.name} не запустился')
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
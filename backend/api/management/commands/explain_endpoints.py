@@ -0,0 +1,152 @@
+"""Команда Django для проверки планов запросов API через EXPLAIN ANALYZE."""
+
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Lower
+from django.http import QueryDict
+from django.utils import timezone
+
+from api.queries import filter_recipes, recipes_for_read
+from formulas.models import (
+    Dish,
+    FavoriteRecipe,
+    Follow,
+    Ingredient,
+    IngredientAmount,
+    ShoppingCart,
+    UserAccount,
+)
+
+PAGE = 6
+
+
+def endpoint_querysets(user, dish, prefix):
+    """Выборки, которые выполняют эндпоинты API, по имени эндпоинта.
+
+    Параметры передаются как ``QueryDict``, как в запросе: фильтры читают
+    списки через ``getlist``.
+    """
+    recipes = recipes_for_read(user)
+    return {
+        'recipes-list': filter_recipes(recipes, QueryDict(), user)[:PAGE],
+        'recipes-list?author': filter_recipes(
+            recipes, QueryDict(f'author={dish.creator_id}'), user
+        )[:PAGE],
+        'recipes-list?is_favorited': filter_recipes(
+            recipes, QueryDict('is_favorited=1'), user
+        )[:PAGE],
+        'recipes-list?is_in_shopping_cart': filter_recipes(
+            recipes, QueryDict('is_in_shopping_cart=1'), user
+        )[:PAGE],
+        'recipes-list?ordering=popular': filter_recipes(
+            recipes, QueryDict('ordering=popular'), user
+        )[:PAGE],
+        'recipes-list?ordering=trending': filter_recipes(
+            recipes, QueryDict('ordering=trending'), user
+        )[:PAGE],
+        'recipes-detail': recipes.filter(pk=dish.pk),
+        'recipes-ingredients (prefetch)': IngredientAmount.objects.filter(
+            dish__in=[dish.pk]
+        ).select_related('ingredient'),
+        'recipes-changes': Dish.objects.filter(
+            updated_at__gt=timezone.now() - timedelta(days=1)
+        ).order_by('updated_at', 'id')[:PAGE],
+        'recipes-shopping-cart-summary': user.cart_totals.select_related(
+            'ingredient'
+        ).order_by(Lower('ingredient__name')),
+        'recipes-favorites (recent)': FavoriteRecipe.objects.filter(
+            user=user
+        ).order_by('-id')[:PAGE],
+        'recipes-shopping-cart (recent)': ShoppingCart.objects.filter(
+            user=user
+        ).order_by('-id')[:PAGE],
+        'ingredients-list?name': Ingredient.objects.filter(
+            name__istartswith=prefix
+        ),
+        'users-list': UserAccount.objects.all()[:PAGE],
+        'users-subscriptions': Follow.objects.filter(
+            follower=user
+        ).select_related('following')[:PAGE],
+    }
+
+
+def _walk(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from _walk(child)
+
+
+def problems(plan, threshold):
+    """Последовательные сканирования и сортировки крупнее ``threshold`` строк."""
+    found = []
+    for node in _walk(plan):
+        loops = node.get('Actual Loops', 1)
+        if node['Node Type'] == 'Seq Scan':
+            rows = (
+                node.get('Actual Rows', 0) + node.get('Rows Removed by Filter', 0)
+            ) * loops
+            if rows >= threshold:
+                found.append(
+                    f"Seq Scan по {node['Relation Name']}: {rows} строк"
+                )
+        elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+            rows = node.get('Actual Rows', 0) * loops
+            if rows >= threshold:
+                found.append(
+                    f"{node['Node Type']} ({', '.join(node['Sort Key'])}): "
+                    f"{rows} строк, {node.get('Sort Method', '?')}"
+                )
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN ANALYZE для выборок эндпоинтов API и отмечает '
+        'последовательные сканирования и сортировки больших объёмов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold', type=int, default=1000,
+            help='Порог числа строк для предупреждения',
+        )
+        parser.add_argument(
+            '--user', help='email пользователя для персональных выборок'
+        )
+        parser.add_argument('--prefix', default='а', help='Префикс поиска')
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Печатать текстовые планы запросов',
+        )
+
+    def handle(self, *args, **options):
+        users = UserAccount.objects.order_by('id')
+        user = (
+            users.filter(email=options['user']).first()
+            if options['user'] else users.first()
+        )
+        dish = Dish.objects.order_by('-id').first()
+        if user is None or dish is None:
+            raise CommandError('Нужны хотя бы один пользователь и один рецепт')
+
+        flagged = 0
+        querysets = endpoint_querysets(user, dish, options['prefix'])
+        for name, queryset in querysets.items():
+            plan = json.loads(queryset.explain(analyze=True, format='json'))[0]
+            found = problems(plan['Plan'], options['threshold'])
+            flagged += bool(found)
+            status = (
+                self.style.WARNING('ВНИМАНИЕ') if found else self.style.SUCCESS('OK')
+            )
+            self.stdout.write(
+                f"{status} {name}: {plan['Execution Time']:.2f} мс"
+            )
+            for problem in found:
+                self.stdout.write(f"    {problem}")
+            if options['verbose_plans']:
+                self.stdout.write(queryset.explain(analyze=True))
+        self.stdout.write(
+            f"Эндпоинтов с проблемами: {flagged} из {len(querysets)}"
+        )
@@ -0,0 +1,115 @@
+"""Команда Django для нагрузочного тестирования API."""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import loadtest
+from formulas.models import Dish
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает API конкурентными запросами по сценарию персон и выводит '
+        'пропускную способность, перцентили задержек и долю ошибок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера; без него запросы идут '
+                 'в WSGI-приложение внутри процесса',
+        )
+        parser.add_argument('--scenario', help='JSON-файл со сценарием')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--duration', type=float, default=30, help='Длительность, с'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Шаг временного ряда в отчёте, с',
+        )
+        parser.add_argument(
+            '--users', type=int, default=8,
+            help='Сколько выделенных пользователей loadtest-N использовать '
+                 'для запросов с авторизацией',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('-o', '--output', help='Сохранить результаты в JSON')
+        parser.add_argument(
+            '--compare', help='JSON с результатами прошлого прогона для сравнения'
+        )
+
+    def handle(self, *args, **options):
+        recipe_ids = list(Dish.objects.values_list('id', flat=True)[:1000])
+        if not recipe_ids:
+            raise CommandError('В базе нет рецептов для сценария')
+        try:
+            scenario = loadtest.load_scenario(options['scenario'])
+        except ValueError as error:
+            raise CommandError(f'Некорректный сценарий: {error}')
+
+        target = (
+            loadtest.HttpTarget(options['url'])
+            if options['url']
+            else loadtest.InProcessTarget()
+        )
+        with loadtest.load_test_tokens(options['users']) as tokens:
+            started, samples = loadtest.run(
+                scenario,
+                target,
+                concurrency=options['concurrency'],
+                duration=options['duration'],
+                tokens=tokens,
+                recipe_ids=recipe_ids,
+                seed=options['seed'],
+            )
+        results = {
+            'config': {
+                key: options[key]
+                for key in ('url', 'scenario', 'concurrency', 'duration', 'seed')
+            },
+            **loadtest.summarize(
+                started, samples, options['duration'], options['interval']
+            ),
+        }
+        previous = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)
+        self._report(results, previous)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результаты сохранены в {options['output']}")
+
+    def _line(self, name, stats, previous=None):
+        latency = stats['latency_ms']
+        line = (
+            f"{name:<32} {stats['requests']:>7} {stats['rps'] or 0:>8.1f} "
+            f"{latency['p50'] or 0:>8.1f} {latency['p95'] or 0:>8.1f} "
+            f"{latency['p99'] or 0:>8.1f} {stats['error_rate']:>7.2%}"
+        )
+        if previous:
+            rps_delta = (stats['rps'] or 0) - (previous['rps'] or 0)
+            p95_delta = (latency['p95'] or 0) - (previous['latency_ms']['p95'] or 0)
+            line += f"  Δrps {rps_delta:+.1f} Δp95 {p95_delta:+.1f}"
+        return line
+
+    def _report(self, results, previous):
+        header = (
+            f"{'запрос':<32} {'всего':>7} {'rps':>8} {'p50 мс':>8} "
+            f"{'p95 мс':>8} {'p99 мс':>8} {'ошибки':>7}"
+        )
+        self.stdout.write(header)
+        for name, stats in results['requests'].items():
+            self.stdout.write(self._line(
+                name, stats, previous and previous['requests'].get(name)
+            ))
+        self.stdout.write(self.style.SUCCESS(self._line(
+            'ИТОГО', results['total'], previous and previous['total']
+        )))
+        self.stdout.write('\nПо интервалам:')
+        for point in results['timeline']:
+            self.stdout.write(self._line(f"+{point['second']:g} с", point))
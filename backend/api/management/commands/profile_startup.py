@@ -0,0 +1,186 @@
+"""Команда Django для профилирования старта воркера.
+
+Каждый замер идёт в отдельном процессе Python с ``-X importtime``: так
+видно время импорта каждого модуля, время ``django.setup()`` и загрузки
+WSGI-приложения, прогрева и первых запросов. Замер повторяется без
+прогрева и с ним, чтобы было видно, сколько прогрев снимает с первого
+запроса. С ``--json`` результат удобно сохранять и сравнивать между
+релизами.
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Выполняется в дочернем процессе; аргументы: путь запроса, хост, прогрев.
+CHILD = '''
+import json, os, sys, time
+from wsgiref.util import setup_testing_defaults
+
+started = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "foodgram.settings")
+import django
+django.setup(set_prefix=False)
+setup = time.perf_counter()
+from django.core.handlers.wsgi import WSGIHandler
+application = WSGIHandler()
+loaded = time.perf_counter()
+steps = {}
+if sys.argv[3] == "1":
+    from foodgram.warmup import warm_up
+    steps = warm_up()
+warmed = time.perf_counter()
+path, _, query = sys.argv[1].partition("?")
+
+def request():
+    environ = {"PATH_INFO": path, "QUERY_STRING": query,
+               "HTTP_HOST": sys.argv[2]}
+    setup_testing_defaults(environ)
+    statuses = []
+    began = time.perf_counter()
+    body = application(environ, lambda status, *_: statuses.append(status))
+    b"".join(body)
+    body.close()
+    return time.perf_counter() - began, statuses[0]
+
+first, status = request()
+second, _ = request()
+print(json.dumps({
+    "setup": setup - started,
+    "application": loaded - setup,
+    "warm_up": warmed - loaded,
+    "warm_up_steps": steps,
+    "first_request": first,
+    "second_request": second,
+    "status": status,
+}))
+'''
+
+
+def _host():
+    for host in settings.ALLOWED_HOSTS:
+        if host and host != '*' and not host.startswith('.'):
+            return host
+    return 'localhost'
+
+
+def _parse_importtime(stderr):
+    """Строки ``-X importtime`` → модули с собственным и полным временем, с."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        if not own.strip().isdigit():
+            continue
+        modules.append({
+            'module': name.strip(),
+            'self': int(own) / 1e6,
+            'cumulative': int(cumulative) / 1e6,
+        })
+    return modules
+
+
+def _measure(path, host, warm_up):
+    result = subprocess.run(
+        [
+            sys.executable, '-X', 'importtime', '-c', CHILD,
+            path, host, '1' if warm_up else '0',
+        ],
+        cwd=Path(settings.BASE_DIR),
+        capture_output=True,
+        text=True,
+    )
+    lines = result.stdout.strip().splitlines()
+    if result.returncode or not lines:
+        errors = [
+            line for line in result.stderr.splitlines()
+            if not line.startswith('import time:')
+        ]
+        raise CommandError('\n'.join(errors[-20:]) or 'Замер не удался')
+    report = json.loads(lines[-1])
+    report['imports'] = _parse_importtime(result.stderr)
+    return report
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет время импорта модулей, загрузки приложения, прогрева и '
+        'первого запроса в свежем процессе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default='/api/recipes/',
+            help='Запрос, время которого измеряется',
+        )
+        parser.add_argument(
+            '--top', type=int, default=25,
+            help='Сколько самых медленных импортов показать',
+        )
+        parser.add_argument(
+            '--sort', choices=('cumulative', 'self'), default='cumulative',
+            help='Сортировка импортов: с вложенными модулями или без',
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Вывести результат в JSON для сравнения между релизами',
+        )
+
+    def handle(self, *args, **options):
+        host = _host()
+        cold = _measure(options['path'], host, warm_up=False)
+        warm = _measure(options['path'], host, warm_up=True)
+        imports = sorted(
+            cold.pop('imports'), key=lambda row: -row[options['sort']]
+        )
+        total_imports = sum(row['self'] for row in imports)
+        warm.pop('imports')
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'path': options['path'],
+                'imports_total': total_imports,
+                'imports': imports[:options['top']],
+                'cold': cold,
+                'warm': warm,
+            }, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(
+            f'Импорт модулей всего: {total_imports * 1000:.0f} мс '
+            f'({len(imports)} модулей)'
+        )
+        self.stdout.write(f'{"свой, мс":>10} {"всего, мс":>10}  модуль')
+        for row in imports[:options['top']]:
+            self.stdout.write(
+                f'{row["self"] * 1000:10.1f} '
+                f'{row["cumulative"] * 1000:10.1f}  {row["module"]}'
+            )
+        self.stdout.write('')
+        self.stdout.write(
+            f'{"":24}{"без прогрева":>14}{"с прогревом":>14}'
+        )
+        for key, title in (
+            ('setup', 'django.setup(), мс'),
+            ('application', 'WSGI-приложение, мс'),
+            ('warm_up', 'прогрев, мс'),
+            ('first_request', 'первый запрос, мс'),
+            ('second_request', 'второй запрос, мс'),
+        ):
+            self.stdout.write(
+                f'{title:24}{cold[key] * 1000:14.1f}{warm[key] * 1000:14.1f}'
+            )
+        self.stdout.write(
+            'Шаги прогрева, мс: ' + ', '.join(
+                f'{name} {seconds * 1000:.0f}'
+                for name, seconds in warm['warm_up_steps'].items()
+            )
+        )
+        self.stdout.write(
+            f'Ответ на {options["path"]}: {cold["status"]}'
+        )
@@ -1,5 +1,12 @@
 """Настройка пользовательской пагинации для API."""
 
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from rest_framework.pagination import PageNumberPagination
 
 
@@ -13,3 +20,121 @@ class PageNumberLimitPagination(PageNumberPagination):
     """
     page_size_query_param = "limit"
     page_size = 6
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, избегающий точного ``COUNT(*)`` на больших выборках.
+
+    Для выборки без фильтров берётся оценка планировщика
+    (``pg_class.reltuples``); собственный фильтр менеджера модели
+    (скрытие мягко удалённых записей) фильтром не считается. Для
+    остальных выборок точное значение кешируется на ``COUNT_CACHE_TTL``
+    секунд. Оба способа включаются только начиная с
+    ``COUNT_ESTIMATE_THRESHOLD`` строк: маленькие выборки всегда
+    считаются точно.
+    """
+
+    def _is_unfiltered(self):
+        query = getattr(self.object_list, "query", None)
+        if query is None:
+            return False
+        manager_query = query.model._default_manager.all().query
+        return (
+            query.where == manager_query.where
+            and not query.combinator
+            and not query.distinct
+            and query.low_mark == 0
+            and query.high_mark is None
+        )
+
+    def _planner_estimate(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [connection.ops.quote_name(queryset.model._meta.db_table)],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _cache_key(self):
+        sql, params = self.object_list.query.sql_with_params()
+        digest = hashlib.md5(f"{sql}{params}".encode()).hexdigest()
+        return f"pagination-count:{digest}"
+
+    @cached_property
+    def _count_info(self):
+        """Пара (число записей, признак приближённого значения)."""
+        threshold = settings.COUNT_ESTIMATE_THRESHOLD
+        if not hasattr(self.object_list, "query"):
+            return super().count, False
+
+        if self._is_unfiltered():
+            estimate = self._planner_estimate()
+            if estimate is not None and estimate >= threshold:
+                return estimate, True
+
+        key = self._cache_key()
+        cached = cache.get(key)
+        if cached is not None:
+            return cached, True
+
+        count = self.object_list.count()
+        if count >= threshold:
+            cache.set(key, count, settings.COUNT_CACHE_TTL)
+        return count, False
+
+    @property
+    def count(self):
+        return self._count_info[0]
+
+    @property
+    def count_estimated(self):
+        return self._count_info[1]
+
+    def validate_number(self, number):
+        if not self.count_estimated:
+            return super().validate_number(number)
+        # Оценка может отставать от реального числа строк — не отсекаем
+        # страницы за её пределами.
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages["invalid_page"])
+        if number < 1:
+            raise EmptyPage(self.error_messages["min_page"])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_estimated:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+
+class EstimatedCountPagination(PageNumberLimitPagination):
+    """Пагинация с приближённым ``count`` для больших списков.
+
+    В ответ добавляется поле ``count_estimated``: ``true``, если число
+    записей взято из оценки планировщика или из кеша.
+    """
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["count_estimated"] = self.page.paginator.count_estimated
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema["properties"]["count_estimated"] = {
+            "type": "boolean",
+            "example": False,
+        }
+        return schema
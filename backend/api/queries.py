@@ -0,0 +1,133 @@
+"""Выборки рецептов для чтения, общие для синхронных и асинхронных views."""
+
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Value,
+)
+
+from formulas.models import (
+    Dish,
+    FavoriteRecipe,
+    Follow,
+    IngredientAmount,
+    ShoppingCart,
+    UserAccount,
+)
+
+from .filters import apply_filters
+
+RANKINGS = {
+    "popular": "popularity__popular_score",
+    "trending": "popularity__trending_score",
+}
+
+
+def with_user_flags(queryset, user):
+    """Аннотирует рецепты флагами текущего пользователя.
+
+    ``is_favorited``, ``is_in_shopping_cart`` и ``creator_is_subscribed``
+    считаются подзапросами ``EXISTS`` в том же запросе, поэтому
+    сериализатору не нужно обращаться к базе для каждого рецепта.
+    Сам рецепт и его автор уже видимы, поэтому подзапросы идут через
+    ``_base_manager`` без проверки мягкого удаления.
+    """
+    if not user.is_authenticated:
+        return queryset.annotate(
+            is_favorited=Value(False),
+            is_in_shopping_cart=Value(False),
+            creator_is_subscribed=Value(False),
+        )
+    return queryset.annotate(
+        is_favorited=Exists(
+            FavoriteRecipe._base_manager.filter(
+                user=user, dish=OuterRef("pk")
+            )
+        ),
+        is_in_shopping_cart=Exists(
+            ShoppingCart._base_manager.filter(
+                user=user, dish=OuterRef("pk")
+            )
+        ),
+        creator_is_subscribed=Exists(
+            Follow._base_manager.filter(
+                follower=user, following=OuterRef("creator")
+            )
+        ),
+    )
+
+
+def recipes_for_read(user):
+    """Рецепты со всем, что нужно ``RecipeReadSerializer``."""
+    return with_user_flags(
+        Dish.objects.select_related("creator").prefetch_related(Prefetch(
+            "recipe_ingredients",
+            queryset=IngredientAmount.objects.select_related("ingredient"),
+        )),
+        user,
+    )
+
+
+def recipe_bundle(user, pk, limit):
+    """Рецепт для страницы и до ``limit`` других рецептов его автора.
+
+    Три запроса при любом числе ингредиентов и рецептов: рецепт с автором,
+    флагами и числом рецептов автора, его ингредиенты и рецепты автора.
+    Возвращает ``(None, [])``, если рецепта нет.
+    """
+    recipe = recipes_for_read(user).annotate(
+        creator_recipes_count=Subquery(
+            Dish.objects.filter(creator=OuterRef("creator"))
+            .order_by()
+            .values("creator")
+            .annotate(total=Count("pk"))
+            .values("total"),
+            output_field=IntegerField(),
+        )
+    ).filter(pk=pk).first()
+    if recipe is None:
+        return None, []
+    others = with_user_flags(
+        Dish.objects.filter(creator_id=recipe.creator_id)
+        .exclude(pk=recipe.pk)
+        .only("id", "title", "image", "cook_time")
+        .order_by("-created_at"),
+        user,
+    )[:limit]
+    return recipe, list(others)
+
+
+def filter_recipes(queryset, params, user):
+    """Фильтры (см. ``api.filters``) и сортировка списка по GET-параметрам."""
+    queryset = apply_filters(queryset, params, user)
+    if ranking := RANKINGS.get(params.get("ordering")):
+        queryset = queryset.filter(popularity__isnull=False).order_by(
+            f"-{ranking}", "-id"
+        )
+    return queryset
+
+
+def suggested_authors(user, limit):
+    """Рекомендуемые авторы из ``AuthorSuggestion`` одним запросом.
+
+    Авторы, на которых пользователь подписался после пересчёта, и удалённые
+    с тех пор пользователи пропускаются.
+    """
+    return (
+        UserAccount.objects.filter(suggested_to__user=user)
+        .exclude(
+            Exists(Follow._base_manager.filter(
+                follower=user, following=OuterRef("pk")
+            ))
+        )
+        .annotate(
+            score=F("suggested_to__score"),
+            is_subscribed=Value(False),
+        )
+        .order_by("-score", "pk")[:limit]
+    )
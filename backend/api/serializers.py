@@ -1,11 +1,15 @@
 """Сериализаторы для API-приложения foodgram."""
 
+from django.conf import settings
 from django.core.validators import MinValueValidator
+from django.db import transaction
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from formulas import cart_totals, fingerprints
 from formulas.models import (
+    CartIngredientTotal,
     UserAccount,
     Follow,
     Ingredient,
@@ -38,6 +42,26 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "measurement_unit", "amount")
 
 
+class CartTotalSerializer(serializers.ModelSerializer):
+    """Суммарное количество ингредиента в корзине покупок."""
+    id = serializers.ReadOnlyField(source="ingredient.id")
+    name = serializers.ReadOnlyField(source="ingredient.name")
+    measurement_unit = serializers.ReadOnlyField(source="ingredient.measurement_unit")
+
+    class Meta:
+        model = CartIngredientTotal
+        fields = ("id", "name", "measurement_unit", "amount")
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного добавления или удаления."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=settings.BULK_RELATIONS_LIMIT,
+    )
+
+
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Краткое представление рецепта для подписок и списков."""
 
@@ -47,6 +71,29 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class AuthorRecipeSerializer(ShortRecipeSerializer):
+    """Краткий рецепт с флагами текущего пользователя из аннотаций."""
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
+
+    class Meta(ShortRecipeSerializer.Meta):
+        fields = (
+            *ShortRecipeSerializer.Meta.fields,
+            "is_favorited",
+            "is_in_shopping_cart",
+        )
+        read_only_fields = fields
+
+
+class DuplicateRecipeSerializer(ShortRecipeSerializer):
+    """Рецепт с тем же или похожим набором ингредиентов."""
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(ShortRecipeSerializer.Meta):
+        fields = (*ShortRecipeSerializer.Meta.fields, "similarity")
+        read_only_fields = fields
+
+
 class PublicUserSerializer(DjoserUserSerializer):
     """Сериализатор пользователя с полем подписки."""
     is_subscribed = serializers.SerializerMethodField()
@@ -63,6 +110,8 @@ class PublicUserSerializer(DjoserUserSerializer):
         )
 
     def get_is_subscribed(self, user):
+        if hasattr(user, "is_subscribed"):
+            return user.is_subscribed
         request = self.context.get("request")
         return (
             request
@@ -114,6 +163,14 @@ class DishReadSerializer(serializers.ModelSerializer):
         )
 
 
+class SuggestedAuthorSerializer(PublicUserSerializer):
+    """Рекомендуемый автор с оценкой рекомендации."""
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(PublicUserSerializer.Meta):
+        fields = (*PublicUserSerializer.Meta.fields, "score")
+
+
 class SubscribedAuthorSerializer(PublicUserSerializer):
     """Сериализатор автора с рецептами и их количеством."""
     recipes = serializers.SerializerMethodField()
@@ -146,7 +203,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             "title",
             "description",
             "image",
-            "creator",
+            "author",
             "cook_time",
             "ingredients",
             "is_favorited",
@@ -154,7 +211,14 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
         read_only_fields = fields
 
+    def to_representation(self, recipe):
+        if hasattr(recipe, "creator_is_subscribed"):
+            recipe.creator.is_subscribed = recipe.creator_is_subscribed
+        return super().to_representation(recipe)
+
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, "is_favorited"):
+            return recipe.is_favorited
         request = self.context.get("request")
         return (
             request
@@ -163,6 +227,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, "is_in_shopping_cart"):
+            return recipe.is_in_shopping_cart
         request = self.context.get("request")
         return (
             request
@@ -184,10 +250,41 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             "title",
             "description",
             "image",
-            "cook_time",
-            "recipe_ingredients",
+            "cooking_time",
+            "ingredients",
         )
 
+    def validate(self, data):
+        ingredient_ids = [
+            item["ingredient"].id
+            for item in data.get("recipe_ingredients", [])
+        ]
+        if len(set(ingredient_ids)) != len(ingredient_ids):
+            raise serializers.ValidationError(
+                {"ingredients": "Ингредиенты не должны повторяться"}
+            )
+        self._fingerprint = fingerprints.fingerprint(ingredient_ids)
+
+        creator = (
+            self.instance.creator if self.instance
+            else self.context["request"].user
+        )
+        duplicates = Dish.objects.filter(
+            ingredients_hash=self._fingerprint["ingredients_hash"],
+            creator=creator,
+        )
+        if self.instance:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        duplicate_ids = list(duplicates.values_list("pk", flat=True)[:5])
+        if duplicate_ids:
+            raise serializers.ValidationError({
+                "ingredients": (
+                    "У вас уже есть рецепт с таким же набором продуктов "
+                    f"(id: {', '.join(map(str, duplicate_ids))})"
+                )
+            })
+        return data
+
     @staticmethod
     def _bulk_save_ingredients(dish, items):
         IngredientAmount.objects.bulk_create(
@@ -201,13 +298,20 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         ingredients = validated_data.pop("recipe_ingredients", [])
-        dish = super().create(validated_data)
+        dish = super().create({**validated_data, **self._fingerprint})
         self._bulk_save_ingredients(dish, ingredients)
         return dish
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop("recipe_ingredients", [])
         instance.recipe_ingredients.all().delete()
-        dish = super().update(instance, validated_data)
+        dish = super().update(
+            instance, {**validated_data, **self._fingerprint}
+        )
         self._bulk_save_ingredients(dish, ingredients)
+        # bulk_create не отправляет сигналы, итоги корзин дополняем явно.
+        cart_totals.apply_dish_change(dish.id, {}, {
+            item["ingredient"].id: item["amount"] for item in ingredients
+        })
         return dish
@@ -0,0 +1,164 @@
+"""PDF-версия списка покупок.
+
+Рендер занимает сотни миллисекунд, поэтому идёт в ограниченном пуле
+процессов, а не в потоке запроса. Готовый PDF кешируется по хешу
+содержимого списка в общем для воркеров кеше ``PDF_CACHE``: повторная
+загрузка неизменной корзины отдаётся из кеша. Одновременные запросы
+одного списка ждут один рендер: внутри процесса — общий ``Future``,
+между процессами — блокировка участка файла ``PDF_LOCK_FILE``.
+"""
+
+import fcntl
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import caches
+
+FONT_NAME = "ShoppingList"
+# Участков файла блокировок; разные списки в одном участке рендерятся
+# по очереди.
+LOCK_SLOTS = 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+_lock_file = {"pid": None, "fd": None}
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def render(today, totals, titles, font):
+    """PDF списка покупок; выполняется в процессе пула."""
+    # reportlab нужен только процессам пула, воркер его не импортирует.
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import (
+        Paragraph,
+        SimpleDocTemplate,
+        Spacer,
+        Table,
+    )
+
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, font))
+    text = ParagraphStyle("text", fontName=FONT_NAME, fontSize=11, leading=15)
+    heading = ParagraphStyle(
+        "heading", parent=text, fontSize=16, leading=22, spaceAfter=6
+    )
+    rows = [
+        ["☐", name.capitalize(), f"{amount} {unit}"]
+        for name, unit, amount in totals
+    ]
+    story = [
+        Paragraph(f"Список покупок на {today}", heading),
+        Paragraph("Продукты:", text),
+    ]
+    if rows:
+        story.append(Table(
+            rows,
+            colWidths=(20, 300, 120),
+            hAlign="LEFT",
+            style=[("FONTNAME", (0, 0), (-1, -1), FONT_NAME)],
+        ))
+    story += [
+        Spacer(0, 12),
+        Paragraph("Рецепты, для которых нужны эти продукты:", text),
+    ]
+    story += [
+        Paragraph(f"{idx}. {escape(title)}", text)
+        for idx, title in enumerate(titles, 1)
+    ]
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4, title="Список покупок").build(story)
+    return buffer.getvalue()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: воркер gunicorn многопоточен под ASGI, fork небезопасен.
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _lock_fd():
+    with _executor_lock:
+        # После fork воркер открывает файл заново.
+        if _lock_file["pid"] != os.getpid():
+            _lock_file["fd"] = os.open(
+                settings.PDF_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o600
+            )
+            _lock_file["pid"] = os.getpid()
+        return _lock_file["fd"]
+
+
+def _render_once(key, slot, args):
+    """Рендерит PDF, если его уже не рендерит другой процесс."""
+    cache = caches[settings.PDF_CACHE]
+    fd = _lock_fd()
+    timeout = settings.PDF_RENDER_TIMEOUT
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+            break
+        except OSError:
+            pass
+        if (pdf := cache.get(key)) is not None:
+            return pdf
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        time.sleep(0.05)
+    try:
+        # Другой процесс мог дорендерить список, пока мы ждали.
+        if (pdf := cache.get(key)) is not None:
+            return pdf
+        pdf = _pool().submit(render, *args, settings.PDF_FONT).result(
+            timeout=timeout
+        )
+        cache.set(key, pdf, settings.PDF_CACHE_TIMEOUT)
+        return pdf
+    finally:
+        fcntl.lockf(fd, fcntl.LOCK_UN, 1, slot)
+
+
+def get_pdf(today, totals, titles):
+    """PDF списка из кеша или из пула; ``TimeoutError``, если не успел."""
+    args = (today, list(totals), list(titles))
+    digest = hashlib.sha256(
+        json.dumps(args, ensure_ascii=False).encode()
+    ).hexdigest()
+    key = f"shopping-list-pdf:{digest}"
+    if (pdf := caches[settings.PDF_CACHE].get(key)) is not None:
+        return pdf
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        return future.result(timeout=settings.PDF_RENDER_TIMEOUT)
+    try:
+        pdf = _render_once(key, int(digest[:8], 16) % LOCK_SLOTS, args)
+        future.set_result(pdf)
+        return pdf
+    except BaseException as error:
+        future.set_exception(error)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
@@ -0,0 +1,254 @@
+"""Тесты приложения 'api'."""
+
+import itertools
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from formulas.models import (
+    DeletedDish,
+    Dish,
+    FavoriteRecipe,
+    Ingredient,
+    IngredientAmount,
+    ShoppingCart,
+    UserAccount,
+)
+
+from .queries import filter_recipes, recipes_for_read
+
+
+def _plan(queryset):
+    """Корневой узел ``EXPLAIN (FORMAT JSON)``; psycopg разбирает JSON сам."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        return cursor.fetchone()[0][0]["Plan"]
+
+
+def _full_scans(plan):
+    """Таблицы и индексы, которые план читает целиком."""
+    scans = []
+    if plan["Node Type"] == "Seq Scan":
+        scans.append(plan["Relation Name"])
+    elif "Index Name" in plan and "Index Cond" not in plan:
+        scans.append(plan["Index Name"])
+    for child in plan.get("Plans", ()):
+        scans += _full_scans(child)
+    return scans
+
+
+class RecipeFilterTests(TestCase):
+    """Каждая комбинация фильтров списка рецептов даёт верный результат
+    и план без полного чтения таблиц."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author, cls.other = (
+            UserAccount.objects.create(
+                email=f"{name}@example.com", username=name
+            )
+            for name in ("user", "author", "other")
+        )
+        cls.salt, cls.egg, cls.milk = (
+            Ingredient.objects.create(name=name, measurement_unit="г")
+            for name in ("соль", "яйцо", "молоко")
+        )
+        cls.dishes = []
+        for number in range(12):
+            dish = Dish.objects.create(
+                title=f"рецепт {number}",
+                description="описание",
+                creator=(cls.author, cls.other, cls.user)[number % 3],
+                cook_time=5 * (number + 1),
+            )
+            ingredients = [
+                ingredient
+                for bit, ingredient in enumerate(
+                    (cls.salt, cls.egg, cls.milk)
+                )
+                if number >> bit & 1
+            ]
+            for ingredient in ingredients:
+                IngredientAmount.objects.create(
+                    dish=dish, ingredient=ingredient, amount=1
+                )
+            dish.ingredient_set = set(ingredients)
+            cls.dishes.append(dish)
+        for dish in cls.dishes[::2]:
+            FavoriteRecipe.objects.create(user=cls.user, dish=dish)
+        for dish in cls.dishes[::3]:
+            ShoppingCart.objects.create(user=cls.user, dish=dish)
+        favorites = set(cls.dishes[::2])
+        cart = set(cls.dishes[::3])
+
+        # Параметры фильтра и проверка рецепта на соответствие ему.
+        cls.filters = {
+            "author": (
+                f"author={cls.author.pk}&author={cls.other.pk}",
+                lambda dish: dish.creator in (cls.author, cls.other),
+            ),
+            "cook_time": (
+                "cook_time_min=15&cook_time_max=45",
+                lambda dish: 15 <= dish.cook_time <= 45,
+            ),
+            "ingredients": (
+                f"ingredients={cls.salt.pk},{cls.egg.pk}",
+                lambda dish: {cls.salt, cls.egg} <= dish.ingredient_set,
+            ),
+            "exclude_ingredients": (
+                f"exclude_ingredients={cls.milk.pk}",
+                lambda dish: cls.milk not in dish.ingredient_set,
+            ),
+            "is_favorited": (
+                "is_favorited=1", lambda dish: dish in favorites
+            ),
+            "is_in_shopping_cart": (
+                "is_in_shopping_cart=1", lambda dish: dish in cart
+            ),
+        }
+
+    def test_filter_combinations(self):
+        with connection.cursor() as cursor:
+            # Таблицы крошечные; без этого планировщик всегда читает их
+            # целиком, даже если подходящий индекс есть.
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        for size in range(1, len(self.filters) + 1):
+            for names in itertools.combinations(self.filters, size):
+                with self.subTest(filters=names):
+                    params = QueryDict(
+                        "&".join(self.filters[name][0] for name in names)
+                    )
+                    queryset = filter_recipes(
+                        recipes_for_read(self.user), params, self.user
+                    )
+                    expected = {
+                        dish.pk
+                        for dish in self.dishes
+                        if all(self.filters[name][1](dish) for name in names)
+                    }
+                    ids = list(queryset.values_list("pk", flat=True))
+                    self.assertEqual(len(ids), len(set(ids)))
+                    self.assertEqual(set(ids), expected)
+
+                    self.assertNotIn("DISTINCT", str(queryset.query))
+                    # Исключение ингредиентов не сужает выборку: рецепты
+                    # читаются в порядке списка и проверяются по индексу.
+                    allowed = (
+                        [] if set(names) - {"exclude_ingredients"}
+                        else ["dish_created_at_idx"]
+                    )
+                    self.assertEqual(_full_scans(_plan(queryset)), allowed)
+
+    def test_invalid_values_are_rejected(self):
+        client = APIClient()
+        for query in (
+            "author=x",
+            "cook_time_min=x",
+            "cook_time_min=20&cook_time_max=10",
+            "ingredients=" + ",".join(map(str, range(21))),
+        ):
+            with self.subTest(query=query):
+                response = client.get(f"/api/recipes/?{query}")
+                self.assertEqual(response.status_code, 400)
+
+
+class RecipeChangesTests(TestCase):
+    """Синхронизация изменений не теряет рецепты на границе страниц."""
+
+    def test_pages_split_equal_timestamps(self):
+        author = UserAccount.objects.create(
+            email="author@example.com", username="author"
+        )
+        stamp = timezone.now() - timedelta(hours=1)
+        dishes = Dish.objects.bulk_create(
+            Dish(
+                title=f"рецепт {number}",
+                description="описание",
+                creator=author,
+                cook_time=5,
+            )
+            for number in range(7)
+        )
+        Dish.objects.update(created_at=stamp, updated_at=stamp)
+
+        client = APIClient()
+        params = {"since": (stamp - timedelta(seconds=1)).isoformat()}
+        received = []
+        for _ in range(len(dishes)):
+            data = client.get(
+                "/api/recipes/changes/", {**params, "limit": 3}
+            ).data
+            received += [
+                recipe["id"] for recipe in data["created"] + data["updated"]
+            ]
+            params = {
+                "since": data["watermark"].isoformat(),
+                "since_id": data["watermark_id"],
+            }
+            if not data["has_more"]:
+                break
+        self.assertEqual(sorted(received), [dish.pk for dish in dishes])
+
+    def test_tombstones_share_the_page_limit(self):
+        stamp = timezone.now() - timedelta(hours=1)
+        DeletedDish.objects.bulk_create(
+            DeletedDish(dish_id=dish_id) for dish_id in range(1, 8)
+        )
+        DeletedDish.objects.update(deleted_at=stamp)
+
+        client = APIClient()
+        params = {}
+        received = []
+        for _ in range(7):
+            data = client.get(
+                "/api/recipes/changes/", {**params, "limit": 3}
+            ).data
+            self.assertLessEqual(len(data["deleted"]), 3)
+            received += data["deleted"]
+            params = {
+                "since": data["watermark"].isoformat(),
+                "since_id": data["watermark_id"],
+            }
+            if not data["has_more"]:
+                break
+        self.assertEqual(sorted(received), list(range(1, 8)))
+
+    def test_invalid_limit_is_rejected(self):
+        client = APIClient()
+        for query in ("limit=x", "since_id=x"):
+            with self.subTest(query=query):
+                response = client.get(f"/api/recipes/changes/?{query}")
+                self.assertEqual(response.status_code, 400)
+
+
+class ExplainEndpointsTests(TestCase):
+    """Команда ``explain_endpoints`` проходит по всем выборкам."""
+
+    def test_command_explains_every_endpoint(self):
+        author = UserAccount.objects.create(
+            email="author@example.com", username="author"
+        )
+        dish = Dish.objects.create(
+            title="рецепт", description="описание", creator=author, cook_time=5
+        )
+        IngredientAmount.objects.create(
+            dish=dish,
+            ingredient=Ingredient.objects.create(
+                name="соль", measurement_unit="г"
+            ),
+            amount=1,
+        )
+        FavoriteRecipe.objects.create(user=author, dish=dish)
+        ShoppingCart.objects.create(user=author, dish=dish)
+
+        out = StringIO()
+        call_command("explain_endpoints", stdout=out)
+        self.assertIn("recipes-list?is_favorited", out.getvalue())
+        self.assertIn("Эндпоинтов с проблемами: 0 из", out.getvalue())
@@ -0,0 +1,204 @@
+"""Ограничение частоты запросов по алгоритму token bucket.
+
+У каждого клиента на каждое действие есть «ведро» на ``N`` токенов при
+лимите ``N/период``; ведро равномерно пополняется за период, запрос
+тратит токен, а пустое ведро означает ответ 429 с ``Retry-After``.
+Действия и их лимиты задаются словарём ``throttle_scopes`` у view и
+``DEFAULT_THROTTLE_RATES`` в настройках DRF; ключ ``<действие>_ip`` —
+отдельный лимит на IP-адрес.
+
+Состояние вёдер общее для всех процессов gunicorn: файл, отображённый в
+память (``THROTTLE_STORE=file``), или кеш Django (``THROTTLE_STORE=cache``,
+в продакшене — общий для машин Redis или Memcached).
+"""
+
+import fcntl
+import functools
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import get_authorization_header
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+@functools.cache
+def parse_rate(rate):
+    """``"30/min"`` → ``(30, 60)``: ёмкость ведра и период в секундах."""
+    number, period = rate.split("/")
+    return int(number), PERIODS[period[0]]
+
+
+def _take(tokens, stamp, capacity, rate, now):
+    """Пополняет ведро к моменту ``now`` и тратит токен.
+
+    Возвращает остаток токенов и паузу до следующего токена (0, если
+    запрос разрешён).
+    """
+    tokens = min(capacity, tokens + max(now - stamp, 0) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / rate
+
+
+class FileBucketStore:
+    """Вёдра в файле, отображённом в память; общий для процессов машины.
+
+    Файл разбит на ячейки (хеш ключа, токены, время). Ключ ищется среди
+    ``PROBES`` соседних ячеек; если ни одна не подходит, занимается ячейка
+    с самым давним обращением, то есть ведро, которое давно наполнилось.
+    Процессы сериализуются блокировкой файла, потоки — ``threading.Lock``.
+    """
+
+    SLOT = struct.Struct("<Qdd")
+    PROBES = 8
+
+    def __init__(self, path, slots):
+        self.path = path
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _open(self):
+        # После fork воркер открывает файл заново.
+        if self._pid != os.getpid():
+            size = self.SLOT.size * self.slots
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._fd, self._map = fd, mmap.mmap(fd, size)
+            self._pid = os.getpid()
+        return self._map
+
+    def _find(self, buffer, digest):
+        oldest = None
+        for probe in range(self.PROBES):
+            offset = (digest + probe) % self.slots * self.SLOT.size
+            stored, _, stamp = self.SLOT.unpack_from(buffer, offset)
+            if stored in (digest, 0):
+                return offset
+            if oldest is None or stamp < oldest[1]:
+                oldest = (offset, stamp)
+        return oldest[0]
+
+    def consume(self, key, capacity, rate, now):
+        digest = int.from_bytes(
+            hashlib.blake2b(key.encode(), digest_size=8).digest(), "little"
+        ) or 1
+        with self._lock:
+            buffer = self._open()
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                offset = self._find(buffer, digest)
+                stored, tokens, stamp = self.SLOT.unpack_from(buffer, offset)
+                if stored != digest:
+                    tokens, stamp = capacity, now
+                tokens, wait = _take(tokens, stamp, capacity, rate, now)
+                self.SLOT.pack_into(buffer, offset, digest, tokens, now)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        return wait
+
+
+class CacheBucketStore:
+    """Вёдра в кеше Django.
+
+    Чтение и запись не атомарны, поэтому при одновременных запросах
+    одного клиента лимит может быть превышен на единицы запросов, как и у
+    стандартных throttle-классов DRF.
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def consume(self, key, capacity, rate, now):
+        key = f"throttle:{key}"
+        tokens, stamp = self.cache.get(key) or (capacity, now)
+        tokens, wait = _take(tokens, stamp, capacity, rate, now)
+        # Через capacity / rate секунд ведро полное и запись не нужна.
+        self.cache.set(key, (tokens, now), math.ceil(capacity / rate) + 1)
+        return wait
+
+
+@functools.cache
+def get_store():
+    if settings.THROTTLE_STORE == "cache":
+        return CacheBucketStore(settings.THROTTLE_CACHE)
+    return FileBucketStore(
+        settings.THROTTLE_FILE, settings.THROTTLE_FILE_SLOTS
+    )
+
+
+class BucketThrottle(BaseThrottle):
+    """Лимит действия view на клиента; действия без лимита не проверяются."""
+
+    rate_suffix = ""
+
+    def get_client_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = getattr(view, "throttle_scopes", {}).get(
+            getattr(view, "action", None)
+        )
+        if scope is None:
+            return True
+        scope += self.rate_suffix
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if not rate:
+            return True
+        capacity, period = parse_rate(rate)
+        self.delay = get_store().consume(
+            f"{scope}:{self.get_client_key(request)}",
+            capacity,
+            capacity / period,
+            time.time(),
+        )
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+
+class UserBucketThrottle(BucketThrottle):
+    """Лимит на пользователя.
+
+    Пользователь определяется по токену из заголовка без запроса к базе,
+    анонимный клиент — по IP-адресу.
+    """
+
+    def get_client_key(self, request):
+        auth = get_authorization_header(request).split()
+        if len(auth) == 2 and auth[0].lower() == b"token":
+            digest = hashlib.blake2b(auth[1], digest_size=16).hexdigest()
+            return f"token:{digest}"
+        return f"ip:{self.get_ident(request)}"
+
+
+class IPBucketThrottle(BucketThrottle):
+    """Лимит на IP-адрес, в том числе для нескольких аккаунтов за ним."""
+
+    rate_suffix = "_ip"
+
+    def get_client_key(self, request):
+        return self.get_ident(request)
+
+
+class EarlyThrottleMixin:
+    """Проверяет лимиты до аутентификации, прав и разбора тела запроса."""
+
+    def initial(self, request, *args, **kwargs):
+        super().check_throttles(request)
+        super().initial(request, *args, **kwargs)
+
+    def check_throttles(self, request):
+        """Лимиты уже проверены в ``initial``."""
@@ -1,8 +1,10 @@
 """Маршруты API-приложения: ViewSet'ы и вспомогательные endpoints."""
 
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from .async_views import async_read_urls
 from .views import IngredientViewSet, RecipeViewSet, UserViewSet
 
 api_router = DefaultRouter()
@@ -11,6 +13,7 @@ api_router.register(r"ingredients", IngredientViewSet, basename="ingredients")
 api_router.register(r"recipes", RecipeViewSet, basename="recipes")
 
 urlpatterns = [
+    *(async_read_urls() if settings.ASYNC_READ_VIEWS else []),
     path("", include(api_router.urls)),
     path("auth/", include("djoser.urls.authtoken")),
 ]
@@ -1,34 +1,93 @@
-from collections import defaultdict
-from django.http import FileResponse
+import io
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.http import FileResponse, StreamingHttpResponse
+from django.shortcuts import redirect
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.exceptions import ValidationError
-from rest_framework.generics import get_object_or_404
+from rest_framework.exceptions import (
+    APIException,
+    NotFound,
+    ValidationError,
+)
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import (
+    SAFE_METHODS,
+    IsAdminUser,
+    IsAuthenticated,
+    IsAuthenticatedOrReadOnly,
+)
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
-from rest_framework.request import SAFE_METHODS
 
 from formulas.models import (
+    DeletedDish,
     UserAccount,
-    Follow,
     Ingredient,
     Dish,
     FavoriteRecipe,
     ShoppingCart,
 )
-from .pagination import PageNumberLimitPagination
+from formulas import (
+    catalog,
+    deletion,
+    fingerprints,
+    recipe_import,
+    relations,
+)
+from formulas.export import iter_user_export
+from .pagination import EstimatedCountPagination
+from . import shopping_list
+from .queries import (
+    filter_recipes,
+    recipe_bundle,
+    recipes_for_read,
+    suggested_authors,
+    with_user_flags,
+)
 from .serializers import (
+    AuthorRecipeSerializer,
+    CartTotalSerializer,
+    DuplicateRecipeSerializer,
     IngredientSerializer,
     RecipeReadSerializer,
     RecipeWriteSerializer,
     ShortRecipeSerializer,
     SubscribedAuthorSerializer,
+    SuggestedAuthorSerializer,
     PublicUserSerializer,
+    RecipeIdsSerializer,
 )
+from .throttling import EarlyThrottleMixin
+
+
+class RenderUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "PDF не успел подготовиться, повторите запрос позже"
+    default_code = "render_unavailable"
+
+
+class ImportTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = (
+        "Файл больше, чем успевает импортироваться за один запрос; "
+        "загрузите его частями или командой import_recipes"
+    )
+    default_code = "import_too_large"
+
+
+def _parse_id(value):
+    """id из URL; нечисловое значение означает несуществующий объект."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise NotFound
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
@@ -47,11 +106,29 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
             else self.queryset
         )
 
+    def list(self, request, *args, **kwargs):
+        """Полный каталог отдаётся статическим файлом, если он собран."""
+        if "name" not in request.query_params:
+            if url := catalog.current_url():
+                return redirect(url)
+        return super().list(request, *args, **kwargs)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(EarlyThrottleMixin, viewsets.ModelViewSet):
     queryset = Dish.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly,)
-    pagination_class = PageNumberLimitPagination
+    pagination_class = EstimatedCountPagination
+    throttle_scopes = {
+        "create": "recipe_write",
+        "update": "recipe_write",
+        "partial_update": "recipe_write",
+        "destroy": "recipe_write",
+        "favorite": "relations",
+        "favorite_bulk": "relations",
+        "shopping_cart": "relations",
+        "shopping_cart_bulk": "relations",
+        "download_shopping_cart": "shopping_list",
+    }
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
@@ -59,30 +136,181 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return RecipeWriteSerializer
 
     def get_queryset(self):
-        qs = super().get_queryset()
-        params = self.request.query_params
-
-        if author := params.get("author"):
-            qs = qs.filter(creator_id=author)
-        if params.get("is_in_shopping_cart") == "1" and self.request.user.is_authenticated:
-            qs = qs.filter(shoppingcarts__user=self.request.user)
-        if params.get("is_favorited") == "1" and self.request.user.is_authenticated:
-            qs = qs.filter(favorites__user=self.request.user)
-        return qs
+        user = self.request.user
+        if self.request.method in SAFE_METHODS:
+            queryset = recipes_for_read(user)
+        else:
+            queryset = with_user_flags(super().get_queryset(), user)
+        return filter_recipes(queryset, self.request.query_params, user)
 
     def perform_create(self, serializer):
         serializer.save(creator=self.request.user)
 
+    def perform_destroy(self, instance):
+        deletion.schedule(instance)
+
+    @action(detail=False, methods=["get"], url_path="changes")
+    def changes(self, request):
+        """Рецепты, созданные, изменённые и удалённые после курсора.
+
+        Курсор — пара ``since`` и ``since_id`` из ``watermark`` и
+        ``watermark_id`` прошлого ответа: страница может оборваться
+        посреди рецептов с одинаковым ``updated_at``. Отдаются только
+        изменения старше ``CHANGES_SAFETY_MARGIN``: ``updated_at``
+        ставится до коммита, и более свежие транзакции ещё могут
+        добавить строки с меньшей меткой.
+        """
+        since = request.query_params.get("since")
+        since_id = request.query_params.get("since_id", 0)
+        if since is not None:
+            since = parse_datetime(since)
+            if since is None:
+                raise ValidationError(
+                    {"since": "Ожидается дата в формате ISO 8601"}
+                )
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+        try:
+            since_id = int(since_id)
+        except ValueError:
+            raise ValidationError({"since_id": "Ожидается целое число"})
+        try:
+            limit = int(
+                request.query_params.get("limit", settings.CHANGES_PAGE_SIZE)
+            )
+        except ValueError:
+            raise ValidationError({"limit": "Ожидается целое число"})
+        limit = max(1, min(limit, settings.CHANGES_PAGE_SIZE))
+        horizon = timezone.now() - timedelta(
+            seconds=settings.CHANGES_SAFETY_MARGIN
+        )
+        retention = horizon - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+
+        changed = Dish.objects.select_related("creator").prefetch_related(
+            "recipe_ingredients__ingredient"
+        ).filter(updated_at__lte=horizon).order_by("updated_at", "id")
+        deleted = DeletedDish.objects.filter(
+            deleted_at__lte=horizon
+        ).order_by("deleted_at", "dish_id")
+        if since is not None:
+            changed = changed.filter(
+                Q(updated_at__gt=since) | Q(updated_at=since, id__gt=since_id)
+            )
+            deleted = deleted.filter(
+                Q(deleted_at__gt=since)
+                | Q(deleted_at=since, dish_id__gt=since_id)
+            )
+        # Изменения и надгробия — одна лента по (метка, id): id удалённого
+        # рецепта среди живых уже не встречается, поэтому ключи не
+        # совпадают, и лимит страницы общий.
+        events = sorted(
+            [(dish.updated_at, dish.pk, dish) for dish in changed[:limit + 1]]
+            + [
+                (tombstone.deleted_at, tombstone.dish_id, None)
+                for tombstone in deleted[:limit + 1]
+            ],
+            key=lambda event: event[:2],
+        )
+        has_more = len(events) > limit
+        # Без since_id следующий запрос заново заберёт записи ровно с
+        # меткой watermark: повтор безвреден, пропуск — нет.
+        watermark, watermark_id = horizon, 0
+        if has_more:
+            events = events[:limit]
+            watermark, watermark_id = events[-1][:2]
+        changed = [dish for _, _, dish in events if dish is not None]
+        deleted = [dish_id for _, dish_id, dish in events if dish is None]
+
+        context = self.get_serializer_context()
+        return Response({
+            "watermark": watermark,
+            "watermark_id": watermark_id,
+            "has_more": has_more,
+            # Удаления старше срока хранения надгробий уже не видны.
+            "full_resync": since is not None and since < retention,
+            "created": RecipeReadSerializer(
+                [dish for dish in changed
+                 if since is None or dish.created_at > since],
+                many=True, context=context,
+            ).data,
+            "updated": RecipeReadSerializer(
+                [dish for dish in changed
+                 if since is not None and dish.created_at <= since],
+                many=True, context=context,
+            ).data,
+            "deleted": deleted,
+        })
+
+    @action(detail=True, methods=["get"], url_path="bundle")
+    def bundle(self, request, pk=None):
+        """Рецепт, автор с подпиской и другие рецепты автора одним ответом."""
+        try:
+            limit = int(request.query_params.get("recipes_limit", 6))
+        except ValueError:
+            raise ValidationError({"recipes_limit": "Ожидается целое число"})
+        recipe, others = recipe_bundle(
+            request.user, _parse_id(pk), min(max(limit, 0), 50)
+        )
+        if recipe is None:
+            raise NotFound
+        context = self.get_serializer_context()
+        return Response({
+            "recipe": RecipeReadSerializer(recipe, context=context).data,
+            "author_recipes": {
+                "count": recipe.creator_recipes_count - 1,
+                "results": AuthorRecipeSerializer(
+                    others, many=True, context=context
+                ).data,
+            },
+        })
+
+    @action(detail=True, methods=["get"], url_path="duplicates")
+    def duplicates(self, request, pk=None):
+        """Рецепты с тем же или похожим набором ингредиентов."""
+        dish = Dish.objects.filter(pk=_parse_id(pk)).only(
+            "ingredients_hash", "minhash", "lsh_bands"
+        ).first()
+        if dish is None:
+            raise NotFound
+        return Response(DuplicateRecipeSerializer(
+            fingerprints.similar(dish), many=True, context={"request": request}
+        ).data)
+
+    @action(detail=False, methods=["post"], url_path="import",
+            permission_classes=[IsAdminUser])
+    def import_recipes(self, request):
+        """Пакетный импорт рецептов из NDJSON (см. formulas.recipe_import).
+
+        Записи без ``author`` получают автором текущего пользователя.
+        Импорт идёт в синхронном воркере, поэтому тело ограничено
+        ``IMPORT_MAX_BODY_BYTES``: больший файл не успел бы до таймаута
+        gunicorn, и клиент не получил бы отчёт об уже записанных пачках.
+        """
+        try:
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            length = 0
+        if length > settings.IMPORT_MAX_BODY_BYTES:
+            raise ImportTooLarge
+        created, errors = [], []
+        for result in recipe_import.import_lines(
+            request.stream or (), request.user.pk
+        ):
+            (created if "id" in result else errors).append(result)
+        return Response({"created": created, "errors": errors})
+
     @staticmethod
     def _toggle_action(request, pk, model, label):
-        dish = get_object_or_404(Dish, pk=pk)
-
+        pk = _parse_id(pk)
         if request.method != "POST":
-            get_object_or_404(model, user=request.user, dish=dish).delete()
+            if not relations.remove_recipes(model, request.user.pk, [pk]):
+                raise NotFound
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-        obj, created = model.objects.get_or_create(user=request.user, dish=dish)
-        if not created:
+        dish = relations.add_recipe(model, request.user.pk, pk)
+        if dish is None:
+            raise NotFound
+        if not dish.created:
             raise ValidationError({
                 "error": f"Рецепт '{dish.title}' уже в {label}"
             })
@@ -92,6 +320,25 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
 
+    @staticmethod
+    def _bulk_toggle_action(request, model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        dish_ids = set(serializer.validated_data["recipes"])
+
+        if request.method != "POST":
+            removed = relations.remove_recipes(model, request.user.pk, dish_ids)
+            return Response({
+                "removed": removed,
+                "skipped": sorted(dish_ids.difference(removed)),
+            })
+
+        added = relations.add_recipes(model, request.user.pk, dish_ids)
+        return Response({
+            "added": added,
+            "skipped": sorted(dish_ids.difference(added)),
+        }, status=status.HTTP_201_CREATED if added else status.HTTP_200_OK)
+
     @action(detail=True, methods=["post", "delete"],
             url_path="favorite", permission_classes=[IsAuthenticated])
     def favorite(self, request, pk=None):
@@ -102,29 +349,56 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, pk=None):
         return self._toggle_action(request, pk, ShoppingCart, "корзине")
 
+    @action(detail=False, methods=["post", "delete"],
+            url_path="favorite", permission_classes=[IsAuthenticated])
+    def favorite_bulk(self, request):
+        return self._bulk_toggle_action(request, FavoriteRecipe)
+
+    @action(detail=False, methods=["post", "delete"],
+            url_path="shopping_cart", permission_classes=[IsAuthenticated])
+    def shopping_cart_bulk(self, request):
+        return self._bulk_toggle_action(request, ShoppingCart)
+
+    @action(detail=False, methods=["get"],
+            url_path="shopping_cart_summary", permission_classes=[IsAuthenticated])
+    def shopping_cart_summary(self, request):
+        totals = request.user.cart_totals.select_related("ingredient").order_by(
+            Lower("ingredient__name")
+        )
+        return Response({
+            "recipes_count": request.user.shoppingcart_user_set.count(),
+            "ingredients": CartTotalSerializer(totals, many=True).data,
+        })
+
     @action(detail=False, methods=["get"],
             url_path="download_shopping_cart", permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
-        totals = defaultdict(int)
-        dish_titles = set()
-
-        ingredients = []
+        totals = request.user.cart_totals.values_list(
+            "ingredient__name", "ingredient__measurement_unit", "amount"
+        ).order_by(Lower("ingredient__name"))
+        dish_titles = request.user.shoppingcart_user_set.values_list(
+            "dish__title", flat=True
+        ).order_by("dish__title").distinct()
 
-        for item in request.user.shoppingcart_set.select_related("dish"):
-            dish_titles.add(item.dish.title)
-            for ia in item.dish.recipe_ingredients.select_related("ingredient"):
-                key = (ia.ingredient.name, ia.ingredient.measurement_unit)
-                totals[key] += ia.amount
-
-        sorted_items = sorted(totals.items(), key=lambda x: x[0][0].lower())
         today = timezone.localdate().strftime("%d.%m.%Y")
+        if request.query_params.get("output") == "pdf":
+            try:
+                pdf = shopping_list.get_pdf(today, totals, dish_titles)
+            except TimeoutError:
+                raise RenderUnavailable
+            return FileResponse(
+                io.BytesIO(pdf),
+                content_type="application/pdf",
+                filename="shopping_cart.pdf",
+            )
+
         lines = [f"Список покупок на {today}:", "Продукты:"]
 
-        for idx, ((name, unit), amount) in enumerate(sorted_items, 1):
+        for idx, (name, unit, amount) in enumerate(totals, 1):
             lines.append(f"{idx}. {name.capitalize()} ({unit}) — {amount}")
 
         lines.append("\nРецепты, для которых нужны эти продукты:")
-        for idx, title in enumerate(sorted(dish_titles), 1):
+        for idx, title in enumerate(dish_titles, 1):
             lines.append(f"{idx}. {title}")
 
         report_text = "\n".join(lines)
@@ -135,11 +409,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
 
 
-class UserViewSet(DjoserUserViewSet):
+class UserViewSet(EarlyThrottleMixin, DjoserUserViewSet):
     queryset = UserAccount.objects.all()
     serializer_class = PublicUserSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
-    pagination_class = PageNumberPagination
+    pagination_class = EstimatedCountPagination
+    throttle_scopes = {
+        "subscribe": "relations",
+        "export": "export",
+    }
+
+    def perform_destroy(self, instance):
+        deletion.schedule(instance)
 
     @action(detail=False, methods=["put", "delete"], url_path="me/avatar")
     def avatar(self, request):
@@ -156,23 +437,33 @@ class UserViewSet(DjoserUserViewSet):
         serializer.save()
         return Response({"avatar": serializer.data["profile_picture"]})
 
+    @action(detail=False, methods=["get"], url_path="me/export",
+            permission_classes=[IsAuthenticated])
+    def export(self, request):
+        response = StreamingHttpResponse(
+            iter_user_export(request.user),
+            content_type="application/x-ndjson",
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="foodgram_{request.user.username}.ndjson"'
+        )
+        return response
+
     @action(detail=True, methods=["post", "delete"], url_path="subscribe",
             permission_classes=[IsAuthenticated])
     def subscribe(self, request, id=None):
-        author = get_object_or_404(UserAccount, pk=id)
-
+        id = _parse_id(id)
         if request.method != "POST":
-            get_object_or_404(Follow, follower=request.user, following=author).delete()
+            if not relations.unfollow(request.user.pk, id):
+                raise NotFound
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-        if author == request.user:
+        author = relations.follow(request.user.pk, id)
+        if author is None:
+            raise NotFound
+        if author.pk == request.user.pk:
             raise ValidationError({"error": "Нельзя подписаться на самого себя"})
-
-        obj, created = Follow.objects.get_or_create(
-            follower=request.user,
-            following=author
-        )
-        if not created:
+        if not author.created:
             raise ValidationError({
                 "error": f"Вы уже подписаны на пользователя {author.username}"
             })
@@ -194,4 +485,20 @@ class UserViewSet(DjoserUserViewSet):
             many=True,
             context={"request": request}
         )
-        return paginator.get_paginated_response(serializer.data)
\ No newline at end of file
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"], url_path="suggestions",
+            permission_classes=[IsAuthenticated])
+    def suggestions(self, request):
+        """Авторы, на которых стоит подписаться (команда build_suggestions)."""
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            raise ValidationError({"limit": "Ожидается целое число"})
+        limit = max(1, min(limit, settings.SUGGESTIONS_TOP_K))
+        serializer = SuggestedAuthorSerializer(
+            suggested_authors(request.user, limit),
+            many=True,
+            context={"request": request},
+        )
+        return Response(serializer.data)
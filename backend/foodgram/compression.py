@@ -0,0 +1,141 @@
+"""Сжатие ответов с кешем сжатых тел.
+
+Кодировка выбирается по ``Accept-Encoding``: brotli, если установлен пакет
+``brotli`` и клиент его принимает, иначе gzip. Ответы короче
+``COMPRESSION_MIN_SIZE`` байт и потоковые ответы не сжимаются. Сжатые тела
+лежат в небольшом LRU-кеше процесса по ETag и кодировке, поэтому повторная
+отдача неизменного ответа не сжимает его заново: посчитать хеш тела
+намного дешевле, чем сжать его.
+"""
+
+import gzip
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers, set_response_etag
+from django.utils.deprecation import MiddlewareMixin
+
+from .metrics import CACHE_REQUESTS
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "text/",
+)
+
+COMPRESSORS = {"gzip": lambda data: gzip.compress(data, 6, mtime=0)}
+if brotli is not None:
+    # Для динамических ответов средний уровень: 11 сжимает в разы дольше.
+    COMPRESSORS = {
+        "br": lambda data: brotli.compress(data, quality=5),
+        **COMPRESSORS,
+    }
+
+
+def choose_encoding(header):
+    """Первая из ``COMPRESSORS`` кодировка, которую принимает клиент.
+
+    ``*`` разрешает только кодировки, не отклонённые явно с ``q=0``.
+    """
+    accepted = set()
+    refused = set()
+    for part in header.split(","):
+        name, *params = part.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        (accepted if quality > 0 else refused).add(name.strip().lower())
+    for encoding in COMPRESSORS:
+        if encoding in refused:
+            continue
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return None
+
+
+class CompressedBodyCache:
+    """LRU-кеш сжатых тел, ограниченный их суммарным размером."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._items.get(key)
+            if body is not None:
+                self._items.move_to_end(key)
+            return body
+
+    def set(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.cache = CompressedBodyCache(settings.COMPRESSION_CACHE_BYTES)
+
+    def process_response(self, request, response):
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or not response.get("Content-Type", "").startswith(
+                COMPRESSIBLE_TYPES
+            )
+            or len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = choose_encoding(
+            request.META.get("HTTP_ACCEPT_ENCODING", "")
+        )
+        if encoding is None:
+            return response
+
+        if not response.has_header("ETag"):
+            set_response_etag(response)
+        etag = response["ETag"]
+        # Слабый ETag не гарантирует побайтного совпадения тел.
+        cacheable = etag.startswith('"')
+        body = self.cache.get((etag, encoding)) if cacheable else None
+        CACHE_REQUESTS.labels(
+            "compression", "miss" if body is None else "hit"
+        ).inc()
+        if body is None:
+            body = COMPRESSORS[encoding](response.content)
+            if cacheable:
+                self.cache.set((etag, encoding), body)
+        if len(body) >= len(response.content):
+            return response
+
+        response.content = body
+        response["Content-Length"] = str(len(body))
+        response["Content-Encoding"] = encoding
+        # Сжатое тело побайтно отличается от исходного, как в GZipMiddleware.
+        if cacheable:
+            response["ETag"] = f"W/{etag}"
+        return response
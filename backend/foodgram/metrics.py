@@ -0,0 +1,170 @@
+"""Метрики приложения в формате Prometheus.
+
+Middleware считает запросы по маршрутам (имя представления, а не URL, —
+чтобы не плодить метки), длительность ответа, число и суммарное время
+SQL-запросов на один HTTP-запрос. Кеш ``InstrumentedLocMemCache`` считает
+попадания и промахи; доля попаданий считается уже в Prometheus.
+
+Под gunicorn у каждого воркера свой процесс, поэтому значения пишутся в
+общий каталог ``PROMETHEUS_MULTIPROC_DIR`` (см. ``gunicorn.conf.py``), а
+представление ``metrics_view`` собирает их со всех воркеров.
+"""
+
+import ipaddress
+import os
+import time
+
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import Http404, HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from .middleware import ExecuteWrapperMiddleware
+
+REQUESTS = Counter(
+    "foodgram_http_requests_total",
+    "HTTP-запросы по маршруту, методу и коду ответа",
+    ["route", "method", "status"],
+)
+REQUEST_DURATION = Histogram(
+    "foodgram_http_request_duration_seconds",
+    "Время обработки HTTP-запроса",
+    ["route", "method"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_QUERIES = Histogram(
+    "foodgram_db_queries_per_request",
+    "Число SQL-запросов на один HTTP-запрос",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+DB_DURATION = Histogram(
+    "foodgram_db_duration_seconds_per_request",
+    "Суммарное время SQL-запросов на один HTTP-запрос",
+    ["route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+CACHE_REQUESTS = Counter(
+    "foodgram_cache_requests_total",
+    "Обращения к кешу: попадания и промахи",
+    ["cache", "result"],
+)
+
+_MISSING = object()
+
+
+def _route(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match and match.view_name else "unmatched"
+
+
+class _QueryTimer:
+    """Обёртка ``connection.execute_wrapper``: считает запросы и их время."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class MetricsMiddleware(ExecuteWrapperMiddleware):
+    """Собирает метрики HTTP-запросов и работы с базой."""
+
+    def make_wrapper(self, request):
+        return _QueryTimer()
+
+    def finish(self, request, response, timer):
+        duration = time.perf_counter() - timer.started
+        route = _route(request)
+        REQUESTS.labels(route, request.method, response.status_code).inc()
+        REQUEST_DURATION.labels(route, request.method).observe(duration)
+        DB_QUERIES.labels(route).observe(timer.count)
+        DB_DURATION.labels(route).observe(timer.duration)
+
+
+class CacheMetricsMixin:
+    """Считает попадания и промахи ``get`` бэкенда кеша.
+
+    Метка ``cache`` берётся из ``OPTIONS["METRICS_NAME"]``.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.metrics_name = params.get("OPTIONS", {}).get(
+            "METRICS_NAME", location or "default"
+        )
+
+    def _count(self, hits, misses):
+        if hits:
+            CACHE_REQUESTS.labels(self.metrics_name, "hit").inc(hits)
+        if misses:
+            CACHE_REQUESTS.labels(self.metrics_name, "miss").inc(misses)
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            self._count(0, 1)
+            return default
+        self._count(1, 0)
+        return value
+
+
+class InstrumentedLocMemCache(CacheMetricsMixin, LocMemCache):
+    pass
+
+
+class InstrumentedFileBasedCache(CacheMetricsMixin, FileBasedCache):
+    pass
+
+
+def _registry():
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def _allowed(request):
+    """Адрес клиента входит в ``METRICS_ALLOWED_NETWORKS``."""
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network.strip(), strict=False)
+        for network in settings.METRICS_ALLOWED_NETWORKS
+        if network.strip()
+    )
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus.
+
+    Эндпоинт внутренний: порт бэкенда опубликован наружу, поэтому
+    метрики отдаются только адресам из ``METRICS_ALLOWED_NETWORKS``.
+    nginx его не проксирует, а запросы, пришедшие через прокси,
+    отклоняются.
+    """
+    if "HTTP_X_FORWARDED_HOST" in request.META or not _allowed(request):
+        raise Http404
+    return HttpResponse(
+        generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST
+    )
@@ -0,0 +1,65 @@
+"""Базовый middleware для наблюдения за SQL-запросами во время запроса."""
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.db import connection
+
+
+class ExecuteWrapperMiddleware:
+    """Ставит обёртку ``connection.execute_wrapper`` на время запроса.
+
+    Работает и в синхронном, и в асинхронном стеке. Соединения с базой
+    привязаны к потоку, а async ORM выполняет запросы в отдельном потоке
+    запроса, поэтому под ASGI обёртка ставится и снимается в нём же.
+
+    Наследники реализуют ``make_wrapper(request)`` (``None`` — не
+    оборачивать) и ``finish(request, response, wrapper)``; ``finish``
+    вызывается синхронно и может обращаться к базе.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def make_wrapper(self, request):
+        raise NotImplementedError
+
+    def finish(self, request, response, wrapper):
+        pass
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        wrapper = self.make_wrapper(request)
+        if wrapper is None:
+            return self.get_response(request)
+        with connection.execute_wrapper(wrapper):
+            response = self.get_response(request)
+        self.finish(request, response, wrapper)
+        return response
+
+    async def __acall__(self, request):
+        wrapper = self.make_wrapper(request)
+        if wrapper is None:
+            return await self.get_response(request)
+        context = await sync_to_async(_enter_execute_wrapper)(wrapper)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(context.__exit__)(None, None, None)
+        await sync_to_async(self.finish)(request, response, wrapper)
+        return response
+
+
+def _enter_execute_wrapper(wrapper):
+    context = connection.execute_wrapper(wrapper)
+    context.__enter__()
+    return context
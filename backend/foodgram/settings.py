@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 
     # Сторонние библиотеки
     "rest_framework",
@@ -56,6 +57,9 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    "formulas.slow_queries.SlowQueryMiddleware",
+    "foodgram.metrics.MetricsMiddleware",
+    "foodgram.compression.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
@@ -157,8 +161,36 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_PAGINATION_CLASS": "api.pagination.PageNumberLimitPagination",
     "PAGE_SIZE": 6,
+    # Адрес клиента для лимитов берётся из X-Forwarded-For, который ставит nginx
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES", 1)),
+    "DEFAULT_THROTTLE_CLASSES": [
+        "api.throttling.UserBucketThrottle",
+        "api.throttling.IPBucketThrottle",
+    ],
+    # Лимиты действий «число/период» (s, min, hour, day); «<действие>_ip» —
+    # лимит на IP-адрес. Переопределяются переменными THROTTLE_RATE_<ДЕЙСТВИЕ>.
+    "DEFAULT_THROTTLE_RATES": {
+        scope: os.getenv(f"THROTTLE_RATE_{scope.upper()}", rate)
+        for scope, rate in {
+            "recipe_write": "20/min",
+            "recipe_write_ip": "60/min",
+            "relations": "120/min",
+            "relations_ip": "600/min",
+            "shopping_list": "10/min",
+            "shopping_list_ip": "30/min",
+            "export": "5/hour",
+            "export_ip": "20/hour",
+        }.items()
+    },
 }
 
+# Хранилище вёдер лимитов: file — файл в памяти, общий для процессов одной
+# машины; cache — кеш THROTTLE_CACHE (в продакшене общий Redis/Memcached)
+THROTTLE_STORE = os.getenv("THROTTLE_STORE", "file")
+THROTTLE_FILE = os.getenv("THROTTLE_FILE", "/tmp/foodgram-throttle")
+THROTTLE_FILE_SLOTS = int(os.getenv("THROTTLE_FILE_SLOTS", 65536))
+THROTTLE_CACHE = os.getenv("THROTTLE_CACHE", "default")
+
 DJOSER = {
     "SERIALIZERS": {
         "user_create": "djoser.serializers.UserCreateSerializer",
@@ -176,3 +208,96 @@ CSRF_TRUSTED_ORIGINS = os.getenv(
     "CSRF_TRUSTED_ORIGINS",
     "http://localhost,http://127.0.0.1"
 ).split(",")
+
+# Размер пачки серверного курсора при потоковой выгрузке данных пользователя
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 2000))
+
+# Начиная с этого числа строк пагинатор берёт оценку планировщика или
+# кешированное значение вместо точного COUNT(*)
+COUNT_ESTIMATE_THRESHOLD = int(os.getenv("COUNT_ESTIMATE_THRESHOLD", 10000))
+COUNT_CACHE_TTL = int(os.getenv("COUNT_CACHE_TTL", 30))
+
+# Период полураспада трендовых очков рецептов, часы
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", 24))
+
+# Синхронизация изменений рецептов (/api/recipes/changes/)
+CHANGES_PAGE_SIZE = int(os.getenv("CHANGES_PAGE_SIZE", 500))
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", 30))
+# Отставание выдачи изменений от текущего времени, секунды; не меньше
+# самой долгой транзакции, меняющей рецепты
+CHANGES_SAFETY_MARGIN = int(os.getenv("CHANGES_SAFETY_MARGIN", 60))
+
+# Максимум рецептов в одном пакетном добавлении в избранное или корзину
+BULK_RELATIONS_LIMIT = int(os.getenv("BULK_RELATIONS_LIMIT", 100))
+
+# Размер пачки DELETE при фоновой очистке удалённых пользователей и рецептов
+DELETION_BATCH_SIZE = int(os.getenv("DELETION_BATCH_SIZE", 1000))
+
+# Минимальная оценка коэффициента Жаккара для похожих рецептов
+# (/api/recipes/{id}/duplicates/)
+DUPLICATE_SIMILARITY = float(os.getenv("DUPLICATE_SIMILARITY", 0.7))
+
+# Сколько рекомендуемых авторов хранить на пользователя
+# (/api/users/suggestions/, команда build_suggestions)
+SUGGESTIONS_TOP_K = int(os.getenv("SUGGESTIONS_TOP_K", 20))
+
+# Импорт рецептов из NDJSON: записей в одной транзакции, а также таймаут (с)
+# и максимальный размер (байт) скачиваемой картинки
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))
+IMAGE_IMPORT_TIMEOUT = float(os.getenv("IMAGE_IMPORT_TIMEOUT", 10))
+IMAGE_IMPORT_MAX_BYTES = int(os.getenv("IMAGE_IMPORT_MAX_BYTES", 10 * 2**20))
+# Пауза перед повтором неудачной загрузки картинки (с); удваивается с
+# каждой попыткой
+IMAGE_IMPORT_RETRY_DELAY = int(os.getenv("IMAGE_IMPORT_RETRY_DELAY", 60))
+# Максимальный размер тела POST /api/recipes/import/, байт: импорт идёт
+# около 1 МБ/с и должен уложиться в таймаут gunicorn (30 с) с запасом;
+# значение согласовано с client_max_body_size в infra/nginx.conf
+IMPORT_MAX_BODY_BYTES = int(os.getenv("IMPORT_MAX_BODY_BYTES", 5 * 2**20))
+
+# PDF-списки покупок: процессов рендера на воркер, таймаут рендера (с),
+# срок хранения готовых PDF в кеше (с) и шрифт с кириллицей
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", 2))
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", 10))
+PDF_CACHE_TIMEOUT = int(os.getenv("PDF_CACHE_TIMEOUT", 86400))
+# Кеш готовых PDF (общий для воркеров) и файл блокировок рендера
+PDF_CACHE = os.getenv("PDF_CACHE", "shared")
+PDF_LOCK_FILE = os.getenv("PDF_LOCK_FILE", "/tmp/foodgram-pdf-lock")
+PDF_FONT = os.getenv(
+    "PDF_FONT", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+)
+
+# Асинхронные варианты чтения рецептов и ингредиентов; включать при запуске
+# под ASGI-сервером (см. gunicorn.conf.py)
+ASYNC_READ_VIEWS = os.getenv("ASYNC_READ_VIEWS", "False") == "True"
+
+# Прогревать воркер gunicorn до первого запроса (см. foodgram.warmup)
+WARMUP_ON_BOOT = os.getenv("WARMUP_ON_BOOT", "True") == "True"
+
+# Порог медленного SQL-запроса, мс; отрицательное значение отключает журнал
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 200))
+
+# Сжатие ответов: минимальный размер тела и объём кеша сжатых тел на
+# процесс, байт
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_CACHE_BYTES = int(
+    os.getenv("COMPRESSION_CACHE_BYTES", 8 * 1024 * 1024)
+)
+
+# Сети, из которых доступен /metrics (адреса Prometheus), через запятую
+METRICS_ALLOWED_NETWORKS = os.getenv(
+    "METRICS_ALLOWED_NETWORKS", "127.0.0.1/32,::1/128"
+).split(",")
+
+# Кеши с учётом попаданий и промахов для метрик: default — свой у каждого
+# процесса, shared — общий для процессов машины каталог
+CACHES = {
+    "default": {
+        "BACKEND": "foodgram.metrics.InstrumentedLocMemCache",
+        "OPTIONS": {"METRICS_NAME": "default"},
+    },
+    "shared": {
+        "BACKEND": "foodgram.metrics.InstrumentedFileBasedCache",
+        "LOCATION": os.getenv("SHARED_CACHE_DIR", "/tmp/foodgram-cache"),
+        "OPTIONS": {"METRICS_NAME": "shared", "MAX_ENTRIES": 1000},
+    },
+}
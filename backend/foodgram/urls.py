@@ -6,10 +6,13 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .metrics import metrics_view
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("api.urls")),
+    path("metrics", metrics_view, name="metrics"),
     path("", include("formulas.urls")),
 ]
 
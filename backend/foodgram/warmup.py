@@ -0,0 +1,73 @@
+"""Прогрев воркера до первого запроса.
+
+Django импортирует корневой URLconf, а с ним все views, сериализаторы,
+DRF и djoser, только при первом запросе; там же впервые строятся словари
+маршрутов, поля сериализаторов и реестр форматов Pillow. ``warm_up``
+делает это заранее: в воркере после загрузки приложения или, при
+``--preload``, в мастере до fork, и тогда воркеры получают прогретую
+память от мастера (см. ``gunicorn.conf.py``). К базе прогрев не
+обращается, поэтому соединения не переживают fork.
+"""
+
+import inspect
+import time
+
+from django.urls import get_resolver
+
+
+def _urls():
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict
+
+
+def _serializers():
+    from djoser.conf import settings as djoser_settings
+    from rest_framework.serializers import BaseSerializer
+
+    from api import serializers
+
+    classes = {
+        cls
+        for _, cls in inspect.getmembers(serializers, inspect.isclass)
+        if issubclass(cls, BaseSerializer)
+        and cls.__module__ == serializers.__name__
+    }
+    classes.update(
+        getattr(djoser_settings.SERIALIZERS, name)
+        for name in djoser_settings.SERIALIZERS
+    )
+    for cls in classes:
+        cls().fields
+
+
+def _images():
+    from PIL import Image
+
+    Image.init()
+
+
+def _caches():
+    from api.throttling import get_store
+    from formulas import catalog
+
+    get_store()
+    catalog.current_url()
+
+
+STEPS = (
+    ("urls", _urls),
+    ("serializers", _serializers),
+    ("images", _images),
+    ("caches", _caches),
+)
+
+
+def warm_up():
+    """Выполняет шаги прогрева; возвращает их длительность в секундах."""
+    timings = {}
+    for name, step in STEPS:
+        started = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - started
+    return timings
@@ -1,9 +1,15 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
-from django.db.models import Count
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 
+from . import deletion
+from .admin_filters import AutocompleteFilter, AutocompleteFilterMixin
 from .models import (
+    DeletionJob,
+    ImageImportJob,
     UserAccount,
     Follow,
     Ingredient,
@@ -14,8 +20,43 @@ from .models import (
 )
 
 
+def count_subquery(model, field):
+    """Число строк ``model``, ссылающихся на запись, одним подзапросом."""
+    counts = (
+        model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class BackgroundDeleteMixin:
+    """Удаление через мягкую пометку и фоновую очистку (formulas.deletion).
+
+    Страница подтверждения не собирает каскад: он может быть огромным.
+    """
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        return (
+            [str(obj) for obj in objs],
+            {self.model._meta.verbose_name_plural: len(objs)},
+            set(),
+            [],
+        )
+
+    def delete_model(self, request, obj):
+        deletion.schedule(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            deletion.schedule(obj)
+
+
 @admin.register(UserAccount)
-class UserPanelAdmin(UserAdmin):
+class UserPanelAdmin(BackgroundDeleteMixin, UserAdmin):
     list_display = (
         'id', 'username', 'full_name', 'email', 'avatar_tag',
         'recipes_count', 'subscriptions_count', 'subscribers_count',
@@ -23,13 +64,14 @@ class UserPanelAdmin(UserAdmin):
     search_fields = ('email', 'username', 'first_name', 'last_name')
     list_filter = ('is_active',)
     ordering = ('id',)
+    show_full_result_count = False
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.annotate(
-            recipes_count=Count('recipes', distinct=True),
-            subscriptions_count=Count('following_set', distinct=True),
-            subscribers_count=Count('followers_set', distinct=True),
+            recipes_total=count_subquery(Dish, 'creator'),
+            subscriptions_total=count_subquery(Follow, 'follower'),
+            subscribers_total=count_subquery(Follow, 'following'),
         )
 
     @admin.display(description="ФИО")
@@ -39,27 +81,32 @@ class UserPanelAdmin(UserAdmin):
     @admin.display(description="Аватар")
     def avatar_tag(self, user):
         if user.profile_picture:
-            return f'<img src="{user.profile_picture.url}" width="50" height="50" style="border-radius: 4px;" />'
+            return format_html(
+                '<img src="{}" width="50" height="50" style="border-radius: 4px;" />',
+                user.profile_picture.url,
+            )
         return "—"
 
-    @admin.display(description="Рецептов")
+    @admin.display(description="Рецептов", ordering='recipes_total')
     def recipes_count(self, user):
-        return user.recipes_count
+        return user.recipes_total
 
-    @admin.display(description="Подписок")
+    @admin.display(description="Подписок", ordering='subscriptions_total')
     def subscriptions_count(self, user):
-        return user.subscriptions_count
+        return user.subscriptions_total
 
-    @admin.display(description="Подписчиков")
+    @admin.display(description="Подписчиков", ordering='subscribers_total')
     def subscribers_count(self, user):
-        return user.subscribers_count
+        return user.subscribers_total
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('follower', 'following')
+    list_select_related = ('follower', 'following')
     search_fields = ('follower__email', 'following__email')
-    list_filter = ('follower',)
+    list_filter = (('follower', AutocompleteFilter),)
+    show_full_result_count = False
 
 
 @admin.register(Ingredient)
@@ -68,33 +115,49 @@ class IngredientConfig(admin.ModelAdmin):
     search_fields = ("name", "measurement_unit")
     list_filter = ("measurement_unit",)
     ordering = ["name"]
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.annotate(
+            recipes_total=count_subquery(IngredientAmount, "ingredient")
+        )
 
-    @admin.display(description="Рецептов")
+    @admin.display(description="Рецептов", ordering="recipes_total")
     def recipes_count(self, ingredient):
-        return ingredient.recipe_ingredients.count()
+        return ingredient.recipes_total
 
 
 @admin.register(Dish)
-class DishConfig(admin.ModelAdmin):
+class DishConfig(
+    BackgroundDeleteMixin, AutocompleteFilterMixin, admin.ModelAdmin
+):
     list_display = (
         "id", "title", "cook_time", "creator", "count_in_favorites",
         "display_ingredients", "display_image"
     )
+    list_select_related = ("creator",)
     search_fields = ("creator__email", "title", "creator__username")
-    list_filter = ("creator",)
+    list_filter = (("creator", AutocompleteFilter),)
     ordering = ["-id"]
+    show_full_result_count = False
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        return queryset.annotate(count=Count("favorites"))
+        return queryset.annotate(
+            favorites_total=Coalesce("popularity__favorites_count", 0)
+        ).prefetch_related(Prefetch(
+            "recipe_ingredients",
+            queryset=IngredientAmount.objects.select_related("ingredient"),
+        ))
 
-    @admin.display(description="В избранном")
+    @admin.display(description="В избранном", ordering="favorites_total")
     def count_in_favorites(self, recipe):
-        return recipe.favorites.count()
+        return recipe.favorites_total
 
     @admin.display(description="Продукты")
     def display_ingredients(self, recipe):
-        ingredients = recipe.recipe_ingredients.select_related("ingredient")
+        ingredients = recipe.recipe_ingredients.all()
         return mark_safe("<br>".join(
             f"{ia.ingredient.name} — {ia.amount} {ia.ingredient.measurement_unit}" for ia in ingredients
         ))
@@ -107,23 +170,67 @@ class DishConfig(admin.ModelAdmin):
 
 
 @admin.register(IngredientAmount)
-class IngredientLinkConfig(admin.ModelAdmin):
+class IngredientLinkConfig(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ("ingredient", "amount", "dish")
+    list_select_related = ("ingredient", "dish")
     search_fields = ("ingredient__name", "dish__title")
-    list_filter = ("ingredient",)
+    list_filter = (("ingredient", AutocompleteFilter),)
+    show_full_result_count = False
 
 
 @admin.register(FavoriteRecipe)
-class FavoriteConfig(admin.ModelAdmin):
+class FavoriteConfig(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ("user", "dish")
+    list_select_related = ("user", "dish")
     search_fields = ("user__username", "dish__title")
-    list_filter = ("user",)
+    list_filter = (("user", AutocompleteFilter),)
     ordering = ["user"]
+    show_full_result_count = False
 
 
 @admin.register(ShoppingCart)
-class CartConfig(admin.ModelAdmin):
+class CartConfig(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ("user", "dish")
+    list_select_related = ("user", "dish")
     search_fields = ("dish__title", "user__email")
-    list_filter = ("dish",)
+    list_filter = (("dish", AutocompleteFilter),)
     ordering = ["dish"]
+    show_full_result_count = False
+
+
+@admin.register(DeletionJob)
+class DeletionJobConfig(admin.ModelAdmin):
+    list_display = (
+        "model", "object_id", "created_at", "updated_at", "finished_at",
+        "rows_deleted", "error",
+    )
+    list_filter = ("model", ("finished_at", admin.EmptyFieldListFilter))
+    readonly_fields = [field.name for field in DeletionJob._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Удалено строк")
+    def rows_deleted(self, job):
+        return sum(job.progress.values())
+
+
+@admin.register(ImageImportJob)
+class ImageImportJobConfig(admin.ModelAdmin):
+    list_display = (
+        "dish", "created_at", "next_attempt_at", "finished_at", "attempts",
+        "error",
+    )
+    list_select_related = ("dish",)
+    list_filter = (("finished_at", admin.EmptyFieldListFilter),)
+    readonly_fields = [field.name for field in ImageImportJob._meta.fields]
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
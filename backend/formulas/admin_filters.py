@@ -0,0 +1,61 @@
+"""Фильтры списков админки для больших таблиц."""
+
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """Фильтр по внешнему ключу с автодополнением.
+
+    В отличие от стандартного фильтра не загружает в боковую панель все
+    связанные записи: варианты подгружает виджет автодополнения админки,
+    а на странице запрашивается только выбранная запись. У админки
+    связанной модели должны быть заданы ``search_fields``.
+    """
+
+    template = "admin/formulas/autocomplete_filter.html"
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f"{field_path}__{field.target_field.name}__exact"
+        self.admin_site = model_admin.admin_site
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def value(self):
+        values = self.used_parameters.get(self.lookup_kwarg)
+        return values[-1] if values else None
+
+    def rendered_widget(self):
+        form_field = forms.ModelChoiceField(
+            queryset=self.field.remote_field.model._default_manager.all(),
+            widget=AutocompleteSelect(self.field, self.admin_site),
+            required=False,
+        )
+        return form_field.widget.render(
+            self.lookup_kwarg,
+            self.value(),
+            attrs={"id": f"id_filter_{self.lookup_kwarg}", "style": "width: 100%"},
+        )
+
+    def choices(self, changelist):
+        yield {
+            "selected": self.value() is None,
+            "query_string": changelist.get_query_string(remove=[self.lookup_kwarg]),
+            "display": "Все",
+        }
+
+
+class AutocompleteFilterMixin:
+    """Подключает к странице списка скрипты виджета автодополнения."""
+
+    @property
+    def media(self):
+        media = super().media
+        for item in self.list_filter:
+            if isinstance(item, tuple) and issubclass(item[1], AutocompleteFilter):
+                field = self.model._meta.get_field(item[0])
+                return media + AutocompleteSelect(field, self.admin_site).media
+        return media
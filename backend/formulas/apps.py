@@ -8,3 +8,6 @@ class FormulasConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "formulas"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,135 @@
+"""Инкрементальное обновление итогов корзины покупок.
+
+Таблица ``CartIngredientTotal`` хранит по каждой паре (пользователь,
+ингредиент) сумму количеств по всем рецептам в корзине. Функции модуля
+применяют к ней дельты одним SQL-запросом ``INSERT ... ON CONFLICT``,
+строки с нулевой суммой удаляются.
+"""
+
+from collections import Counter
+
+from django.db import connection, transaction
+
+from .models import CartIngredientTotal, Dish, IngredientAmount, ShoppingCart
+
+TOTALS = CartIngredientTotal._meta.db_table
+AMOUNTS = IngredientAmount._meta.db_table
+CART = ShoppingCart._meta.db_table
+DISHES = Dish._meta.db_table
+
+UPSERT_SQL = f"""
+    INSERT INTO {TOTALS} (user_id, ingredient_id, amount)
+    {{rows}}
+    ON CONFLICT (user_id, ingredient_id)
+    DO UPDATE SET amount = {TOTALS}.amount + EXCLUDED.amount
+"""
+
+
+def _execute(*statements):
+    with transaction.atomic(), connection.cursor() as cursor:
+        for sql, params in statements:
+            cursor.execute(sql, params)
+
+
+def _cleanup_user(user_id):
+    return (
+        f"DELETE FROM {TOTALS} WHERE user_id = %s AND amount <= 0",
+        [user_id],
+    )
+
+
+def _cleanup_dish_carts(dish_ids):
+    return (
+        f"""
+        DELETE FROM {TOTALS} t USING {CART} c
+        WHERE c.dish_id = ANY(%s) AND t.user_id = c.user_id AND t.amount <= 0
+        """,
+        [list(dish_ids)],
+    )
+
+
+def add_dishes(user_id, dish_ids, sign=1):
+    """Добавляет (или при ``sign=-1`` вычитает) рецепты в итогах пользователя."""
+    rows = f"""
+        SELECT %s, ingredient_id, %s * SUM(amount) FROM {AMOUNTS}
+        WHERE dish_id = ANY(%s) GROUP BY ingredient_id ORDER BY ingredient_id
+    """
+    _execute(
+        (UPSERT_SQL.format(rows=rows), [user_id, sign, list(dish_ids)]),
+        _cleanup_user(user_id),
+    )
+
+
+def add_dish(user_id, dish_id):
+    """Добавляет ингредиенты рецепта к итогам корзины пользователя."""
+    add_dishes(user_id, [dish_id])
+
+
+def remove_dish(user_id, dish_id):
+    """Вычитает ингредиенты рецепта из итогов корзины пользователя."""
+    add_dishes(user_id, [dish_id], sign=-1)
+
+
+def remove_dishes_everywhere(dish_ids):
+    """Вычитает рецепты из итогов всех пользователей, у кого они в корзине."""
+    rows = f"""
+        SELECT c.user_id, a.ingredient_id, -SUM(a.amount)
+        FROM {CART} c JOIN {AMOUNTS} a ON a.dish_id = c.dish_id
+        WHERE c.dish_id = ANY(%s)
+        GROUP BY c.user_id, a.ingredient_id ORDER BY c.user_id, a.ingredient_id
+    """
+    _execute(
+        (UPSERT_SQL.format(rows=rows), [list(dish_ids)]),
+        _cleanup_dish_carts(dish_ids),
+    )
+
+
+def remove_dish_everywhere(dish_id):
+    """Вычитает рецепт из итогов всех пользователей, у кого он в корзине."""
+    remove_dishes_everywhere([dish_id])
+
+
+def apply_dish_change(dish_id, old_amounts, new_amounts):
+    """Переносит изменение состава рецепта в корзины, где он лежит.
+
+    ``old_amounts`` и ``new_amounts`` — словари ``{ingredient_id: amount}``
+    до и после изменения.
+    """
+    delta = Counter(new_amounts)
+    delta.subtract(old_amounts)
+    delta = {key: value for key, value in sorted(delta.items()) if value}
+    if not delta:
+        return
+    rows = f"""
+        SELECT c.user_id, d.ingredient_id, d.delta FROM {CART} c
+        CROSS JOIN unnest(%s::bigint[], %s::bigint[]) AS d(ingredient_id, delta)
+        WHERE c.dish_id = %s ORDER BY c.user_id, d.ingredient_id
+    """
+    _execute(
+        (
+            UPSERT_SQL.format(rows=rows),
+            [list(delta), list(delta.values()), dish_id],
+        ),
+        _cleanup_dish_carts([dish_id]),
+    )
+
+
+def rebuild(user_ids=None):
+    """Полностью пересчитывает итоги (всех или указанных пользователей)."""
+    where, params = "", []
+    if user_ids is not None:
+        where, params = "WHERE c.user_id = ANY(%s)", [list(user_ids)]
+    _execute(
+        (f"DELETE FROM {TOTALS} c {where}", params),
+        (
+            f"""
+            INSERT INTO {TOTALS} (user_id, ingredient_id, amount)
+            SELECT c.user_id, a.ingredient_id, SUM(a.amount)
+            FROM {CART} c JOIN {AMOUNTS} a ON a.dish_id = c.dish_id
+            JOIN {DISHES} d ON d.id = c.dish_id AND d.deleted_at IS NULL
+            {where}
+            GROUP BY c.user_id, a.ingredient_id
+            """,
+            params,
+        ),
+    )
@@ -0,0 +1,132 @@
+"""Статический каталог ингредиентов для раздачи через nginx.
+
+Каталог собирается в JSON с хешем содержимого в имени файла и
+сохраняется в ``STATIC_ROOT/catalog`` вместе с gzip- и brotli-версиями
+(brotli — если установлен пакет ``brotli``). Рядом лежит копия
+последней версии под постоянным именем ``ingredients.json`` и файл
+``ingredients.version`` с именем актуальной версии.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Ingredient
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli не обязателен
+    brotli = None
+
+CATALOG_DIR = "catalog"
+LATEST_NAME = "ingredients.json"
+VERSION_NAME = "ingredients.version"
+
+_current = {"mtime": None, "url": None}
+
+
+def _catalog_root():
+    return Path(settings.STATIC_ROOT) / CATALOG_DIR
+
+
+def _write(path, data):
+    """Атомарно записывает файл, чтобы nginx не отдал его недописанным.
+
+    Временный файл у каждой записи свой: сборки из разных процессов не
+    пишут в один и тот же файл.
+    """
+    fd, tmp_name = tempfile.mkstemp(
+        prefix=f".{path.name}.", suffix=".tmp", dir=path.parent
+    )
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        # mkstemp создаёт файл только для владельца, а читает его nginx.
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def _write_variants(path, body):
+    _write(path, body)
+    _write(path.with_name(f"{path.name}.gz"), gzip.compress(body, 9, mtime=0))
+    if brotli is not None:
+        _write(path.with_name(f"{path.name}.br"), brotli.compress(body))
+
+
+def render_catalog():
+    """JSON каталога в том же виде, что и список ``/api/ingredients/``."""
+    rows = Ingredient.objects.values("id", "name", "measurement_unit")
+    return json.dumps(
+        list(rows), ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def build_catalog():
+    """Собирает каталог и возвращает имя файла актуальной версии."""
+    body = render_catalog()
+    version = hashlib.sha256(body).hexdigest()[:16]
+    name = f"ingredients.{version}.json"
+    root = _catalog_root()
+    root.mkdir(parents=True, exist_ok=True)
+
+    if not (root / name).exists():
+        _write_variants(root / name, body)
+    version_path = root / VERSION_NAME
+    if not version_path.exists() or version_path.read_text() != name:
+        _write_variants(root / LATEST_NAME, body)
+        _write(version_path, name.encode())
+    return name
+
+
+def schedule_build(using=None):
+    """Ставит сборку каталога на коммит текущей транзакции.
+
+    Сборка регистрируется один раз на транзакцию: массовое удаление
+    ингредиентов в админке пересобирает каталог однажды, а не на каждую
+    строку. Откат транзакции или точки сохранения снимает и сборку.
+    """
+    connection = transaction.get_connection(using)
+    if not any(
+        func is build_catalog for _, func, _ in connection.run_on_commit
+    ):
+        transaction.on_commit(build_catalog, using=using)
+
+
+def prune_catalog():
+    """Удаляет все версии каталога, кроме актуальной."""
+    root = _catalog_root()
+    current = (root / VERSION_NAME).read_text()
+    removed = 0
+    for path in root.glob("ingredients.*.json*"):
+        if not path.name.startswith(current):
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def current_url():
+    """URL актуальной версии каталога или ``None``, если он не собран.
+
+    Имя версии перечитывается только при изменении файла-указателя,
+    поэтому воркеры без общего состояния видят новые сборки сразу.
+    """
+    version_path = _catalog_root() / VERSION_NAME
+    try:
+        mtime = version_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _current["mtime"] != mtime:
+        _current["url"] = (
+            f"{settings.STATIC_URL}{CATALOG_DIR}/{version_path.read_text()}"
+        )
+        _current["mtime"] = mtime
+    return _current["url"]
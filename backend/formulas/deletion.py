@@ -0,0 +1,227 @@
+"""Фоновое удаление пользователей и рецептов.
+
+Удаление объекта с тысячами зависимых строк через ORM собирает весь
+каскад в памяти и держит запрос. Вместо этого ``schedule`` сразу помечает
+объект ``deleted_at`` (менеджеры моделей его больше не показывают),
+убирает его из итогов корзин и рейтингов и заводит ``DeletionJob``.
+Команда ``purge_deleted`` затем удаляет строки пачками ``DELETE`` от
+листьев каскада к корню. Каждая пачка фиксируется одной транзакцией
+вместе со счётчиком в ``DeletionJob.progress``, поэтому прерванная
+очистка продолжается с того же места.
+"""
+
+from collections import Counter
+
+from django.apps import apps
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from . import cart_totals, media, popularity
+from .models import (
+    DeletedDish,
+    DeletionJob,
+    Dish,
+    FavoriteRecipe,
+    ShoppingCart,
+    UserAccount,
+)
+
+DISHES = Dish._meta.db_table
+USERS = UserAccount._meta.db_table
+
+# Первый ключ рекомендательной блокировки, второй — id задания.
+LOCK_NAMESPACE = 4040
+
+
+def _hide_dishes(where, params):
+    """Мягко удаляет рецепты по условию; возвращает их id."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {DISHES} SET deleted_at = now()
+            WHERE {where} AND deleted_at IS NULL
+            RETURNING id
+            """,
+            params,
+        )
+        dish_ids = sorted(row[0] for row in cursor.fetchall())
+    if dish_ids:
+        cart_totals.remove_dishes_everywhere(dish_ids)
+        DeletedDish.objects.bulk_create(
+            [DeletedDish(dish_id=dish_id) for dish_id in dish_ids],
+            ignore_conflicts=True,
+        )
+    return dish_ids
+
+
+def _hide_user(user_id):
+    """Мягко удаляет пользователя и его рецепты.
+
+    Логин и email освобождаются сразу, чтобы их можно было занять снова
+    до окончания очистки.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {USERS} SET
+                deleted_at = now(),
+                is_active = false,
+                username = 'deleted-' || id,
+                email = 'deleted-' || id || '@deleted.invalid'
+            WHERE id = %s AND deleted_at IS NULL
+            RETURNING id
+            """,
+            [user_id],
+        )
+        if cursor.fetchone() is None:
+            return False
+    _hide_dishes("creator_id = %s", [user_id])
+    relations = ((FavoriteRecipe, "favorites"), (ShoppingCart, "carts"))
+    for model, field in relations:
+        dish_ids = list(
+            model.objects.filter(user_id=user_id)
+            .values_list("dish_id", flat=True)
+        )
+        if dish_ids:
+            popularity.record(dish_ids, **{field: -1})
+    return True
+
+
+@transaction.atomic
+def schedule(obj):
+    """Мягко удаляет пользователя или рецепт и ставит его в очередь очистки."""
+    if isinstance(obj, UserAccount):
+        hidden = _hide_user(obj.pk)
+    else:
+        hidden = bool(_hide_dishes("id = %s", [obj.pk]))
+    if hidden:
+        DeletionJob.objects.get_or_create(
+            model=obj._meta.label_lower, object_id=obj.pk
+        )
+
+
+def pending():
+    """Незавершённые задания, старые первыми."""
+    return DeletionJob.objects.filter(finished_at__isnull=True).order_by(
+        "created_at"
+    )
+
+
+def _dependents(model):
+    """Внешние ключи других моделей, ссылающиеся на ``model``."""
+    return [
+        relation
+        for relation in model._meta.get_fields(include_hidden=True)
+        if relation.auto_created
+        and not relation.concrete
+        and (relation.one_to_many or relation.one_to_one)
+    ]
+
+
+class _Purge:
+    def __init__(self, job, batch_size):
+        self.job = job
+        self.batch_size = batch_size
+
+    def rows(self, model, column, values):
+        """Удаляет строки ``model`` с ``column`` из ``values`` и зависимые."""
+        table, pk = model._meta.db_table, model._meta.pk.column
+        relations = _dependents(model)
+        select = (
+            f"SELECT {pk} FROM {table} WHERE {column} = ANY(%s) "
+            f"ORDER BY {pk} LIMIT %s"
+        )
+        while True:
+            if not relations:
+                if not self.delete(
+                    model, f"{pk} IN ({select})", [values, self.batch_size]
+                ):
+                    return
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(select, [values, self.batch_size])
+                ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                return
+            for relation in relations:
+                self.related(relation, ids)
+            self.delete(model, f"{pk} = ANY(%s)", [ids])
+
+    def related(self, relation, ids):
+        on_delete = relation.on_delete
+        column = relation.field.column
+        if on_delete is models.CASCADE:
+            self.rows(relation.related_model, column, ids)
+        elif on_delete is models.SET_NULL:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    UPDATE {relation.related_model._meta.db_table}
+                    SET {column} = NULL WHERE {column} = ANY(%s)
+                    """,
+                    [ids],
+                )
+        elif on_delete is not models.DO_NOTHING:
+            raise ValueError(
+                f"Фоновое удаление не поддерживает on_delete="
+                f"{on_delete.__name__} ({relation.field})"
+            )
+
+    def delete(self, model, where, params):
+        """Удаляет пачку строк и учитывает её в прогрессе задания."""
+        table = model._meta.db_table
+        field = media.TRACKED_FIELDS.get(model)
+        returning = model._meta.get_field(field).column if field else "NULL"
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE {where} RETURNING {returning}",
+                params,
+            )
+            names = [row[0] for row in cursor.fetchall()]
+            if not names:
+                return 0
+            if field:
+                media.change_refs(
+                    {name: -count for name, count in Counter(names).items()}
+                )
+            progress = self.job.progress
+            progress[table] = progress.get(table, 0) + len(names)
+            DeletionJob.objects.filter(pk=self.job.pk).update(
+                progress=progress, updated_at=timezone.now()
+            )
+        return len(names)
+
+
+def purge(job, batch_size):
+    """Доудаляет объект задания.
+
+    Возвращает ``False``, если заданием уже занят другой процесс. При
+    ошибке текст сохраняется в ``DeletionJob.error``, а уже удалённые
+    пачки остаются удалёнными.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_try_advisory_lock(%s, %s)", [LOCK_NAMESPACE, job.pk]
+        )
+        if not cursor.fetchone()[0]:
+            return False
+    try:
+        job.refresh_from_db()
+        if job.finished_at is None:
+            model = apps.get_model(job.model)
+            _Purge(job, batch_size).rows(
+                model, model._meta.pk.column, [job.object_id]
+            )
+            job.finished_at, job.error = timezone.now(), ""
+            job.save(update_fields=["finished_at", "error", "updated_at"])
+    except Exception as error:
+        DeletionJob.objects.filter(pk=job.pk).update(
+            error=f"{type(error).__name__}: {error}"
+        )
+        raise
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_unlock(%s, %s)", [LOCK_NAMESPACE, job.pk]
+            )
+    return True
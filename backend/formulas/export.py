@@ -0,0 +1,117 @@
+"""Потоковая выгрузка данных пользователя в формате NDJSON."""
+
+import json
+from itertools import groupby
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Dish, FavoriteRecipe, Follow, IngredientAmount, ShoppingCart
+
+
+def _dump(record):
+    return json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+
+def _iter_recipes(user, chunk_size):
+    """Рецепты автора вместе с ингредиентами.
+
+    Рецепты и строки ингредиентов читаются двумя серверными курсорами,
+    упорядоченными по id рецепта, и склеиваются на лету — в памяти
+    держится только текущий рецепт.
+    """
+    dishes = (
+        Dish.objects.filter(creator=user)
+        .order_by("id")
+        .values("id", "title", "description", "image", "cook_time", "created_at")
+        .iterator(chunk_size=chunk_size)
+    )
+    amounts = groupby(
+        IngredientAmount.objects.filter(dish__creator=user)
+        .order_by("dish_id", "ingredient__name")
+        .values(
+            "dish_id",
+            "ingredient_id",
+            "ingredient__name",
+            "ingredient__measurement_unit",
+            "amount",
+        )
+        .iterator(chunk_size=chunk_size),
+        key=lambda row: row["dish_id"],
+    )
+    group_id, group = next(amounts, (None, iter(())))
+
+    for dish in dishes:
+        while group_id is not None and group_id < dish["id"]:
+            group_id, group = next(amounts, (None, iter(())))
+        ingredients = []
+        if group_id == dish["id"]:
+            ingredients = [
+                {
+                    "id": row["ingredient_id"],
+                    "name": row["ingredient__name"],
+                    "measurement_unit": row["ingredient__measurement_unit"],
+                    "amount": row["amount"],
+                }
+                for row in group
+            ]
+        yield {"type": "recipe", **dish, "ingredients": ingredients}
+
+
+def _iter_relations(model, record_type, user, chunk_size):
+    rows = (
+        model.objects.filter(user=user)
+        .order_by("id")
+        .values("dish_id", "dish__title")
+        .iterator(chunk_size=chunk_size)
+    )
+    for row in rows:
+        yield {
+            "type": record_type,
+            "recipe_id": row["dish_id"],
+            "title": row["dish__title"],
+        }
+
+
+def _iter_subscriptions(user, chunk_size):
+    rows = (
+        Follow.objects.filter(follower=user)
+        .order_by("id")
+        .values("following_id", "following__username")
+        .iterator(chunk_size=chunk_size)
+    )
+    for row in rows:
+        yield {
+            "type": "subscription",
+            "user_id": row["following_id"],
+            "username": row["following__username"],
+        }
+
+
+def iter_user_export(user, chunk_size=None):
+    """Построчно отдаёт NDJSON со всеми данными пользователя.
+
+    Первой строкой идёт профиль, далее рецепты с ингредиентами,
+    избранное, корзина и подписки. Все выборки читаются через
+    ``.iterator(chunk_size=...)``, поэтому потребление памяти не зависит
+    от количества строк.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    yield _dump({
+        "type": "user",
+        "id": user.id,
+        "email": user.email,
+        "username": user.username,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "avatar": user.profile_picture.name or None,
+    })
+    records = (
+        _iter_recipes(user, chunk_size),
+        _iter_relations(FavoriteRecipe, "favorite", user, chunk_size),
+        _iter_relations(ShoppingCart, "shopping_cart", user, chunk_size),
+        _iter_subscriptions(user, chunk_size),
+    )
+    for stream in records:
+        for record in stream:
+            yield _dump(record)
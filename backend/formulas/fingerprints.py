@@ -0,0 +1,169 @@
+"""Отпечатки наборов ингредиентов для поиска дубликатов рецептов.
+
+У каждого рецепта хранятся хеш точного набора ингредиентов
+(``ingredients_hash``), MinHash-сигнатура (``minhash``) и хеши её полос для
+LSH (``lsh_bands``). Рецепты с тем же набором находятся по B-tree индексу
+хеша, похожие — по GIN-индексу полос: два набора с коэффициентом Жаккара
+``s`` совпадают хотя бы в одной полосе с вероятностью
+``1 - (1 - s ** ROWS) ** BANDS``. Похожесть кандидатов оценивается по
+доле совпавших значений сигнатур.
+
+Сериализатор рецепта и импорт пишут отпечаток вместе с рецептом, а
+правки отдельных строк ``IngredientAmount`` (например, в админке)
+пересчитывают его после коммита через ``schedule_refresh``.
+"""
+
+import functools
+import hashlib
+import random
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Dish
+
+NUM_HASHES = 32
+BANDS = 8
+ROWS = NUM_HASHES // BANDS
+
+# Сколько кандидатов из LSH-индекса оценивать для одного рецепта.
+CANDIDATES_LIMIT = 500
+
+_PRIME = (1 << 61) - 1
+_random = random.Random(NUM_HASHES)
+_COEFFICIENTS = [
+    (_random.randrange(1, _PRIME), _random.randrange(_PRIME))
+    for _ in range(NUM_HASHES)
+]
+
+
+def _hash64(*parts):
+    digest = hashlib.blake2b(
+        ",".join(map(str, parts)).encode(), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def fingerprint(ingredient_ids):
+    """Поля отпечатка рецепта по id его ингредиентов."""
+    ids = sorted(set(ingredient_ids))
+    if not ids:
+        return {"ingredients_hash": _hash64(), "minhash": [], "lsh_bands": []}
+    signature = [
+        min((a * x + b) % _PRIME for x in ids) for a, b in _COEFFICIENTS
+    ]
+    return {
+        "ingredients_hash": _hash64(*ids),
+        "minhash": signature,
+        "lsh_bands": [
+            _hash64(band, *signature[band * ROWS:(band + 1) * ROWS])
+            for band in range(BANDS)
+        ],
+    }
+
+
+def similarity(first, second):
+    """Оценка коэффициента Жаккара по двум MinHash-сигнатурам."""
+    if not first or len(first) != len(second):
+        return 0.0
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+def similar(dish, limit=20):
+    """Рецепты с тем же или похожим набором ингредиентов, что у ``dish``.
+
+    Каждому найденному рецепту проставляется ``similarity`` (1 — тот же
+    набор); порог похожести — ``DUPLICATE_SIMILARITY``.
+    """
+    if dish.ingredients_hash is None:
+        return []
+    candidates = (
+        Dish.objects.filter(
+            Q(ingredients_hash=dish.ingredients_hash)
+            | Q(lsh_bands__overlap=dish.lsh_bands)
+        )
+        .exclude(pk=dish.pk)
+        .only(
+            "id", "title", "image", "cook_time", "ingredients_hash", "minhash"
+        )
+        .order_by("-id")[:CANDIDATES_LIMIT]
+    )
+    found = []
+    for candidate in candidates:
+        if candidate.ingredients_hash == dish.ingredients_hash:
+            candidate.similarity = 1.0
+        else:
+            candidate.similarity = similarity(dish.minhash, candidate.minhash)
+        if candidate.similarity >= settings.DUPLICATE_SIMILARITY:
+            found.append(candidate)
+    found.sort(key=lambda candidate: -candidate.similarity)
+    return found[:limit]
+
+
+def _recompute(dishes, batch_size):
+    dishes = dishes.annotate(
+        ingredient_ids=ArrayAgg(
+            "recipe_ingredients__ingredient_id", default=[]
+        )
+    ).only("id").order_by("id")
+    batch, total = [], 0
+    for dish in dishes.iterator(chunk_size=batch_size):
+        for field, value in fingerprint(
+            [pk for pk in dish.ingredient_ids if pk is not None]
+        ).items():
+            setattr(dish, field, value)
+        batch.append(dish)
+        if len(batch) == batch_size:
+            total += _save(batch)
+            batch = []
+    return total + _save(batch)
+
+
+def rebuild(batch_size=1000):
+    """Пересчитывает отпечатки всех рецептов; возвращает их число."""
+    return _recompute(Dish._base_manager.all(), batch_size)
+
+
+def refresh(dish_ids, batch_size=1000):
+    """Пересчитывает отпечатки рецептов ``dish_ids``."""
+    return _recompute(
+        Dish._base_manager.filter(pk__in=list(dish_ids)), batch_size
+    )
+
+
+def _refresh_pending(connection):
+    dish_ids, connection.fingerprint_dishes = (
+        connection.fingerprint_dishes, None
+    )
+    refresh(dish_ids)
+
+
+def schedule_refresh(dish_id, using=None):
+    """Ставит пересчёт отпечатка рецепта на коммит текущей транзакции.
+
+    Рецепты транзакции копятся в одном наборе и пересчитываются одним
+    проходом, сколько бы их строк ни менялось.
+    """
+    connection = transaction.get_connection(using)
+    # Набор сбрасывается в None при пересчёте, а откат транзакции снимает
+    # пересчёт из run_on_commit: в обоих случаях нужен новый.
+    pending = getattr(connection, "fingerprint_dishes", None)
+    if pending is not None and any(
+        getattr(func, "func", None) is _refresh_pending
+        for _, func, _ in connection.run_on_commit
+    ):
+        pending.add(dish_id)
+        return
+    connection.fingerprint_dishes = {dish_id}
+    transaction.on_commit(
+        functools.partial(_refresh_pending, connection), using=using
+    )
+
+
+def _save(dishes):
+    Dish._base_manager.bulk_update(
+        dishes, ["ingredients_hash", "minhash", "lsh_bands"]
+    )
+    return len(dishes)
@@ -0,0 +1,22 @@
+"""Команда Django для сборки статического каталога ингредиентов."""
+
+from django.core.management.base import BaseCommand
+from formulas.catalog import build_catalog, prune_catalog
+
+
+class Command(BaseCommand):
+    help = 'Собирает версионированный JSON-каталог ингредиентов с gzip/brotli'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='Удалить предыдущие версии каталога',
+        )
+
+    def handle(self, *args, **options):
+        name = build_catalog()
+        self.stdout.write(self.style.SUCCESS(f"Каталог собран: {name}"))
+        if options['prune']:
+            removed = prune_catalog()
+            self.stdout.write(f"Удалено устаревших файлов: {removed}")
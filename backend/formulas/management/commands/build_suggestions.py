@@ -0,0 +1,21 @@
+"""Команда Django для периодического пересчёта рекомендаций авторов."""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from formulas import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации авторов для подписки (для cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=settings.SUGGESTIONS_TOP_K,
+            help='Сколько авторов хранить на пользователя',
+        )
+
+    def handle(self, *args, **options):
+        total = suggestions.rebuild(top_k=options['top'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Сохранено рекомендаций: {total}')
+        )
@@ -0,0 +1,42 @@
+"""Команда Django для удаления осиротевших медиафайлов."""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from formulas import media
+
+
+class Command(BaseCommand):
+    help = 'Удаляет медиафайлы, на которые не ссылается ни одна запись'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-minutes',
+            type=int,
+            default=60,
+            help='Не трогать файлы, изменённые за последние N минут',
+        )
+        parser.add_argument(
+            '--scan',
+            action='store_true',
+            help='Обойти каталоги загрузок и удалить неучтённые файлы',
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Предварительно пересчитать ссылки по базе',
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            media.recount()
+        removed = media.collect(
+            timedelta(minutes=options['grace_minutes']),
+            dry_run=options['dry_run'],
+            scan=options['scan'],
+        )
+        for name in removed:
+            self.stdout.write(name)
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f"{verb} файлов: {len(removed)}"))
@@ -0,0 +1,39 @@
+"""Команда Django для выгрузки всех данных пользователя в NDJSON."""
+
+from django.core.management.base import BaseCommand, CommandError
+from formulas.export import iter_user_export
+from formulas.models import UserAccount
+
+
+class Command(BaseCommand):
+    help = 'Выгружает рецепты, избранное, корзину и подписки пользователя в NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Электронная почта пользователя')
+        parser.add_argument(
+            '-o', '--output',
+            help='Файл для записи (по умолчанию — stdout)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Размер пачки серверного курсора',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = UserAccount.objects.get(email=options['email'])
+        except UserAccount.DoesNotExist:
+            raise CommandError(f"Пользователь {options['email']} не найден")
+
+        lines = iter_user_export(user, chunk_size=options['chunk_size'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            file.writelines(lines)
+        self.stderr.write(self.style.SUCCESS(
+            f"Данные пользователя {user.username} выгружены в {options['output']}"
+        ))
@@ -0,0 +1,40 @@
+"""Команда Django для загрузки картинок импортированных рецептов."""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from formulas import recipe_import
+
+
+class Command(BaseCommand):
+    help = 'Скачивает и сохраняет картинки из очереди импорта рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не завершаться, ждать новых заданий',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Пауза между проверками очереди в режиме --loop, с',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            done = failed = 0
+            for job in recipe_import.pending_images().iterator():
+                if not recipe_import.process_image(job):
+                    continue
+                if job.error:
+                    failed += 1
+                    self.stderr.write(f'{job}: {job.error}')
+                else:
+                    done += 1
+            if done or failed:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Загружено картинок: {done}, с ошибками: {failed}'
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,64 @@
+"""Команда Django для пакетного импорта рецептов из NDJSON."""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from formulas import recipe_import
+from formulas.models import UserAccount
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует рецепты из NDJSON-файла пачками; картинки ставятся '
+        'в очередь команды import_images'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='NDJSON-файл, «-» — стандартный ввод',
+        )
+        parser.add_argument(
+            '--author',
+            help='Email автора для записей без поля author',
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Записей в одной транзакции (по умолчанию IMPORT_BATCH_SIZE)',
+        )
+
+    def handle(self, *args, **options):
+        author_id = None
+        if options['author']:
+            author_id = (
+                UserAccount.objects.filter(email=options['author'])
+                .values_list('pk', flat=True).first()
+            )
+            if author_id is None:
+                raise CommandError(
+                    f"Пользователь {options['author']} не найден"
+                )
+
+        if options['path'] == '-':
+            lines = sys.stdin
+        else:
+            try:
+                lines = open(options['path'], encoding='utf-8')
+            except OSError as error:
+                raise CommandError(error)
+        created = failed = 0
+        with lines:
+            for result in recipe_import.import_lines(
+                lines, author_id, options['batch_size']
+            ):
+                if 'id' in result:
+                    created += 1
+                    continue
+                failed += 1
+                for field, message in result['errors'].items():
+                    self.stderr.write(
+                        f"строка {result['line']}: {field}: {message}"
+                    )
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано рецептов: {created}, с ошибками: {failed}'
+        ))
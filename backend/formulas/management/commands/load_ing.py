@@ -5,6 +5,7 @@ from pathlib import Path
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from formulas.catalog import build_catalog
 from formulas.models import Ingredient
 
 
@@ -26,6 +27,8 @@ class Command(BaseCommand):
                 [Ingredient(**item) for item in unique],
                 ignore_conflicts=True
             )
+            # bulk_create не отправляет сигналы — пересобираем каталог явно.
+            build_catalog()
 
             self.stdout.write(
                 self.style.SUCCESS(
@@ -0,0 +1,67 @@
+"""Команда Django для фоновой очистки удалённых пользователей и рецептов."""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from formulas import deletion
+
+
+class Command(BaseCommand):
+    help = (
+        'Пачками удаляет строки мягко удалённых пользователей и рецептов; '
+        'прерванная очистка продолжается с того же места'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.DELETION_BATCH_SIZE,
+            help='Строк в одном DELETE',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не завершаться, ждать новых заданий',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Пауза между проверками очереди в режиме --loop, с',
+        )
+        parser.add_argument(
+            '--status', action='store_true',
+            help='Показать незавершённые задания и выйти',
+        )
+
+    def handle(self, *args, **options):
+        if options['status']:
+            for job in deletion.pending():
+                error = f', ошибка: {job.error}' if job.error else ''
+                self.stdout.write(
+                    f'{job} с {job.created_at:%d.%m.%Y %H:%M}: '
+                    f'{self._progress(job)}{error}'
+                )
+            return
+
+        while True:
+            for job in deletion.pending():
+                try:
+                    purged = deletion.purge(job, options['batch_size'])
+                except Exception as error:
+                    self.stderr.write(f'{job}: {error}')
+                    continue
+                if purged:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'{job} удалён: {self._progress(job)}'
+                    ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    @staticmethod
+    def _progress(job):
+        if not job.progress:
+            return 'строки ещё не удалялись'
+        return ', '.join(
+            f'{table} — {count}'
+            for table, count in sorted(job.progress.items())
+        )
@@ -0,0 +1,17 @@
+"""Команда Django для удаления устаревших записей об удалённых рецептах."""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from formulas.models import DeletedDish
+
+
+class Command(BaseCommand):
+    help = 'Удаляет надгробия рецептов старше TOMBSTONE_RETENTION_DAYS'
+
+    def handle(self, *args, **options):
+        border = timezone.now() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+        deleted, _ = DeletedDish.objects.filter(deleted_at__lt=border).delete()
+        self.stdout.write(self.style.SUCCESS(f"Удалено надгробий: {deleted}"))
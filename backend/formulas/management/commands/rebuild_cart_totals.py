@@ -0,0 +1,20 @@
+"""Команда Django для полного пересчёта итогов корзин покупок."""
+
+from django.core.management.base import BaseCommand
+from formulas import cart_totals
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает материализованные итоги корзин покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'user_ids',
+            nargs='*',
+            type=int,
+            help='id пользователей (по умолчанию — все)',
+        )
+
+    def handle(self, *args, **options):
+        cart_totals.rebuild(options['user_ids'] or None)
+        self.stdout.write(self.style.SUCCESS('Итоги корзин пересчитаны'))
@@ -0,0 +1,17 @@
+"""Команда Django для пересчёта отпечатков наборов ингредиентов."""
+
+from django.core.management.base import BaseCommand
+from formulas import fingerprints
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает хеши и MinHash-сигнатуры наборов ингредиентов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = fingerprints.rebuild(options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Отпечатки пересчитаны: {total} рецептов')
+        )
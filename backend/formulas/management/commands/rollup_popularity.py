@@ -0,0 +1,12 @@
+"""Команда Django для периодического пересчёта трендовых рейтингов."""
+
+from django.core.management.base import BaseCommand
+from formulas import popularity
+
+
+class Command(BaseCommand):
+    help = 'Затухает трендовые очки рецептов и добавляет новые события (для cron)'
+
+    def handle(self, *args, **options):
+        updated = popularity.rollup()
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано рецептов: {updated}"))
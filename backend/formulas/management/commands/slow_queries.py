@@ -0,0 +1,67 @@
+"""Команда Django для просмотра журнала медленных SQL-запросов."""
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Max, Sum
+from formulas.models import SlowQuery
+
+ORDERINGS = {
+    'total': '-total',
+    'calls': '-calls_total',
+    'max': '-longest',
+    'mean': '-mean',
+}
+
+
+class Command(BaseCommand):
+    help = 'Показывает самые тяжёлые медленные запросы по отпечаткам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument(
+            '--order',
+            choices=ORDERINGS,
+            default='total',
+            help='Сортировка: суммарное время, число вызовов, максимум, среднее',
+        )
+        parser.add_argument(
+            '--sources',
+            type=int,
+            default=3,
+            help='Сколько источников (представление и кадр стека) показывать',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Очистить журнал',
+        )
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            deleted, _ = SlowQuery.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(f"Удалено записей: {deleted}"))
+            return
+
+        top = SlowQuery.objects.values('fingerprint').annotate(
+            calls_total=Sum('calls'),
+            total=Sum('total_time'),
+            longest=Max('max_time'),
+            sql_text=Max('sql'),
+        ).annotate(
+            mean=F('total') / F('calls_total'),
+        ).order_by(ORDERINGS[options['order']])[:options['limit']]
+
+        for number, row in enumerate(top, 1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{number}. {row['fingerprint']}: {row['calls_total']} вызовов, "
+                f"всего {row['total']:.0f} мс, среднее {row['mean']:.1f} мс, "
+                f"максимум {row['longest']:.1f} мс"
+            ))
+            self.stdout.write(f"   {row['sql_text']}")
+            sources = SlowQuery.objects.filter(
+                fingerprint=row['fingerprint']
+            ).order_by('-total_time')[:options['sources']]
+            for source in sources:
+                self.stdout.write(
+                    f"   ← {source.action} [{source.route}] {source.frame}: "
+                    f"{source.calls} вызовов, {source.total_time:.0f} мс"
+                )
@@ -0,0 +1,186 @@
+"""Учёт ссылок на медиафайлы и сборка мусора.
+
+Для каждого файла в ``StoredFile`` хранится число записей, которые на
+него ссылаются. Счётчики меняются сигналами при сохранении и удалении
+рецептов и пользователей; файлы с нулевым счётчиком старше периода
+ожидания удаляет команда ``collect_media``.
+
+Повторная загрузка тех же байтов не пишет файл заново, а переиспользует
+существующий. Чтобы сборщик не удалил его между загрузкой и появлением
+ссылки, хранилище вызывает ``protect``: строка учёта получает свежий
+``updated_at``, а общая рекомендательная блокировка не пускает сборщик,
+пока транзакция загрузки не завершится.
+"""
+
+import os
+from collections import Counter
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import Dish, StoredFile, UserAccount
+from .storage import content_addressed_storage
+
+STORED = StoredFile._meta.db_table
+
+# Ключи рекомендательной блокировки сборщика и загрузок.
+LOCK_NAMESPACE = 4033
+LOCK_KEY = 0
+
+# Модели и поля, файлы которых учитываются.
+TRACKED_FIELDS = {
+    Dish: "image",
+    UserAccount: "profile_picture",
+}
+
+
+def change_refs(deltas):
+    """Применяет изменения счётчиков ``{имя файла: дельта}``."""
+    deltas = dict(sorted(
+        (name, delta) for name, delta in deltas.items() if name and delta
+    ))
+    if not deltas:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {STORED} AS s (name, ref_count, updated_at)
+            SELECT d.name, d.delta, now()
+            FROM unnest(%s::varchar[], %s::integer[]) AS d(name, delta)
+            ON CONFLICT (name) DO UPDATE SET
+                ref_count = s.ref_count + EXCLUDED.ref_count,
+                updated_at = now()
+            """,
+            [list(deltas), list(deltas.values())],
+        )
+
+
+def protect(name):
+    """Защищает файл ``name`` от сборщика до конца текущей транзакции.
+
+    Вызывается в ``transaction.atomic`` до проверки, есть ли файл на
+    диске: сборщик, начавший раньше, успеет удалить файл, и его запишут
+    заново, а начавший позже увидит свежий ``updated_at``.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock_shared(%s, %s)",
+            [LOCK_NAMESPACE, LOCK_KEY],
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {STORED} AS s (name, ref_count, updated_at)
+            VALUES (%s, 0, now())
+            ON CONFLICT (name) DO UPDATE SET
+                ref_count = s.ref_count + 0,
+                updated_at = now()
+            """,
+            [name],
+        )
+
+
+def _iter_names(model, field):
+    return (
+        model._base_manager.exclude(**{field: ""})
+        .exclude(**{f"{field}__isnull": True})
+        .values_list(field, flat=True)
+        .iterator()
+    )
+
+
+def referenced_names():
+    """Все имена файлов, на которые ссылаются записи в базе."""
+    names = set()
+    for model, field in TRACKED_FIELDS.items():
+        names.update(_iter_names(model, field))
+    return names
+
+
+def recount():
+    """Пересчитывает все счётчики по данным в базе."""
+    counts = Counter()
+    for model, field in TRACKED_FIELDS.items():
+        counts.update(_iter_names(model, field))
+    StoredFile.objects.exclude(name__in=list(counts)).update(ref_count=0)
+    StoredFile.objects.bulk_create(
+        [StoredFile(name=name, ref_count=count) for name, count in counts.items()],
+        update_conflicts=True,
+        unique_fields=["name"],
+        update_fields=["ref_count", "updated_at"],
+    )
+
+
+def collect(grace, dry_run=False, scan=False):
+    """Удаляет осиротевшие файлы, не менявшиеся дольше ``grace``.
+
+    С ``scan=True`` дополнительно обходит каталоги загрузок и удаляет
+    файлы, которых нет ни в базе, ни в таблице учёта (например,
+    оставшиеся от старых версий хранилища). Возвращает список удалённых
+    имён.
+    """
+    if dry_run:
+        return _collect(grace, dry_run, scan)
+    # Пока идёт удаление, загрузки ждут на protect; блокировка сессионная,
+    # чтобы строки учёта удалялись сразу, а не в конце транзакции.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_lock(%s, %s)", [LOCK_NAMESPACE, LOCK_KEY]
+        )
+    try:
+        return _collect(grace, dry_run, scan)
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_unlock(%s, %s)",
+                [LOCK_NAMESPACE, LOCK_KEY],
+            )
+
+
+def _collect(grace, dry_run, scan):
+    storage = content_addressed_storage()
+    border = timezone.now() - grace
+    if dry_run:
+        removed = list(
+            StoredFile.objects.filter(ref_count__lte=0, updated_at__lt=border)
+            .values_list("name", flat=True)
+        )
+    else:
+        # Строка учёта удаляется до файла и только если ссылок так и не
+        # появилось, чтобы не стереть файл, который только что переиспользовали.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                DELETE FROM {STORED}
+                WHERE ref_count <= 0 AND updated_at < %s
+                RETURNING name
+                """,
+                [border],
+            )
+            removed = [name for name, in cursor.fetchall()]
+
+    if scan:
+        tracked = set(StoredFile.objects.values_list("name", flat=True))
+        referenced = referenced_names()
+        for model, field in TRACKED_FIELDS.items():
+            upload_to = model._meta.get_field(field).upload_to
+            removed.extend(
+                name for name in _walk(storage, upload_to.rstrip("/"))
+                if name not in tracked
+                and name not in referenced
+                and name not in removed
+                and storage.get_modified_time(name) < border
+            )
+
+    if not dry_run:
+        for name in removed:
+            storage.purge(name)
+    return removed
+
+
+def _walk(storage, directory):
+    if not storage.exists(directory):
+        return
+    for root, _, files in os.walk(storage.path(directory)):
+        for filename in files:
+            path = os.path.join(root, filename)
+            yield os.path.relpath(path, storage.location).replace(os.sep, "/")
@@ -0,0 +1,109 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_cart_totals(apps, schema_editor):
+    totals = apps.get_model("formulas", "CartIngredientTotal")._meta.db_table
+    cart = apps.get_model("formulas", "ShoppingCart")._meta.db_table
+    amounts = apps.get_model("formulas", "IngredientAmount")._meta.db_table
+    schema_editor.execute(f"""
+        INSERT INTO {totals} (user_id, ingredient_id, amount)
+        SELECT c.user_id, a.ingredient_id, SUM(a.amount)
+        FROM {cart} c JOIN {amounts} a ON a.dish_id = c.dish_id
+        GROUP BY c.user_id, a.ingredient_id
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formulas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartIngredientTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.BigIntegerField(verbose_name='Количество')),
+            ],
+            options={
+                'verbose_name': 'Итог корзины',
+                'verbose_name_plural': 'Итоги корзин',
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='dish',
+            options={'default_related_name': 'dishes', 'ordering': ('-created_at',), 'verbose_name': 'Рецепт', 'verbose_name_plural': 'Рецепты'},
+        ),
+        migrations.AlterModelOptions(
+            name='ingredientamount',
+            options={'default_related_name': 'recipe_ingredients', 'verbose_name': 'Ингредиент рецепта', 'verbose_name_plural': 'Ингредиенты рецептов'},
+        ),
+        migrations.AlterField(
+            model_name='dish',
+            name='creator',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='dish',
+            name='ingredients',
+            field=models.ManyToManyField(through='formulas.IngredientAmount', to='formulas.ingredient', verbose_name='Ингредиенты'),
+        ),
+        migrations.AlterField(
+            model_name='favoriterecipe',
+            name='dish',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_dish_set', to='formulas.dish', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='favoriterecipe',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_user_set', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientamount',
+            name='dish',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='formulas.dish', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientamount',
+            name='ingredient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='formulas.ingredient', verbose_name='Ингредиент'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='dish',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_dish_set', to='formulas.dish', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_user_set', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddConstraint(
+            model_name='favoriterecipe',
+            constraint=models.UniqueConstraint(fields=('user', 'dish'), name='favoriterecipe_unique_user_dish'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'dish'), name='shoppingcart_unique_user_dish'),
+        ),
+        migrations.AddField(
+            model_name='cartingredienttotal',
+            name='ingredient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_totals', to='formulas.ingredient', verbose_name='Ингредиент'),
+        ),
+        migrations.AddField(
+            model_name='cartingredienttotal',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_totals', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartingredienttotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_cart_total_user_ingredient'),
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_popularity(apps, schema_editor):
+    popularity = apps.get_model("formulas", "DishPopularity")._meta.db_table
+    dishes = apps.get_model("formulas", "Dish")._meta.db_table
+    favorites = apps.get_model("formulas", "FavoriteRecipe")._meta.db_table
+    carts = apps.get_model("formulas", "ShoppingCart")._meta.db_table
+    schema_editor.execute(f"""
+        INSERT INTO {popularity} (
+            dish_id, favorites_count, carts_count, popular_score,
+            pending_score, trending_score, rolled_up_at
+        )
+        SELECT d.id, f.n, c.n, f.n * 2 + c.n, 0, 0, now()
+        FROM {dishes} d,
+        LATERAL (SELECT count(*) AS n FROM {favorites} WHERE dish_id = d.id) f,
+        LATERAL (SELECT count(*) AS n FROM {carts} WHERE dish_id = d.id) c
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formulas', '0002_cart_ingredient_total'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DishPopularity',
+            fields=[
+                ('dish', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='formulas.dish', verbose_name='Рецепт')),
+                ('favorites_count', models.IntegerField(default=0, verbose_name='В избранном')),
+                ('carts_count', models.IntegerField(default=0, verbose_name='В корзинах')),
+                ('popular_score', models.IntegerField(default=0, verbose_name='Популярность')),
+                ('pending_score', models.FloatField(default=0, verbose_name='Новые события')),
+                ('trending_score', models.FloatField(default=0, verbose_name='Тренд')),
+                ('rolled_up_at', models.DateTimeField(auto_now_add=True, verbose_name='Последний пересчёт')),
+            ],
+            options={
+                'verbose_name': 'Популярность рецепта',
+                'verbose_name_plural': 'Популярность рецептов',
+                'indexes': [models.Index(fields=['-popular_score', '-dish'], name='dish_popular_rank_idx'), models.Index(fields=['-trending_score', '-dish'], name='dish_trending_rank_idx')],
+            },
+        ),
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+    ]
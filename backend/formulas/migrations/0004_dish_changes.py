@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formulas', '0003_dish_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedDish',
+            fields=[
+                ('dish_id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='id рецепта')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата удаления')),
+            ],
+            options={
+                'verbose_name': 'Удалённый рецепт',
+                'verbose_name_plural': 'Удалённые рецепты',
+            },
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunSQL(
+            "UPDATE formulas_dish SET updated_at = created_at",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['updated_at', 'id'], name='dish_updated_at_idx'),
+        ),
+    ]
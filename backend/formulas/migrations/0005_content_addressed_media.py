@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:14
+
+import formulas.storage
+from django.db import migrations, models
+
+
+def fill_stored_files(apps, schema_editor):
+    stored = apps.get_model("formulas", "StoredFile")._meta.db_table
+    dishes = apps.get_model("formulas", "Dish")._meta.db_table
+    users = apps.get_model("formulas", "UserAccount")._meta.db_table
+    schema_editor.execute(f"""
+        INSERT INTO {stored} (name, ref_count, updated_at)
+        SELECT name, count(*), now() FROM (
+            SELECT image AS name FROM {dishes}
+            UNION ALL
+            SELECT profile_picture FROM {users}
+        ) AS refs
+        WHERE name IS NOT NULL AND name <> ''
+        GROUP BY name
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formulas', '0004_dish_changes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dish',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=formulas.storage.content_addressed_storage, upload_to='dishes/images/', verbose_name='Фото'),
+        ),
+        migrations.AlterField(
+            model_name='useraccount',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, storage=formulas.storage.content_addressed_storage, upload_to='avatars/', verbose_name='Фотография профиля'),
+        ),
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Путь к файлу')),
+                ('ref_count', models.IntegerField(default=0, verbose_name='Число ссылок')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Медиафайл',
+                'verbose_name_plural': 'Медиафайлы',
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='stored_file_orphan_idx')],
+            },
+        ),
+        migrations.RunPython(fill_stored_files, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formulas', '0005_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=32, verbose_name='Отпечаток запроса')),
+                ('route', models.CharField(max_length=200, verbose_name='Маршрут')),
+                ('action', models.CharField(max_length=200, verbose_name='Представление')),
+                ('frame', models.CharField(max_length=300, verbose_name='Место вызова')),
+                ('sql', models.TextField(verbose_name='Нормализованный SQL')),
+                ('calls', models.BigIntegerField(default=0, verbose_name='Число медленных вызовов')),
+                ('total_time', models.FloatField(default=0, verbose_name='Суммарное время, мс')),
+                ('max_time', models.FloatField(default=0, verbose_name='Максимальное время, мс')),
+                ('last_seen', models.DateTimeField(auto_now=True, verbose_name='Последний раз')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'constraints': [models.UniqueConstraint(fields=('fingerprint', 'route', 'action', 'frame'), name='unique_slow_query_source')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:27
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся без блокировки записи в таблицы.
+    atomic = False
+
+    dependencies = [
+        ('formulas', '0006_slow_query'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='dish',
+            index=models.Index(fields=['-created_at'], name='dish_created_at_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='dish',
+            index=models.Index(fields=['creator', '-created_at'], name='dish_creator_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='favoriterecipe',
+            index=models.Index(fields=['user', '-id'], name='favoriterecipe_user_recent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='ingredient_name_prefix_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='shoppingcart',
+            index=models.Index(fields=['user', '-id'], name='shoppingcart_user_recent_idx'),
+        ),
+    ]
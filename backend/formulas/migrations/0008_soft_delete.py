@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:32
+
+import formulas.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formulas', '0007_index_pack'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='useraccount',
+            managers=[
+                ('objects', formulas.models.UserAccountManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Удалён'),
+        ),
+        migrations.AddField(
+            model_name='useraccount',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Удалён'),
+        ),
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100, verbose_name='Модель')),
+                ('object_id', models.BigIntegerField(verbose_name='id объекта')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата удаления')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Последняя пачка')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата завершения')),
+                ('progress', models.JSONField(default=dict, verbose_name='Удалено строк по таблицам')),
+                ('error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+            ],
+            options={
+                'verbose_name': 'Фоновое удаление',
+                'verbose_name_plural': 'Фоновые удаления',
+                'ordering': ('-created_at',),
+                'indexes': [models.Index(condition=models.Q(('finished_at__isnull', True)), fields=['created_at'], name='deletion_job_pending_idx')],
+                'constraints': [models.UniqueConstraint(fields=('model', 'object_id'), name='unique_deletion_job_object')],
+            },
+        ),
+    ]
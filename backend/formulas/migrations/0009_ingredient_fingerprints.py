@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:40
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся без блокировки записи; отпечатки существующих
+    # рецептов заполняет команда rebuild_fingerprints.
+    atomic = False
+
+    dependencies = [
+        ('formulas', '0008_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='ingredients_hash',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='Хеш набора ингредиентов'),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='lsh_bands',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, editable=False, size=None, verbose_name='Полосы LSH'),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='minhash',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, editable=False, size=None, verbose_name='MinHash-сигнатура'),
+        ),
+        AddIndexConcurrently(
+            model_name='dish',
+            index=models.Index(fields=['ingredients_hash', 'creator'], name='dish_ingredients_hash_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='dish',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['lsh_bands'], name='dish_lsh_bands_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formulas', '0009_ingredient_fingerprints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggested_to', to=settings.AUTH_USER_MODEL, verbose_name='Рекомендуемый автор')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='author_suggestions', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Рекомендация автора',
+                'verbose_name_plural': 'Рекомендации авторов',
+                'constraints': [models.UniqueConstraint(fields=('user', 'author'), name='unique_author_suggestion')],
+            },
+        ),
+    ]
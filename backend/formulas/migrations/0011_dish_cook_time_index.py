@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:47
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индекс строится без блокировки записи в таблицу.
+    atomic = False
+
+    dependencies = [
+        ('formulas', '0010_author_suggestions'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='dish',
+            index=models.Index(fields=['cook_time'], name='dish_cook_time_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formulas', '0011_dish_cook_time_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.TextField(verbose_name='URL или data URI картинки')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата импорта')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата завершения')),
+                ('error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_import_jobs', to='formulas.dish', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Загрузка картинки',
+                'verbose_name_plural': 'Загрузки картинок',
+                'ordering': ('-created_at',),
+                'indexes': [models.Index(condition=models.Q(('finished_at__isnull', True)), fields=['created_at'], name='image_import_pending_idx')],
+            },
+        ),
+    ]
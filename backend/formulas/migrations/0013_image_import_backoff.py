@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:11
+
+import django.utils.timezone
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    RemoveIndexConcurrently,
+)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы меняются без блокировки записи в таблицу.
+    atomic = False
+
+    dependencies = [
+        ('formulas', '0012_image_import_jobs'),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='imageimportjob',
+            name='image_import_pending_idx',
+        ),
+        migrations.AddField(
+            model_name='imageimportjob',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Следующая попытка'),
+        ),
+        AddIndexConcurrently(
+            model_name='imageimportjob',
+            index=models.Index(condition=models.Q(('finished_at__isnull', True)), fields=['next_attempt_at'], name='image_import_due_idx'),
+        ),
+    ]
@@ -1,8 +1,42 @@
 """Модели приложения 'formulas': рецепты, ингредиенты, корзина и избранное."""
 
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.core.validators import RegexValidator, MinValueValidator
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
+
+from .storage import content_addressed_storage
+
+
+class VisibleManager(models.Manager):
+    """Менеджер, скрывающий мягко удалённые записи (``deleted_at``).
+
+    Сами записи удаляет позже фоновая очистка, см. ``formulas.deletion``.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class UserAccountManager(UserManager):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class FollowManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(
+            follower__deleted_at__isnull=True,
+            following__deleted_at__isnull=True,
+        )
+
+
+class RelationManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(dish__deleted_at__isnull=True)
 
 
 class UserAccount(AbstractUser):
@@ -31,10 +65,19 @@ class UserAccount(AbstractUser):
     )
     profile_picture = models.ImageField(
         upload_to='avatars/',
+        storage=content_addressed_storage,
         blank=True,
         null=True,
         verbose_name='Фотография профиля'
     )
+    deleted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Удалён'
+    )
+
+    objects = UserAccountManager()
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name', 'password']
@@ -62,6 +105,8 @@ class Follow(models.Model):
         verbose_name='На кого подписан'
     )
 
+    objects = FollowManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -96,6 +141,13 @@ class Ingredient(models.Model):
                 name="unique_ingredient_name_unit",
             )
         ]
+        indexes = [
+            # Поиск по префиксу (name__istartswith) без учёта регистра.
+            models.Index(
+                OpClass(Upper("name"), name="text_pattern_ops"),
+                name="ingredient_name_prefix_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.measurement_unit})"
@@ -111,6 +163,7 @@ class Dish(models.Model):
     )
     image = models.ImageField(
         upload_to="dishes/images/",
+        storage=content_addressed_storage,
         verbose_name="Фото",
         blank=True,
         null=True,
@@ -133,17 +186,93 @@ class Dish(models.Model):
         auto_now_add=True,
         verbose_name="Дата публикации",
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения",
+    )
+    deleted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Удалён",
+    )
+    # Отпечатки набора ингредиентов, см. formulas.fingerprints.
+    ingredients_hash = models.BigIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Хеш набора ингредиентов",
+    )
+    minhash = ArrayField(
+        models.BigIntegerField(),
+        default=list,
+        blank=True,
+        editable=False,
+        verbose_name="MinHash-сигнатура",
+    )
+    lsh_bands = ArrayField(
+        models.BigIntegerField(),
+        default=list,
+        blank=True,
+        editable=False,
+        verbose_name="Полосы LSH",
+    )
+
+    objects = VisibleManager()
 
     class Meta:
         ordering = ("-created_at",)
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         default_related_name = "dishes"
+        indexes = [
+            models.Index(
+                fields=("updated_at", "id"),
+                name="dish_updated_at_idx",
+            ),
+            models.Index(
+                fields=("-created_at",),
+                name="dish_created_at_idx",
+            ),
+            models.Index(
+                fields=("creator", "-created_at"),
+                name="dish_creator_created_idx",
+            ),
+            models.Index(
+                fields=("ingredients_hash", "creator"),
+                name="dish_ingredients_hash_idx",
+            ),
+            GinIndex(fields=("lsh_bands",), name="dish_lsh_bands_idx"),
+            # Фильтр списка по времени приготовления.
+            models.Index(
+                fields=("cook_time",),
+                name="dish_cook_time_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} (id={self.id})"
 
 
+class DeletedDish(models.Model):
+    dish_id = models.BigIntegerField(
+        primary_key=True,
+        verbose_name="id рецепта",
+    )
+    deleted_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name="Дата удаления",
+    )
+
+    class Meta:
+        verbose_name = "Удалённый рецепт"
+        verbose_name_plural = "Удалённые рецепты"
+
+    def __str__(self):
+        return f"id={self.dish_id} ({self.deleted_at:%d.%m.%Y %H:%M})"
+
+
 class IngredientAmount(models.Model):
     dish = models.ForeignKey(
         Dish,
@@ -192,6 +321,8 @@ class UserRecipeRelation(models.Model):
         verbose_name="Рецепт",
     )
 
+    objects = RelationManager()
+
     class Meta:
         abstract = True
         constraints = [
@@ -200,6 +331,13 @@ class UserRecipeRelation(models.Model):
                 name="%(class)s_unique_user_dish",
             )
         ]
+        indexes = [
+            # Списки пользователя от новых к старым.
+            models.Index(
+                fields=("user", "-id"),
+                name="%(class)s_user_recent_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user} → {self.dish}"
@@ -215,3 +353,296 @@ class ShoppingCart(UserRecipeRelation):
     class Meta(UserRecipeRelation.Meta):
         verbose_name = "Корзина покупок"
         verbose_name_plural = "Корзины покупок"
+
+
+class CartIngredientTotal(models.Model):
+    user = models.ForeignKey(
+        UserAccount,
+        on_delete=models.CASCADE,
+        related_name="cart_totals",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="cart_totals",
+        verbose_name="Ингредиент",
+    )
+    amount = models.BigIntegerField(
+        verbose_name="Количество",
+    )
+
+    class Meta:
+        verbose_name = "Итог корзины"
+        verbose_name_plural = "Итоги корзин"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "ingredient"),
+                name="unique_cart_total_user_ingredient",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.ingredient} — {self.amount}"
+
+
+class DishPopularity(models.Model):
+    dish = models.OneToOneField(
+        Dish,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="popularity",
+        verbose_name="Рецепт",
+    )
+    favorites_count = models.IntegerField(
+        default=0,
+        verbose_name="В избранном",
+    )
+    carts_count = models.IntegerField(
+        default=0,
+        verbose_name="В корзинах",
+    )
+    popular_score = models.IntegerField(
+        default=0,
+        verbose_name="Популярность",
+    )
+    pending_score = models.FloatField(
+        default=0,
+        verbose_name="Новые события",
+    )
+    trending_score = models.FloatField(
+        default=0,
+        verbose_name="Тренд",
+    )
+    rolled_up_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Последний пересчёт",
+    )
+
+    class Meta:
+        verbose_name = "Популярность рецепта"
+        verbose_name_plural = "Популярность рецептов"
+        indexes = [
+            models.Index(
+                fields=("-popular_score", "-dish"),
+                name="dish_popular_rank_idx",
+            ),
+            models.Index(
+                fields=("-trending_score", "-dish"),
+                name="dish_trending_rank_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.dish}: {self.popular_score} / {self.trending_score:.2f}"
+
+
+class StoredFile(models.Model):
+    name = models.CharField(
+        max_length=255,
+        primary_key=True,
+        verbose_name="Путь к файлу",
+    )
+    ref_count = models.IntegerField(
+        default=0,
+        verbose_name="Число ссылок",
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения",
+    )
+
+    class Meta:
+        verbose_name = "Медиафайл"
+        verbose_name_plural = "Медиафайлы"
+        indexes = [
+            models.Index(
+                fields=("ref_count", "updated_at"),
+                name="stored_file_orphan_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
+class SlowQuery(models.Model):
+    fingerprint = models.CharField(
+        max_length=32,
+        verbose_name="Отпечаток запроса",
+    )
+    route = models.CharField(
+        max_length=200,
+        verbose_name="Маршрут",
+    )
+    action = models.CharField(
+        max_length=200,
+        verbose_name="Представление",
+    )
+    frame = models.CharField(
+        max_length=300,
+        verbose_name="Место вызова",
+    )
+    sql = models.TextField(
+        verbose_name="Нормализованный SQL",
+    )
+    calls = models.BigIntegerField(
+        default=0,
+        verbose_name="Число медленных вызовов",
+    )
+    total_time = models.FloatField(
+        default=0,
+        verbose_name="Суммарное время, мс",
+    )
+    max_time = models.FloatField(
+        default=0,
+        verbose_name="Максимальное время, мс",
+    )
+    last_seen = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Последний раз",
+    )
+
+    class Meta:
+        verbose_name = "Медленный запрос"
+        verbose_name_plural = "Медленные запросы"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("fingerprint", "route", "action", "frame"),
+                name="unique_slow_query_source",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.fingerprint} ({self.action}): {self.calls}"
+
+
+class DeletionJob(models.Model):
+    model = models.CharField(
+        max_length=100,
+        verbose_name="Модель",
+    )
+    object_id = models.BigIntegerField(
+        verbose_name="id объекта",
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата удаления",
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Последняя пачка",
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Дата завершения",
+    )
+    progress = models.JSONField(
+        default=dict,
+        verbose_name="Удалено строк по таблицам",
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="Последняя ошибка",
+    )
+
+    class Meta:
+        verbose_name = "Фоновое удаление"
+        verbose_name_plural = "Фоновые удаления"
+        ordering = ("-created_at",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=("model", "object_id"),
+                name="unique_deletion_job_object",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=("created_at",),
+                name="deletion_job_pending_idx",
+                condition=models.Q(finished_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.model} id={self.object_id}"
+
+
+class AuthorSuggestion(models.Model):
+    user = models.ForeignKey(
+        UserAccount,
+        on_delete=models.CASCADE,
+        related_name="author_suggestions",
+        verbose_name="Пользователь",
+    )
+    author = models.ForeignKey(
+        UserAccount,
+        on_delete=models.CASCADE,
+        related_name="suggested_to",
+        verbose_name="Рекомендуемый автор",
+    )
+    score = models.FloatField(
+        verbose_name="Оценка",
+    )
+
+    class Meta:
+        verbose_name = "Рекомендация автора"
+        verbose_name_plural = "Рекомендации авторов"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "author"),
+                name="unique_author_suggestion",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user} → {self.author}: {self.score:.2f}"
+
+
+class ImageImportJob(models.Model):
+    dish = models.ForeignKey(
+        Dish,
+        on_delete=models.CASCADE,
+        related_name="image_import_jobs",
+        verbose_name="Рецепт",
+    )
+    source = models.TextField(
+        verbose_name="URL или data URI картинки",
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="Попыток",
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата импорта",
+    )
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Следующая попытка",
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Дата завершения",
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="Последняя ошибка",
+    )
+
+    class Meta:
+        verbose_name = "Загрузка картинки"
+        verbose_name_plural = "Загрузки картинок"
+        ordering = ("-created_at",)
+        indexes = [
+            models.Index(
+                fields=("next_attempt_at",),
+                name="image_import_due_idx",
+                condition=models.Q(finished_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.dish_id}: {self.source[:60]}"
@@ -0,0 +1,97 @@
+"""Рейтинги популярности и трендовости рецептов.
+
+Каждое добавление в избранное или корзину сразу увеличивает счётчики
+``DishPopularity`` и копит очки в ``pending_score``. Периодический
+пересчёт (команда ``rollup_popularity``) затухает ``trending_score`` с
+периодом полураспада ``TRENDING_HALF_LIFE_HOURS`` и добавляет к нему
+накопленные очки. Строка рейтинга заводится при создании рецепта, поэтому
+сортировка списков идёт по индексу через внутреннее соединение и
+ничего не агрегирует на лету.
+"""
+
+from django.conf import settings
+from django.db import connection
+
+from .models import DishPopularity
+
+POPULARITY = DishPopularity._meta.db_table
+
+FAVORITE_WEIGHT = 2
+CART_WEIGHT = 1
+
+# Значения ниже порога обнуляются, чтобы пересчёт не трогал «остывшие»
+# рецепты бесконечно.
+MIN_TRENDING_SCORE = 0.01
+
+
+def create(dish_ids):
+    """Заводит нулевые строки рейтинга для новых рецептов."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {POPULARITY} (
+                dish_id, favorites_count, carts_count, popular_score,
+                pending_score, trending_score, rolled_up_at
+            )
+            SELECT dish_id, 0, 0, 0, 0, 0, now()
+            FROM unnest(%s::bigint[]) AS dish_id ORDER BY dish_id
+            ON CONFLICT (dish_id) DO NOTHING
+            """,
+            [sorted(dish_ids)],
+        )
+
+
+def record(dish_ids, favorites=0, carts=0):
+    """Учитывает добавление (+1) или удаление (-1) рецептов пользователем."""
+    score = favorites * FAVORITE_WEIGHT + carts * CART_WEIGHT
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {POPULARITY} AS p (
+                dish_id, favorites_count, carts_count, popular_score,
+                pending_score, trending_score, rolled_up_at
+            )
+            SELECT dish_id, %s, %s, %s, %s, 0, now()
+            FROM unnest(%s::bigint[]) AS dish_id ORDER BY dish_id
+            ON CONFLICT (dish_id) DO UPDATE SET
+                favorites_count = p.favorites_count + EXCLUDED.favorites_count,
+                carts_count = p.carts_count + EXCLUDED.carts_count,
+                popular_score = p.popular_score + EXCLUDED.popular_score,
+                pending_score = p.pending_score + EXCLUDED.pending_score
+            """,
+            [favorites, carts, score, score, sorted(dish_ids)],
+        )
+
+
+def rollup():
+    """Затухает трендовые очки и переносит в них накопленные события.
+
+    Обновление идёт одним ``UPDATE`` по самой таблице, поэтому события,
+    записанные параллельно, не теряются. Возвращает число обновлённых
+    строк.
+    """
+    score = """
+        GREATEST(
+            trending_score * power(
+                0.5, extract(epoch FROM now() - rolled_up_at) / %(half_life)s
+            ) + pending_score,
+            0
+        )
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {POPULARITY} SET
+                trending_score = CASE
+                    WHEN {score} < %(min_score)s THEN 0 ELSE {score}
+                END,
+                pending_score = 0,
+                rolled_up_at = now()
+            WHERE trending_score > 0 OR pending_score <> 0
+            """,
+            {
+                "half_life": settings.TRENDING_HALF_LIFE_HOURS * 3600,
+                "min_score": MIN_TRENDING_SCORE,
+            },
+        )
+        return cursor.rowcount
@@ -0,0 +1,516 @@
+"""Пакетный импорт рецептов из NDJSON.
+
+Каждая строка — один рецепт::
+
+    {"author": "chef@example.com", "title": "Борщ", "description": "...",
+     "cooking_time": 90, "image": "https://example.com/borsch.jpg",
+     "ingredients": [{"id": 12, "amount": 300},
+                     {"name": "соль", "measurement_unit": "г", "amount": 5}]}
+
+``author`` — id, email или логин; запись без него получает автора по
+умолчанию. Вместо ``cooking_time`` допустим ``cook_time`` из выгрузки
+``export_user``, ингредиент задаётся id или названием с единицей
+измерения (без учёта регистра). ``image`` — URL http(s) или data URI.
+
+Записи обрабатываются пачками по ``IMPORT_BATCH_SIZE``: авторы и
+ингредиенты пачки находятся общими запросами, дубликаты у того же
+автора — по индексу отпечатков, а рецепты, их ингредиенты и строки
+популярности пишутся ``bulk_create`` в одной транзакции на пачку.
+Картинки во время импорта не скачиваются и не декодируются: они ставятся
+в очередь ``ImageImportJob``, которую разбирает команда
+``import_images``. Ошибочная запись попадает в отчёт и не мешает
+остальным.
+
+Картинки скачиваются только с публичных адресов: адрес проверяется
+у уже открытого соединения, поэтому его не обойти ни перенаправлением,
+ни DNS, который отвечает по-разному. Неудачная загрузка повторяется
+через ``IMAGE_IMPORT_RETRY_DELAY`` секунд, и пауза удваивается с каждой
+попыткой.
+"""
+
+import base64
+import binascii
+import http.client
+import io
+import ipaddress
+import json
+import socket
+import urllib.request
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image
+
+from . import fingerprints, media, popularity
+from .models import (
+    Dish,
+    ImageImportJob,
+    Ingredient,
+    IngredientAmount,
+    UserAccount,
+)
+from .storage import content_addressed_storage
+
+INGREDIENTS = Ingredient._meta.db_table
+
+MAX_INTEGER = 2**31 - 1
+
+# Строк в одном INSERT при bulk_create.
+INSERT_CHUNK_SIZE = 1000
+
+IMAGE_SOURCES = ("http://", "https://", "data:image/")
+IMAGE_EXTENSIONS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "GIF": ".gif",
+    "WEBP": ".webp",
+}
+
+# После стольких неудачных попыток картинка больше не загружается.
+MAX_IMAGE_ATTEMPTS = 3
+
+# Первый ключ рекомендательной блокировки, второй — id задания.
+LOCK_NAMESPACE = 4049
+
+
+class RecordError(Exception):
+    """Ошибки одной записи в виде ``{поле: сообщение}``."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def _integer(value):
+    return type(value) is int and 1 <= value <= MAX_INTEGER
+
+
+def _text(value, max_length=None):
+    return (
+        isinstance(value, str)
+        and bool(value.strip())
+        and (max_length is None or len(value) <= max_length)
+    )
+
+
+def _ingredient_key(item):
+    """``("id", id)`` или ``("name", (название, единица))``."""
+    if not isinstance(item, dict):
+        return None
+    if "id" in item:
+        return ("id", item["id"]) if _integer(item["id"]) else None
+    name, unit = item.get("name"), item.get("measurement_unit")
+    if _text(name) and _text(unit):
+        return "name", (name.strip(), unit.strip())
+    return None
+
+
+def _describe(key):
+    kind, value = key
+    if kind == "id":
+        return f"id {value}"
+    return f"{value[0]} ({value[1]})"
+
+
+def _clean(record):
+    """Проверяет запись и приводит её к виду для записи в базу."""
+    if isinstance(record, RecordError):
+        raise record
+    if not isinstance(record, dict):
+        raise RecordError({"record": "Ожидается JSON-объект"})
+    errors = {}
+    title_length = Dish._meta.get_field("title").max_length
+    if not _text(record.get("title"), title_length):
+        errors["title"] = f"Непустая строка до {title_length} символов"
+    if not _text(record.get("description")):
+        errors["description"] = "Обязательное поле"
+    cook_time = record.get("cooking_time", record.get("cook_time"))
+    if not _integer(cook_time):
+        errors["cooking_time"] = "Ожидается целое число не меньше 1"
+    image = record.get("image")
+    if image is not None and not (
+        isinstance(image, str) and image.startswith(IMAGE_SOURCES)
+    ):
+        errors["image"] = "Ожидается URL http(s) или data URI картинки"
+    author = record.get("author")
+    if author is not None and not (_integer(author) or _text(author)):
+        errors["author"] = "Ожидается id, email или логин"
+
+    ingredients = []
+    items = record.get("ingredients")
+    if not isinstance(items, list) or not items:
+        errors["ingredients"] = "Нужен хотя бы один ингредиент"
+    else:
+        for item in items:
+            key = _ingredient_key(item)
+            if key is None or not _integer(item.get("amount")):
+                errors["ingredients"] = (
+                    "Ингредиент задаётся id или name с measurement_unit, "
+                    "amount — целое число не меньше 1"
+                )
+                break
+            ingredients.append((key, item["amount"]))
+        else:
+            if len({key for key, _ in ingredients}) != len(ingredients):
+                errors["ingredients"] = "Ингредиенты не должны повторяться"
+    if errors:
+        raise RecordError(errors)
+    return {
+        "author": author.strip() if isinstance(author, str) else author,
+        "title": record["title"].strip(),
+        "description": record["description"],
+        "cook_time": cook_time,
+        "image": image,
+        "ingredients": ingredients,
+    }
+
+
+def _resolve_authors(keys):
+    """``{id, email или логин: id пользователя}`` одним запросом."""
+    ids = [key for key in keys if isinstance(key, int)]
+    names = [key for key in keys if isinstance(key, str)]
+    if not keys:
+        return {}
+    users = UserAccount.objects.filter(is_active=True).filter(
+        Q(pk__in=ids) | Q(email__in=names) | Q(username__in=names)
+    ).values_list("pk", "email", "username")
+    found = {}
+    for pk, email, username in users:
+        for key in (pk, email, username):
+            if key in keys:
+                found[key] = pk
+    return found
+
+
+def _resolve_ingredients(keys):
+    """``{ключ ингредиента: id}``: по id и по названиям — общими запросами."""
+    found = {}
+    ids = [value for kind, value in keys if kind == "id"]
+    if ids:
+        found.update(
+            (("id", pk), pk)
+            for pk in Ingredient.objects.filter(pk__in=ids)
+            .values_list("pk", flat=True)
+        )
+    names = [value for kind, value in keys if kind == "name"]
+    if names:
+        with connection.cursor() as cursor:
+            # upper(name) ищется по индексу ingredient_name_prefix_idx; при
+            # совпадении названий без учёта регистра берётся первый id.
+            cursor.execute(
+                f"""
+                SELECT DISTINCT ON (k.name, k.unit) i.id, k.name, k.unit
+                FROM unnest(%s::text[], %s::text[]) AS k(name, unit)
+                JOIN {INGREDIENTS} i
+                    ON upper(i.name) = upper(k.name)
+                    AND i.measurement_unit = k.unit
+                ORDER BY k.name, k.unit, i.id
+                """,
+                [[name for name, _ in names], [unit for _, unit in names]],
+            )
+            found.update(
+                (("name", (name, unit)), pk)
+                for pk, name, unit in cursor.fetchall()
+            )
+    return found
+
+
+def _write(records):
+    """Пишет рецепты пачки; возвращает созданные ``Dish`` в том же порядке."""
+    dishes = Dish.objects.bulk_create(
+        [
+            Dish(
+                creator_id=record["creator_id"],
+                title=record["title"],
+                description=record["description"],
+                cook_time=record["cook_time"],
+                **record["fingerprint"],
+            )
+            for record in records
+        ],
+        batch_size=INSERT_CHUNK_SIZE,
+    )
+    IngredientAmount.objects.bulk_create(
+        [
+            IngredientAmount(
+                dish=dish, ingredient_id=ingredient_id, amount=amount
+            )
+            for dish, record in zip(dishes, records)
+            for ingredient_id, amount in record["amounts"].items()
+        ],
+        batch_size=INSERT_CHUNK_SIZE,
+    )
+    # bulk_create не отправляет сигналы, строки рейтинга заводим явно.
+    popularity.create([dish.pk for dish in dishes])
+    ImageImportJob.objects.bulk_create(
+        [
+            ImageImportJob(dish=dish, source=record["image"])
+            for dish, record in zip(dishes, records)
+            if record["image"]
+        ],
+        batch_size=INSERT_CHUNK_SIZE,
+    )
+    return dishes
+
+
+def _import_batch(batch, default_author):
+    results = {}
+    cleaned = []
+    for line, record in batch:
+        try:
+            cleaned.append((line, _clean(record)))
+        except RecordError as error:
+            results[line] = {"line": line, "errors": error.errors}
+
+    authors = _resolve_authors({
+        record["author"] for _, record in cleaned
+        if record["author"] is not None
+    })
+    ingredients = _resolve_ingredients({
+        key for _, record in cleaned for key, _ in record["ingredients"]
+    })
+    resolved = []
+    for line, record in cleaned:
+        errors = {}
+        if record["author"] is None:
+            creator_id = default_author
+            if creator_id is None:
+                errors["author"] = "Не указан автор"
+        else:
+            creator_id = authors.get(record["author"])
+            if creator_id is None:
+                errors["author"] = f"Пользователь {record['author']} не найден"
+        missing = [
+            _describe(key) for key, _ in record["ingredients"]
+            if key not in ingredients
+        ]
+        amounts = {
+            ingredients[key]: amount
+            for key, amount in record["ingredients"]
+            if key in ingredients
+        }
+        if missing:
+            errors["ingredients"] = (
+                f"Ингредиенты не найдены: {', '.join(missing)}"
+            )
+        elif len(amounts) != len(record["ingredients"]):
+            errors["ingredients"] = "Ингредиенты не должны повторяться"
+        if errors:
+            results[line] = {"line": line, "errors": errors}
+            continue
+        record.update(
+            creator_id=creator_id,
+            amounts=amounts,
+            fingerprint=fingerprints.fingerprint(amounts),
+        )
+        resolved.append((line, record))
+
+    # Тот же набор продуктов у того же автора, как в RecipeWriteSerializer.
+    seen = set(
+        Dish.objects.filter(
+            ingredients_hash__in={
+                record["fingerprint"]["ingredients_hash"]
+                for _, record in resolved
+            },
+            creator_id__in={record["creator_id"] for _, record in resolved},
+        ).values_list("creator_id", "ingredients_hash")
+    ) if resolved else set()
+    ready = []
+    for line, record in resolved:
+        key = (record["creator_id"], record["fingerprint"]["ingredients_hash"])
+        if key in seen:
+            results[line] = {"line": line, "errors": {
+                "ingredients": (
+                    "У автора уже есть рецепт с таким же набором продуктов"
+                ),
+            }}
+            continue
+        seen.add(key)
+        ready.append((line, record))
+
+    if ready:
+        try:
+            with transaction.atomic():
+                dishes = _write([record for _, record in ready])
+        except DatabaseError as error:
+            for line, _ in ready:
+                results[line] = {"line": line, "errors": {
+                    "record": f"Пакет не записан: {error}",
+                }}
+        else:
+            for (line, _), dish in zip(ready, dishes):
+                results[line] = {"line": line, "id": dish.pk}
+    return [results[line] for line, _ in batch]
+
+
+def _iter_records(lines):
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            try:
+                line = line.decode()
+            except UnicodeDecodeError:
+                yield number, RecordError({"record": "Ожидается UTF-8"})
+                continue
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, RecordError({"record": "Некорректный JSON"})
+
+
+def import_lines(lines, default_author=None, batch_size=None):
+    """Импортирует рецепты из строк NDJSON.
+
+    Отдаёт по результату на каждую непустую строку:
+    ``{"line": номер, "id": id рецепта}`` или
+    ``{"line": номер, "errors": {поле: сообщение}}``. ``default_author`` —
+    id автора для записей без ``author``.
+    """
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    records = _iter_records(lines)
+    while batch := list(islice(records, batch_size)):
+        yield from _import_batch(batch, default_author)
+
+
+def pending_images():
+    """Незавершённые загрузки картинок, которым пора повторить попытку."""
+    return ImageImportJob.objects.filter(
+        finished_at__isnull=True, next_attempt_at__lte=timezone.now()
+    ).order_by("next_attempt_at")
+
+
+def _public_connection(address, *args, **kwargs):
+    """``socket.create_connection``, отказывающий внутренним адресам."""
+    sock = socket.create_connection(address, *args, **kwargs)
+    try:
+        peer = ipaddress.ip_address(sock.getpeername()[0])
+    except ValueError:
+        peer = None
+    if peer is not None and peer.version == 6 and peer.ipv4_mapped:
+        peer = peer.ipv4_mapped
+    if peer is None or not peer.is_global:
+        sock.close()
+        raise ValueError(f"Адрес {address[0]} не публичный")
+    return sock
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, request):
+        return self.do_open(_PublicHTTPConnection, request)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, request):
+        return self.do_open(
+            _PublicHTTPSConnection, request, context=self._context
+        )
+
+
+# Без прокси из окружения: иначе проверялся бы адрес прокси, а не сайта.
+_opener = urllib.request.build_opener(
+    urllib.request.ProxyHandler({}), _PublicHTTPHandler, _PublicHTTPSHandler
+)
+
+
+def _download(source):
+    limit = settings.IMAGE_IMPORT_MAX_BYTES
+    if source.startswith("data:"):
+        header, _, encoded = source.partition(",")
+        if not header.endswith(";base64"):
+            raise ValueError("Ожидается data URI в base64")
+        if len(encoded) > limit * 4 // 3 + 4:
+            raise ValueError(f"Картинка больше {limit} байт")
+        try:
+            return base64.b64decode(encoded, validate=True)
+        except binascii.Error:
+            raise ValueError("Некорректный base64")
+    request = urllib.request.Request(
+        source, headers={"User-Agent": "foodgram-import"}
+    )
+    with _opener.open(
+        request, timeout=settings.IMAGE_IMPORT_TIMEOUT
+    ) as response:
+        data = response.read(limit + 1)
+    if len(data) > limit:
+        raise ValueError(f"Картинка больше {limit} байт")
+    return data
+
+
+def _store(data):
+    """Проверяет картинку и сохраняет её в хранилище; возвращает имя."""
+    with Image.open(io.BytesIO(data)) as image:
+        image.verify()
+        extension = IMAGE_EXTENSIONS.get(image.format)
+    if extension is None:
+        raise ValueError(f"Неподдерживаемый формат {image.format}")
+    upload_to = Dish._meta.get_field("image").upload_to
+    return content_addressed_storage().save(
+        f"{upload_to}import{extension}", ContentFile(data)
+    )
+
+
+def process_image(job):
+    """Загружает картинку задания и ставит её рецепту.
+
+    Возвращает ``False``, если заданием уже занят другой процесс. Ошибка
+    сохраняется в ``ImageImportJob.error``, а повтор откладывается; после
+    ``MAX_IMAGE_ATTEMPTS`` неудач задание закрывается. Картинку, которую
+    автор успел поставить сам, импорт не заменяет.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_try_advisory_lock(%s, %s)", [LOCK_NAMESPACE, job.pk]
+        )
+        if not cursor.fetchone()[0]:
+            return False
+    try:
+        job.refresh_from_db()
+        if job.finished_at is not None:
+            return True
+        job.attempts += 1
+        try:
+            name = _store(_download(job.source))
+        except Exception as error:
+            job.error = f"{type(error).__name__}: {error}"
+            if job.attempts >= MAX_IMAGE_ATTEMPTS:
+                job.finished_at = timezone.now()
+            job.next_attempt_at = timezone.now() + timedelta(
+                seconds=settings.IMAGE_IMPORT_RETRY_DELAY
+                * 2 ** (job.attempts - 1)
+            )
+            job.save(update_fields=[
+                "attempts", "error", "finished_at", "next_attempt_at",
+            ])
+            return True
+        with transaction.atomic():
+            # update() не отправляет сигналы: ссылку на файл учитываем явно.
+            if Dish._base_manager.filter(
+                Q(image="") | Q(image__isnull=True), pk=job.dish_id
+            ).update(image=name, updated_at=timezone.now()):
+                media.change_refs({name: 1})
+            job.finished_at, job.error = timezone.now(), ""
+            job.save(update_fields=["attempts", "error", "finished_at"])
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_unlock(%s, %s)", [LOCK_NAMESPACE, job.pk]
+            )
+    return True
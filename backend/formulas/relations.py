@@ -0,0 +1,134 @@
+"""Переключение избранного, корзины и подписок одним SQL-запросом.
+
+Переключатели не читают объекты перед записью: ``INSERT ... ON CONFLICT
+DO NOTHING RETURNING`` и ``DELETE ... RETURNING`` сами сообщают, изменилась
+ли таблица, а повторный клик не упирается в ошибку уникальности. Запросы
+идут мимо ORM, поэтому сигналы не срабатывают и итоги корзины с
+популярностью обновляются здесь явно, в той же транзакции. Мягко
+удалённые рецепты и пользователи (``deleted_at``) считаются отсутствующими.
+"""
+
+from django.db import connection, transaction
+
+from . import cart_totals, popularity
+from .models import Dish, Follow, ShoppingCart, UserAccount
+
+DISHES = Dish._meta.db_table
+USERS = UserAccount._meta.db_table
+FOLLOWS = Follow._meta.db_table
+
+
+def _recipes_changed(model, user_id, dish_ids, sign):
+    if not dish_ids:
+        return
+    if model is ShoppingCart:
+        cart_totals.add_dishes(user_id, dish_ids, sign)
+        popularity.record(dish_ids, carts=sign)
+    else:
+        popularity.record(dish_ids, favorites=sign)
+
+
+@transaction.atomic
+def add_recipe(model, user_id, dish_id):
+    """Добавляет рецепт в избранное или корзину (``model``).
+
+    Возвращает рецепт с флагом ``created`` (``False``, если рецепт уже был
+    добавлен) или ``None``, если рецепта нет.
+    """
+    dish = next(iter(Dish.objects.raw(
+        f"""
+        WITH target AS (
+            SELECT * FROM {DISHES} WHERE id = %s AND deleted_at IS NULL
+        ),
+        inserted AS (
+            INSERT INTO {model._meta.db_table} (user_id, dish_id)
+            SELECT %s, id FROM target
+            ON CONFLICT (user_id, dish_id) DO NOTHING
+            RETURNING dish_id
+        )
+        SELECT target.*, EXISTS (SELECT 1 FROM inserted) AS created
+        FROM target
+        """,
+        [dish_id, user_id],
+    )), None)
+    if dish is not None and dish.created:
+        _recipes_changed(model, user_id, [dish.pk], 1)
+    return dish
+
+
+@transaction.atomic
+def add_recipes(model, user_id, dish_ids):
+    """Добавляет несколько рецептов; возвращает id реально добавленных."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {model._meta.db_table} (user_id, dish_id)
+            SELECT %s, id FROM {DISHES}
+            WHERE id = ANY(%s) AND deleted_at IS NULL ORDER BY id
+            ON CONFLICT (user_id, dish_id) DO NOTHING
+            RETURNING dish_id
+            """,
+            [user_id, list(dish_ids)],
+        )
+        added = sorted(row[0] for row in cursor.fetchall())
+    _recipes_changed(model, user_id, added, 1)
+    return added
+
+
+@transaction.atomic
+def remove_recipes(model, user_id, dish_ids):
+    """Убирает рецепты из избранного или корзины; возвращает id убранных."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            DELETE FROM {model._meta.db_table} r USING {DISHES} d
+            WHERE r.user_id = %s AND r.dish_id = ANY(%s)
+                AND d.id = r.dish_id AND d.deleted_at IS NULL
+            RETURNING r.dish_id
+            """,
+            [user_id, list(dish_ids)],
+        )
+        removed = sorted(row[0] for row in cursor.fetchall())
+    _recipes_changed(model, user_id, removed, -1)
+    return removed
+
+
+def follow(follower_id, author_id):
+    """Подписывает пользователя на автора.
+
+    Возвращает автора с флагом ``created`` или ``None``, если автора нет.
+    Подписка на самого себя не создаётся.
+    """
+    return next(iter(UserAccount.objects.raw(
+        f"""
+        WITH target AS (
+            SELECT * FROM {USERS} WHERE id = %s AND deleted_at IS NULL
+        ),
+        inserted AS (
+            INSERT INTO {FOLLOWS} (follower_id, following_id)
+            SELECT %s, id FROM target WHERE id <> %s
+            ON CONFLICT (follower_id, following_id) DO NOTHING
+            RETURNING following_id
+        )
+        SELECT target.*,
+            EXISTS (SELECT 1 FROM inserted) AS created,
+            target.id <> %s AS is_subscribed
+        FROM target
+        """,
+        [author_id, follower_id, follower_id, follower_id],
+    )), None)
+
+
+def unfollow(follower_id, author_id):
+    """Отменяет подписку; возвращает ``True``, если она была."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            DELETE FROM {FOLLOWS} f USING {USERS} u
+            WHERE f.follower_id = %s AND f.following_id = %s
+                AND u.id = f.following_id AND u.deleted_at IS NULL
+            RETURNING f.id
+            """,
+            [follower_id, author_id],
+        )
+        return cursor.fetchone() is not None
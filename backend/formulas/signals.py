@@ -0,0 +1,147 @@
+"""Обработчики сигналов приложения 'formulas'."""
+
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import cart_totals, catalog, fingerprints, media, popularity
+from .models import (
+    DeletedDish,
+    Dish,
+    FavoriteRecipe,
+    Ingredient,
+    IngredientAmount,
+    ShoppingCart,
+    UserAccount,
+)
+
+
+def _origin_model(origin):
+    """Модель, с которой началось каскадное удаление."""
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_item_added(sender, instance, created, **kwargs):
+    if created:
+        cart_totals.add_dish(instance.user_id, instance.dish_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def cart_item_removed(sender, instance, origin=None, **kwargs):
+    # Каскад от рецепта обрабатывает dish_removed, а итоги удаляемого
+    # пользователя уходят каскадом по внешнему ключу.
+    if _origin_model(origin) is ShoppingCart:
+        cart_totals.remove_dish(instance.user_id, instance.dish_id)
+
+
+@receiver(pre_delete, sender=Dish)
+def dish_removed(sender, instance, **kwargs):
+    cart_totals.remove_dish_everywhere(instance.pk)
+
+
+@receiver(post_delete, sender=Dish)
+def dish_deleted(sender, instance, **kwargs):
+    DeletedDish.objects.create(dish_id=instance.pk)
+
+
+@receiver(pre_save, sender=IngredientAmount)
+def ingredient_amount_changing(sender, instance, **kwargs):
+    instance._cart_totals_old = (
+        IngredientAmount.objects.filter(pk=instance.pk)
+        .values_list("dish_id", "ingredient_id", "amount")
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=IngredientAmount)
+def ingredient_amount_changed(sender, instance, **kwargs):
+    old = getattr(instance, "_cart_totals_old", None)
+    new = {instance.ingredient_id: instance.amount}
+    if old and old[0] != instance.dish_id:
+        cart_totals.apply_dish_change(old[0], {old[1]: old[2]}, {})
+        fingerprints.schedule_refresh(old[0])
+        old = None
+    if not old or old[1] != instance.ingredient_id:
+        fingerprints.schedule_refresh(instance.dish_id)
+    cart_totals.apply_dish_change(
+        instance.dish_id, {old[1]: old[2]} if old else {}, new
+    )
+
+
+@receiver(pre_delete, sender=IngredientAmount)
+def ingredient_amount_removed(sender, instance, origin=None, **kwargs):
+    origin = _origin_model(origin)
+    if origin is IngredientAmount:
+        cart_totals.apply_dish_change(
+            instance.dish_id, {instance.ingredient_id: instance.amount}, {}
+        )
+    # Удаление ингредиента каскадом меняет наборы рецептов, где он был.
+    if origin in (IngredientAmount, Ingredient):
+        fingerprints.schedule_refresh(instance.dish_id)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    catalog.schedule_build()
+
+
+@receiver(post_save, sender=Dish)
+def dish_created(sender, instance, created, **kwargs):
+    if created:
+        popularity.create([instance.pk])
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+def recipe_relation_added(sender, instance, created, **kwargs):
+    if created:
+        popularity.record([instance.dish_id], **_popularity_delta(sender, 1))
+
+
+@receiver(pre_delete, sender=FavoriteRecipe)
+@receiver(pre_delete, sender=ShoppingCart)
+def recipe_relation_removed(sender, instance, origin=None, **kwargs):
+    # Строка популярности удаляемого рецепта уходит каскадом.
+    if _origin_model(origin) is not Dish:
+        popularity.record([instance.dish_id], **_popularity_delta(sender, -1))
+
+
+def _popularity_delta(sender, sign):
+    field = "favorites" if sender is FavoriteRecipe else "carts"
+    return {field: sign}
+
+
+@receiver(pre_save, sender=Dish)
+@receiver(pre_save, sender=UserAccount)
+def media_changing(sender, instance, update_fields=None, **kwargs):
+    field = media.TRACKED_FIELDS[sender]
+    instance._media_old = None
+    if instance.pk and (update_fields is None or field in update_fields):
+        instance._media_old = (
+            sender._base_manager.filter(pk=instance.pk)
+            .values_list(field, flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Dish)
+@receiver(post_save, sender=UserAccount)
+def media_changed(sender, instance, created, update_fields=None, **kwargs):
+    field = media.TRACKED_FIELDS[sender]
+    if not created and update_fields is not None and field not in update_fields:
+        return
+    old = getattr(instance, "_media_old", None)
+    new = getattr(instance, field).name
+    if old != new:
+        media.change_refs({new: 1, old: -1})
+
+
+@receiver(post_delete, sender=Dish)
+@receiver(post_delete, sender=UserAccount)
+def media_released(sender, instance, **kwargs):
+    name = getattr(instance, media.TRACKED_FIELDS[sender]).name
+    media.change_refs({name: -1})
@@ -0,0 +1,164 @@
+"""Журнал медленных SQL-запросов с привязкой к представлению и коду.
+
+``SlowQueryMiddleware`` оборачивает выполнение запросов через
+``connection.execute_wrapper`` и запоминает те, что дольше
+``SLOW_QUERY_THRESHOLD_MS``: нормализованный текст и его отпечаток, имя
+маршрута, действие представления и ближайший кадр стека из кода проекта.
+После ответа накопленное одним запросом добавляется в ``SlowQuery``,
+где строки агрегируются по отпечатку и источнику. Сводку показывает
+команда ``slow_queries``.
+"""
+
+import hashlib
+import logging
+import re
+import time
+import traceback
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from foodgram.middleware import ExecuteWrapperMiddleware
+
+from .models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERIES = SlowQuery._meta.db_table
+PROJECT_ROOT = str(settings.BASE_DIR)
+# Обёртки выполнения запросов и точки входа есть в стеке всегда.
+SKIPPED_FILES = {
+    str(Path(__file__).resolve()),
+    str(settings.BASE_DIR / "foodgram" / "metrics.py"),
+    str(settings.BASE_DIR / "foodgram" / "middleware.py"),
+    str(settings.BASE_DIR / "manage.py"),
+}
+
+_NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(...)"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def normalize(sql):
+    """Убирает из SQL литералы и параметры, схлопывает списки ``IN``."""
+    for pattern, replacement in _NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(sql.encode()).hexdigest()
+
+
+def _project_frame():
+    """Ближайший к запросу кадр стека из кода проекта."""
+    for frame in reversed(traceback.extract_stack()):
+        filename = frame.filename
+        if (
+            filename.startswith(PROJECT_ROOT)
+            and filename not in SKIPPED_FILES
+            and "site-packages" not in filename
+        ):
+            path = Path(filename).relative_to(PROJECT_ROOT)
+            return f"{path}:{frame.lineno} in {frame.name}"
+    return "?"
+
+
+def _view_action(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "?", "?"
+    view = getattr(match.func, "cls", None)
+    actions = getattr(match.func, "actions", None) or {}
+    if view is not None:
+        name = view.__name__
+        action = actions.get(request.method.lower())
+        return match.view_name or "?", f"{name}.{action}" if action else name
+    return match.view_name or "?", match.func.__qualname__
+
+
+class _SlowQueryRecorder:
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            if duration >= self.threshold:
+                self.queries.append((sql, duration, _project_frame()))
+
+
+def record(rows):
+    """Добавляет к агрегатам строки (маршрут, действие, кадр, SQL, мс)."""
+    grouped = {}
+    for route, action, frame, sql, duration in rows:
+        sql = normalize(sql)
+        key = (fingerprint(sql), route[:200], action[:200], frame[:300])
+        calls, total, longest, _ = grouped.get(key, (0, 0.0, 0.0, sql))
+        grouped[key] = (calls + 1, total + duration, max(longest, duration), sql)
+    if not grouped:
+        return
+    keys = sorted(grouped)
+    values = [grouped[key] for key in keys]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {SLOW_QUERIES} AS s (
+                fingerprint, route, action, frame, sql,
+                calls, total_time, max_time, last_seen
+            )
+            SELECT *, now() FROM unnest(
+                %s::text[], %s::text[], %s::text[], %s::text[], %s::text[],
+                %s::bigint[], %s::float8[], %s::float8[]
+            )
+            ON CONFLICT (fingerprint, route, action, frame) DO UPDATE SET
+                calls = s.calls + EXCLUDED.calls,
+                total_time = s.total_time + EXCLUDED.total_time,
+                max_time = GREATEST(s.max_time, EXCLUDED.max_time),
+                last_seen = EXCLUDED.last_seen
+            """,
+            [
+                *(list(column) for column in zip(*keys)),
+                [sql for *_, sql in values],
+                [calls for calls, *_ in values],
+                [total for _, total, *_ in values],
+                [longest for _, _, longest, _ in values],
+            ],
+        )
+
+
+class SlowQueryMiddleware(ExecuteWrapperMiddleware):
+    """Записывает медленные SQL-запросы, выполненные при обработке запроса.
+
+    Запросы, которые выполняются уже при отдаче потокового ответа, сюда
+    не попадают.
+    """
+
+    def make_wrapper(self, request):
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        return _SlowQueryRecorder(threshold) if threshold >= 0 else None
+
+    def finish(self, request, response, recorder):
+        if not recorder.queries:
+            return
+        route, action = _view_action(request)
+        for sql, duration, frame in recorder.queries:
+            logger.warning(
+                "Медленный запрос %.1f мс в %s (%s): %s",
+                duration, action, frame, sql,
+            )
+        try:
+            record(
+                (route, action, frame, sql, duration)
+                for sql, duration, frame in recorder.queries
+            )
+        except DatabaseError:
+            logger.exception("Не удалось сохранить медленные запросы")
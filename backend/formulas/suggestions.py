@@ -0,0 +1,199 @@
+"""Рекомендации авторов, на которых стоит подписаться.
+
+Друзья друзей по ``Follow`` — многоступенчатое соединение, которое резко
+дорожает с ростом плотности графа, поэтому рекомендации считаются
+периодически (команда ``build_suggestions``), а не на запрос. Граф подписок
+и избранного загружается в память в виде компактных списков смежности
+(CSR: массивы смещений и соседей по плотным целочисленным индексам), по
+ним для каждого пользователя оцениваются кандидаты:
+
+* ``SECOND_DEGREE_WEIGHT`` за каждого автора из подписок пользователя,
+  подписанного на кандидата;
+* ``FAVORITE_OVERLAP_WEIGHT`` за каждый рецепт, который в избранном и у
+  пользователя, и у кандидата;
+* ``FAVORITE_AUTHOR_WEIGHT`` за каждый рецепт кандидата в избранном
+  пользователя.
+
+Кандидат должен быть автором хотя бы одного рецепта; сам пользователь и
+те, на кого он уже подписан, не рекомендуются. Лучшие ``SUGGESTIONS_TOP_K``
+кандидатов сохраняются в ``AuthorSuggestion`` и отдаются одним запросом.
+"""
+
+import heapq
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import (
+    AuthorSuggestion,
+    Dish,
+    FavoriteRecipe,
+    Follow,
+    UserAccount,
+)
+
+SECOND_DEGREE_WEIGHT = 1.0
+FAVORITE_OVERLAP_WEIGHT = 0.5
+FAVORITE_AUTHOR_WEIGHT = 0.5
+
+# Рецепты, которые в избранном у большего числа пользователей, не говорят
+# о сходстве вкусов и дают квадратичный перебор; они не учитываются.
+MAX_RECIPE_FANS = 1000
+
+
+class Adjacency:
+    """Списки смежности в формате CSR.
+
+    Соседи вершины ``i`` — ``targets[offsets[i]:offsets[i + 1]]``.
+    """
+
+    def __init__(self, size, edges=()):
+        """``edges`` — пары (вершина, сосед), упорядоченные по вершине."""
+        self.offsets = array("q", bytes(8 * (size + 1)))
+        self.targets = array("q")
+        for source, target in edges:
+            self.offsets[source + 1] += 1
+            self.targets.append(target)
+        for vertex in range(size):
+            self.offsets[vertex + 1] += self.offsets[vertex]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, vertex):
+        return self.targets[self.offsets[vertex]:self.offsets[vertex + 1]]
+
+    def degree(self, vertex):
+        return self.offsets[vertex + 1] - self.offsets[vertex]
+
+    def transposed(self, size):
+        """Обратный граф на ``size`` вершинах."""
+        result = Adjacency(size)
+        offsets = result.offsets
+        for target in self.targets:
+            offsets[target + 1] += 1
+        for vertex in range(size):
+            offsets[vertex + 1] += offsets[vertex]
+        result.targets = array("q", bytes(8 * len(self.targets)))
+        position = array("q", offsets[:-1])
+        for source in range(len(self)):
+            for target in self[source]:
+                result.targets[position[target]] = source
+                position[target] += 1
+        return result
+
+
+class Graph:
+    """Подписки и избранное в плотных индексах.
+
+    ``user_ids[i]`` — id пользователя с индексом ``i``; ``following`` —
+    пользователь → авторы из его подписок, ``favorites`` — пользователь →
+    рецепты в избранном, ``fans`` — рецепт → пользователи, ``creators`` —
+    рецепт → автор, ``authors`` — отметки пользователей с рецептами.
+    """
+
+    def __init__(self, chunk_size=10000):
+        self.user_ids = array("q", (
+            UserAccount.objects.filter(is_active=True)
+            .order_by("id")
+            .values_list("id", flat=True)
+            .iterator(chunk_size=chunk_size)
+        ))
+        users = {user_id: idx for idx, user_id in enumerate(self.user_ids)}
+        size = len(self.user_ids)
+
+        self.creators = array("q")
+        self.authors = bytearray(size)
+        recipes = {}
+        dishes = (
+            Dish.objects.order_by("id")
+            .values_list("id", "creator_id")
+            .iterator(chunk_size=chunk_size)
+        )
+        for dish_id, creator_id in dishes:
+            author = users.get(creator_id)
+            if author is None:
+                continue
+            recipes[dish_id] = len(self.creators)
+            self.creators.append(author)
+            self.authors[author] = 1
+
+        follows = (
+            Follow.objects.order_by("follower_id", "following_id")
+            .values_list("follower_id", "following_id")
+            .iterator(chunk_size=chunk_size)
+        )
+        self.following = Adjacency(size, _edges(follows, users, users))
+        favorites = (
+            FavoriteRecipe.objects.order_by("user_id", "dish_id")
+            .values_list("user_id", "dish_id")
+            .iterator(chunk_size=chunk_size)
+        )
+        self.favorites = Adjacency(size, _edges(favorites, users, recipes))
+        self.fans = self.favorites.transposed(len(self.creators))
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def suggest(self, user, top_k):
+        """Лучшие кандидаты для пользователя с индексом ``user``.
+
+        Возвращает пары (индекс автора, оценка) по убыванию оценки.
+        """
+        followed = set(self.following[user])
+        scores = defaultdict(float)
+        for author in followed:
+            for candidate in self.following[author]:
+                scores[candidate] += SECOND_DEGREE_WEIGHT
+        for recipe in self.favorites[user]:
+            scores[self.creators[recipe]] += FAVORITE_AUTHOR_WEIGHT
+            if self.fans.degree(recipe) > MAX_RECIPE_FANS:
+                continue
+            for fan in self.fans[recipe]:
+                scores[fan] += FAVORITE_OVERLAP_WEIGHT
+        followed.add(user)
+        return heapq.nlargest(
+            top_k,
+            (
+                (candidate, score)
+                for candidate, score in scores.items()
+                if self.authors[candidate] and candidate not in followed
+            ),
+            key=lambda item: (item[1], -item[0]),
+        )
+
+
+def _edges(rows, sources, targets):
+    """Пары id → пары индексов; строки с неизвестными id пропускаются."""
+    for source, target in rows:
+        source, target = sources.get(source), targets.get(target)
+        if source is not None and target is not None:
+            yield source, target
+
+
+@transaction.atomic
+def rebuild(top_k=None, batch_size=5000):
+    """Пересчитывает рекомендации всех пользователей; возвращает число строк.
+
+    Таблица заменяется целиком в одной транзакции: до её завершения
+    читатели видят прежние рекомендации.
+    """
+    top_k = top_k or settings.SUGGESTIONS_TOP_K
+    graph = Graph()
+    AuthorSuggestion.objects.all().delete()
+    batch, total = [], 0
+    for user in range(len(graph)):
+        for author, score in graph.suggest(user, top_k):
+            batch.append(AuthorSuggestion(
+                user_id=graph.user_ids[user],
+                author_id=graph.user_ids[author],
+                score=score,
+            ))
+        if len(batch) >= batch_size:
+            AuthorSuggestion.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    AuthorSuggestion.objects.bulk_create(batch)
+    return total + len(batch)
@@ -0,0 +1,180 @@
+"""Тесты приложения 'formulas'."""
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import fingerprints
+from .models import (
+    DeletionJob,
+    Dish,
+    FavoriteRecipe,
+    Follow,
+    ImageImportJob,
+    Ingredient,
+    IngredientAmount,
+    ShoppingCart,
+    UserAccount,
+)
+
+
+class AdminChangelistQueryCountTests(TestCase):
+    """Число запросов страниц списков админки не зависит от числа строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = UserAccount.objects.create_superuser(
+            email="admin@example.com",
+            username="admin",
+            password="password",
+            first_name="",
+            last_name="",
+        )
+        cls.author = UserAccount.objects.create(
+            email="author@example.com", username="author"
+        )
+        cls.created = 0
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        """Добавляет по ``count`` строк во все таблицы с админкой."""
+        for _ in range(count):
+            number = type(self).created = type(self).created + 1
+            user = UserAccount.objects.create(
+                email=f"user{number}@example.com", username=f"user{number}"
+            )
+            ingredient = Ingredient.objects.create(
+                name=f"ингредиент {number}", measurement_unit="г"
+            )
+            dish = Dish.objects.create(
+                title=f"рецепт {number}",
+                description="описание",
+                creator=self.author if number % 2 else user,
+                cook_time=10,
+            )
+            IngredientAmount.objects.create(
+                dish=dish, ingredient=ingredient, amount=number
+            )
+            FavoriteRecipe.objects.create(user=self.admin, dish=dish)
+            ShoppingCart.objects.create(user=user, dish=dish)
+            Follow.objects.create(follower=user, following=self.admin)
+            DeletionJob.objects.create(
+                model="formulas.dish", object_id=dish.pk
+            )
+            ImageImportJob.objects.create(
+                dish=dish, source=f"https://example.com/{number}.png"
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["cl"].result_list)
+        return len(context)
+
+    def assert_constant_queries(self, model, query=""):
+        url = reverse(
+            f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist"
+        ) + query
+        self.add_rows(2)
+        self.count_queries(url)
+        before = self.count_queries(url)
+        self.add_rows(5)
+        self.assertEqual(self.count_queries(url), before)
+
+    def test_useraccount_changelist(self):
+        self.assert_constant_queries(UserAccount)
+
+    def test_follow_changelist(self):
+        self.assert_constant_queries(Follow)
+
+    def test_ingredient_changelist(self):
+        self.assert_constant_queries(Ingredient)
+
+    def test_dish_changelist(self):
+        self.assert_constant_queries(Dish)
+
+    def test_ingredientamount_changelist(self):
+        self.assert_constant_queries(IngredientAmount)
+
+    def test_favoriterecipe_changelist(self):
+        self.assert_constant_queries(FavoriteRecipe)
+
+    def test_shoppingcart_changelist(self):
+        self.assert_constant_queries(ShoppingCart)
+
+    def test_deletionjob_changelist(self):
+        self.assert_constant_queries(DeletionJob)
+
+    def test_imageimportjob_changelist(self):
+        self.assert_constant_queries(ImageImportJob)
+
+    def test_dish_changelist_filtered_by_author(self):
+        self.assert_constant_queries(
+            Dish, f"?creator__id__exact={self.author.pk}"
+        )
+
+    def test_autocomplete_filter_renders_only_selected_object(self):
+        self.add_rows(2)
+        author = UserAccount.objects.filter(
+            pk__in=Dish.objects.values("creator")
+        ).exclude(pk=self.author.pk).first()
+        other = self.author
+        response = self.client.get(
+            reverse("admin:formulas_dish_changelist"),
+            {"creator__id__exact": author.pk},
+        )
+        self.assertContains(response, f'<option value="{author.pk}" selected>')
+        self.assertNotContains(response, f">{other.username}</a>")
+        self.assertEqual(len(response.context["cl"].result_list), 1)
+
+
+class FingerprintRefreshTests(TestCase):
+    """Правки строк ингредиентов пересчитывают отпечаток рецепта."""
+
+    def test_amount_rows_refresh_fingerprint(self):
+        author = UserAccount.objects.create(
+            email="author@example.com", username="author"
+        )
+        salt, egg, milk = (
+            Ingredient.objects.create(name=name, measurement_unit="г")
+            for name in ("соль", "яйцо", "молоко")
+        )
+        dish = Dish.objects.create(
+            title="рецепт", description="описание", creator=author, cook_time=5
+        )
+
+        def assert_fingerprint(*ingredients):
+            dish.refresh_from_db()
+            self.assertEqual(
+                dish.ingredients_hash,
+                fingerprints.fingerprint(
+                    [ingredient.pk for ingredient in ingredients]
+                )["ingredients_hash"],
+            )
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            IngredientAmount.objects.create(
+                dish=dish, ingredient=salt, amount=1
+            )
+            amount = IngredientAmount.objects.create(
+                dish=dish, ingredient=egg, amount=1
+            )
+        self.assertEqual(len(callbacks), 1)
+        assert_fingerprint(salt, egg)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            amount.ingredient = milk
+            amount.save()
+        assert_fingerprint(salt, milk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            amount.delete()
+        assert_fingerprint(salt)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            salt.delete()
+        assert_fingerprint()
@@ -0,0 +1,57 @@
+"""Настройки gunicorn: общий каталог метрик Prometheus для всех воркеров
+и прогрев воркеров до первого запроса."""
+
+import os
+import shutil
+
+# Каталог должен быть задан до импорта prometheus_client воркерами.
+multiproc_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", "/tmp/foodgram-metrics"
+)
+
+
+def on_starting(server):
+    # Значения прошлого запуска не должны попасть в новые счётчики.
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def _warm_up(log):
+    from django.conf import settings
+
+    if not settings.WARMUP_ON_BOOT:
+        return
+    from foodgram.warmup import warm_up
+
+    try:
+        timings = warm_up()
+    except Exception:
+        # Непрогретый воркер лучше, чем воркер, который не стартовал.
+        log.exception("Прогрев не удался")
+        return
+    log.info(
+        "Прогрев за %.0f мс: %s",
+        sum(timings.values()) * 1000,
+        ", ".join(
+            f"{name} {seconds * 1000:.0f}"
+            for name, seconds in timings.items()
+        ),
+    )
+
+
+def when_ready(server):
+    # С --preload приложение уже загружено в мастере: прогретую память
+    # воркеры получат при fork.
+    if server.cfg.preload_app:
+        _warm_up(server.log)
+
+
+def post_worker_init(worker):
+    if not worker.cfg.preload_app:
+        _warm_up(worker.log)